@@ -0,0 +1,99 @@
+"""
+Нагрузочный тест отметки на лекции (всплеск check-in в окне ±15 минут).
+
+Сравнивает новый путь (POST /api/attendance/check-in - один запрос) со старым
+(GET /api/lectures/by-secret-code + POST /api/attendance, как в workflow CheckIn).
+Запускается против работающего backend с заранее созданными лекцией и студентами;
+для честного сравнения режимы запускаются на разных диапазонах студентов.
+
+Пример:
+    python benchmarks/checkin_load.py --base-url http://localhost:8000 \\
+        --secret-code ABC123 --students 1-500 --concurrency 100
+    python benchmarks/checkin_load.py --secret-code ABC123 --students 501-1000 --legacy
+"""
+import argparse
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import requests
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def parse_ids(value: str) -> List[int]:
+    ids = []
+    for part in value.split(","):
+        if "-" in part:
+            first, last = part.split("-", 1)
+            ids.extend(range(int(first), int(last) + 1))
+        elif part:
+            ids.append(int(part))
+    return ids
+
+
+def checkin(base_url: str, secret_code: str, student_id: int) -> Tuple[int, float]:
+    start = time.perf_counter()
+    response = _session().post(
+        f"{base_url}/api/attendance/check-in",
+        params={"skip_time_validation": "true"},
+        json={"secret_code": secret_code, "student_id": student_id},
+    )
+    return response.status_code, time.perf_counter() - start
+
+
+def legacy_checkin(base_url: str, secret_code: str, student_id: int) -> Tuple[int, float]:
+    start = time.perf_counter()
+    session = _session()
+    response = session.get(f"{base_url}/api/lectures/by-secret-code/{secret_code}")
+    if response.status_code == 200:
+        response = session.post(
+            f"{base_url}/api/attendance",
+            params={"skip_time_validation": "true"},
+            json={"student_id": student_id, "lecture_id": response.json()["id"], "present": True},
+        )
+    return response.status_code, time.perf_counter() - start
+
+
+def run(func, base_url: str, secret_code: str, student_ids: List[int], concurrency: int) -> None:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda student_id: func(base_url, secret_code, student_id), student_ids))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    statuses = Counter(status for status, _ in results)
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{func.__name__}: {len(results)} запросов за {elapsed:.2f} с ({len(results) / elapsed:.0f} check-in/с)")
+    print(f"  latency p50={percentile(0.5):.1f} ms p95={percentile(0.95):.1f} ms "
+          f"p99={percentile(0.99):.1f} ms mean={statistics.mean(latencies) * 1000:.1f} ms")
+    print(f"  статусы: {dict(statuses)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--secret-code", required=True)
+    parser.add_argument("--students", required=True, help="ID студентов: 1-500 или 1,2,3")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--legacy", action="store_true", help="Замерить старый путь из двух запросов")
+    args = parser.parse_args()
+
+    student_ids = parse_ids(args.students)
+    run(legacy_checkin if args.legacy else checkin, args.base_url, args.secret_code, student_ids, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Бенчмарк экспорта и импорта Google Sheets на синтетическом курсе.
+
+Таблица Google подменяется таблицей в памяти (sheets_fake), поэтому доступ
+к Google не нужен; база - настоящий PostgreSQL. Для каждого сценария
+выводятся время, число запросов к Sheets API по операциям, прочитанные и
+записанные ячейки, объем запросов/ответов и число SQL-запросов.
+
+Сценарии: полный экспорт в пустую таблицу, повторный экспорт без изменений,
+экспорт после новых оценок, всплеск экспортов отдельных студентов (через
+очередь), импорт оценок после правок преподавателей и повторный импорт.
+
+Запускается из каталога backend против ПУСТОЙ базы (таблицы создаются,
+в конце очищаются со сбросом последовательностей id):
+    DB_NAME=frieren_bench python benchmarks/google_sheets_sync.py [--students 1000]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("SHEETS_COALESCE_WINDOW", "0.2")
+
+from gspread.utils import rowcol_to_a1
+from sqlalchemy import event, text
+
+from database import (
+    engine, SessionLocal, Student, Teacher, TeacherGroup, Lecture, Attendance, Homework,
+    HomeworkReview, StudentHomeworkVariant, ExamGrade
+)
+import sheets_client
+import sheets_queue
+from sheets_fake import FakeSpreadsheet
+from routers import google_sheet
+
+TABLES = [Student, Teacher, TeacherGroup, Lecture, Attendance, Homework, HomeworkReview, StudentHomeworkVariant, ExamGrade]
+
+HOMEWORKS = 6
+LECTURES = 14
+GROUPS = 10
+
+
+def truncate(db) -> None:
+    """Очищает таблицы и сбрасывает последовательности id: seed ссылается на записи по id с 1."""
+    db.execute(text(f"TRUNCATE {', '.join(table.__tablename__ for table in TABLES)} RESTART IDENTITY"))
+    db.commit()
+
+
+def seed(db, students: int) -> None:
+    """
+    Синтетический курс: студенты в группах, лекции с посещаемостью, ДЗ
+    с вариантами и проверками, экзамен. Таблицы должны быть пусты и со
+    сброшенными последовательностями (truncate).
+    """
+    random.seed(42)
+    db.execute(Teacher.__table__.insert(), [
+        {"full_name": f"Teacher {i}", "telegram": f"@teacher{i}", "is_deleted": False} for i in range(GROUPS)
+    ])
+    db.execute(TeacherGroup.__table__.insert(), [
+        {"teacher_id": i + 1, "group_number": f"M80-{i:03d}"} for i in range(GROUPS)
+    ])
+    db.execute(Student.__table__.insert(), [
+        {"year": 2025, "full_name": f"Student {i}", "telegram": f"@student{i}", "github": f"student{i}",
+         "group_number": f"M80-{i % GROUPS:03d}", "is_deleted": False}
+        for i in range(students)
+    ])
+    db.execute(Homework.__table__.insert(), [
+        {"number": n, "due_date": f"2025-{n + 2:02d}-01", "short_description": f"Homework {n}",
+         "example_link": "https://github.com/example", "assigned_date": f"2025-{n + 1:02d}-01", "variants_count": 10}
+        for n in range(1, HOMEWORKS + 1)
+    ])
+    db.execute(Lecture.__table__.insert(), [
+        {"number": n, "topic": f"Lecture {n}", "date": f"2025-02-{n:02d}"} for n in range(1, LECTURES + 1)
+    ])
+    db.execute(Attendance.__table__.insert(), [
+        {"student_id": s, "lecture_id": l, "present": int(random.random() < 0.75)}
+        for s in range(1, students + 1) for l in range(1, LECTURES + 1)
+    ])
+    db.execute(StudentHomeworkVariant.__table__.insert(), [
+        {"student_id": s, "homework_id": h, "variant_number": random.randint(1, 10)}
+        for s in range(1, students + 1) for h in range(1, HOMEWORKS + 1)
+    ])
+    reviews = []
+    for s in range(1, students + 1):
+        for n in range(1, HOMEWORKS + 1):
+            for _ in range(random.choice([0, 1, 1, 2, 3])):
+                reviews.append({
+                    "number": n, "send_date": f"2025-{n + 2:02d}-{random.randint(1, 28):02d}",
+                    "review_date": None, "url": f"https://github.com/student{s - 1}/hw{n}", "result": 0,
+                    "comments": "", "student_id": s, "ai_percentage": round(random.random() * 100, 1),
+                })
+    db.execute(HomeworkReview.__table__.insert(), reviews)
+    db.execute(ExamGrade.__table__.insert(), [
+        {"date": "2025-06-20", "grade": random.randint(3, 5), "variant_number": random.randint(1, 20), "student_id": s}
+        for s in range(1, students + 1) if random.random() < 0.8
+    ])
+    db.commit()
+
+
+def grade_reviews(db, share: float) -> None:
+    """Преподаватели проверяют часть работ в приложении."""
+    db.execute(text(
+        "UPDATE homework_review SET result = 1 + id % 5, review_date = '2025-05-01' WHERE random() < :share"
+    ), {"share": share})
+    db.commit()
+
+
+def edit_ratings_sheet(spreadsheet: FakeSpreadsheet, edits: int) -> None:
+    """Преподаватели ставят оценки прямо в листе "Оценки" (в статистику не попадает)."""
+    worksheet = spreadsheet.worksheet(google_sheet.RATING_NAMES)
+    rows = worksheet.get_all_values()
+    data = []
+    for _ in range(edits):
+        row = random.randrange(2, len(rows) + 1)
+        column = 3 + random.randrange(HOMEWORKS) * 5 + 5  # столбец grade (с 1)
+        data.append({"range": rowcol_to_a1(row, column), "values": [[str(random.randint(2, 5))]]})
+    worksheet.batch_update(data)
+
+
+def per_student_burst(students: int, events: int) -> None:
+    """Всплеск событий (отметки, сдачи, проверки), каждое - отдельный HTTP-запрос с ожиданием записи."""
+    db = SessionLocal()
+    review_ids = [review_id for (review_id,) in db.query(HomeworkReview.id)]
+    db.close()
+    calls = []
+    for _ in range(events):
+        kind = random.random()
+        if kind < 0.5:
+            calls.append((google_sheet.export_student_attendance_to_google_sheet, random.randint(1, students)))
+        elif kind < 0.8:
+            calls.append((google_sheet.export_review_to_google_sheet, random.choice(review_ids)))
+        else:
+            calls.append((google_sheet.export_student_to_google_sheet, random.randint(1, students)))
+
+    def call(endpoint, key):
+        session = SessionLocal()
+        try:
+            endpoint(key, wait=True, db=session)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=call, args=item) for item in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_scenario(name: str, spreadsheet: FakeSpreadsheet, action: Callable[[], Any], results: List[Dict[str, Any]]) -> None:
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    spreadsheet.stats.reset()
+    event.listen(engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    try:
+        action()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    elapsed = (time.perf_counter() - started) * 1000
+    stats = spreadsheet.stats.as_dict()
+    results.append({"name": name, "ms": elapsed, "sql": queries[0], **stats})
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'scenario':<34}{'ms':>9}{'sql':>7}{'api':>6}{'cells read':>12}{'cells written':>15}{'KB sent':>10}{'KB recv':>10}")
+    for item in results:
+        print(
+            f"{item['name']:<34}{item['ms']:>9.0f}{item['sql']:>7}{item['requests']:>6}{item['cells_read']:>12}"
+            f"{item['cells_written']:>15}{item['bytes_sent'] / 1024:>10.1f}{item['bytes_received'] / 1024:>10.1f}"
+        )
+        print(f"{'':<34}{', '.join(f'{op}={count}' for op, count in sorted(item['calls'].items()))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=300, help="событий во всплеске экспорта отдельных студентов")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    if any(db.query(table.id).first() is not None for table in TABLES):
+        sys.exit(f"Database {engine.url.database} is not empty - run the benchmark against an empty database")
+    # Таблицы пусты, но последовательности id могли остаться от прошлых данных
+    truncate(db)
+
+    spreadsheet = FakeSpreadsheet()
+    sheets_client.use_spreadsheet(spreadsheet)
+    results: List[Dict[str, Any]] = []
+    try:
+        started = time.perf_counter()
+        seed(db, args.students)
+        print(f"Seeded {args.students} students in {(time.perf_counter() - started):.1f} s")
+
+        run_scenario("export all (empty spreadsheet)", spreadsheet, lambda: google_sheet.export_all_google_sheet(db), results)
+        run_scenario("export all (no changes)", spreadsheet, lambda: google_sheet.export_all_google_sheet(db), results)
+        grade_reviews(db, 0.1)
+        run_scenario("export all (10% reviews graded)", spreadsheet, lambda: google_sheet.export_all_google_sheet(db), results)
+        run_scenario(
+            f"per-student burst ({args.events} events)", spreadsheet,
+            lambda: per_student_burst(args.students, args.events), results
+        )
+        edit_ratings_sheet(spreadsheet, 50)
+        run_scenario("import ratings (50 sheet edits)", spreadsheet,
+                     lambda: google_sheet.import_ratings_from_google_sheet(force=False, db=db), results)
+        run_scenario("import ratings (unchanged)", spreadsheet,
+                     lambda: google_sheet.import_ratings_from_google_sheet(force=False, db=db), results)
+    finally:
+        db.rollback()
+        truncate(db)
+        db.close()
+        sheets_client.use_spreadsheet(None)
+
+    print_results(results)
+    print(f"Export queue: {sheets_queue.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
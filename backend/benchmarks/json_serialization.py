@@ -0,0 +1,90 @@
+"""
+Бенчмарк сериализации больших списков посещаемости.
+
+Сравнивает стандартный путь FastAPI (валидация через response_model,
+jsonable_encoder и json.dumps) с быстрым путем fast_json_response (orjson
+без повторной валидации).
+
+Запуск из каталога backend:
+    python benchmarks/json_serialization.py [количество_строк]
+"""
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models import AttendanceInfo
+from routers.utils import FastJSONResponse
+
+
+def make_rows(count: int) -> List[dict]:
+    rows = []
+    for i in range(count):
+        rows.append({
+            "id": i + 1,
+            "student": {
+                "id": i % 500 + 1,
+                "year": 2024,
+                "full_name": f"Студент Номер {i % 500 + 1}",
+                "telegram": f"@student{i % 500 + 1}",
+                "github": f"student{i % 500 + 1}",
+                "group_number": f"М8О-{i % 10 + 1:02d}",
+                "chat_id": None,
+                "is_deleted": False,
+            },
+            "lecture": {
+                "id": i % 40 + 1,
+                "number": i % 40 + 1,
+                "topic": f"Лекция {i % 40 + 1}",
+                "date": "2024-09-01 10:00:00",
+                "start_time": "10:45",
+                "secret_code": "secret",
+                "max_student": 500,
+                "github_example": None,
+                "has_presentation": True,
+            },
+            "present": i % 3 != 0,
+        })
+    return rows
+
+
+def measure(name: str, func, repeat: int = 5) -> None:
+    best = None
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(func())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<40} {best * 1000:9.1f} ms  {size / 1024:9.0f} KiB")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rows = make_rows(count)
+    adapter = TypeAdapter(List[AttendanceInfo])
+
+    def fastapi_default() -> bytes:
+        validated = adapter.validate_python(rows)
+        return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def pydantic_dump_json() -> bytes:
+        return adapter.dump_json(adapter.validate_python(rows))
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(content=rows).body
+
+    print(f"Строк: {count}")
+    measure("response_model + jsonable_encoder", fastapi_default)
+    measure("response_model + pydantic dump_json", pydantic_dump_json)
+    measure("fast_json_response (orjson)", fast_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Аналитика посещаемости: явка по лекциям, динамика по группам, серии посещений
+и студенты в зоне риска (пропустившие несколько последних лекций подряд).
+
+Посещаемость один раз загружается в матрицу «студенты × прошедшие лекции»
+(numpy), все метрики считаются векторно по матрице. Результат кэшируется до
+следующего commit, изменившего посещаемость или студентов (счетчик версий
+по событиям SessionLocal), но не дольше MAX_AGE.
+"""
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Attendance, Student
+from models import GroupTrendInfo, LectureTurnoutInfo, StudentAttendanceStatsInfo
+import lecture_index
+
+logger = logging.getLogger(__name__)
+
+# Порог по умолчанию для студентов в зоне риска: пропущено подряд последних лекций
+DEFAULT_MISSED_IN_ROW = 3
+
+# Записи в обход SessionLocal этого процесса (другой процесс, psql) счетчик
+# версий не видит: результат пересчитывается не реже этого интервала (в секундах)
+MAX_AGE = 60
+
+_TRACKED_TABLES = (Attendance.__table__, Student.__table__)
+
+
+@dataclass(frozen=True)
+class AttendanceAnalytics:
+    lectures: List[LectureTurnoutInfo]
+    groups: List[GroupTrendInfo]
+    students: List[StudentAttendanceStatsInfo]
+
+
+_lock = threading.Lock()
+_cache: Optional[Tuple[Any, AttendanceAnalytics, float]] = None  # ключ, результат, время расчета
+_versions = itertools.count(1)
+_version = 0  # увеличивается после каждого commit, изменившего посещаемость или студентов
+
+
+def _today() -> date:
+    return datetime.now(timezone(timedelta(hours=3))).date()  # МСК
+
+
+def _is_held(lecture_date: str, today: date) -> bool:
+    """Лекция уже прошла (или идет сегодня); дата в неизвестном формате считается прошедшей."""
+    try:
+        return datetime.fromisoformat(lecture_date.replace('Z', '+00:00')).date() <= today
+    except (ValueError, AttributeError):
+        return True
+
+
+def _trailing_run(matrix: np.ndarray, value: bool) -> np.ndarray:
+    """Длина серии одинаковых значений value в конце каждой строки."""
+    reversed_matrix = matrix[:, ::-1]
+    mismatch = reversed_matrix != value
+    return np.where(mismatch.any(axis=1), mismatch.argmax(axis=1), matrix.shape[1])
+
+
+def _longest_run(matrix: np.ndarray) -> np.ndarray:
+    """Длина самой длинной серии True в каждой строке."""
+    padded = np.pad(matrix.astype(np.int8), ((0, 0), (1, 1)))
+    edges = np.diff(padded, axis=1)
+    start_rows, start_columns = np.nonzero(edges == 1)
+    _, end_columns = np.nonzero(edges == -1)
+    longest = np.zeros(matrix.shape[0], dtype=np.int64)
+    # Начала и концы серий перечисляются построчно в одном порядке
+    np.maximum.at(longest, start_rows, end_columns - start_columns)
+    return longest
+
+
+def _rates(counts: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    return np.divide(counts, totals, out=np.zeros(counts.shape, dtype=np.float64), where=totals > 0)
+
+
+def _compute(db: Session, lectures: list, today: date) -> AttendanceAnalytics:
+    started = time.perf_counter()
+    held = [lecture for lecture in lectures if _is_held(lecture['date'], today)]
+
+    students = db.query(
+        Student.id, Student.full_name, Student.telegram, Student.group_number
+    ).filter(Student.is_deleted == False).order_by(Student.id).all()
+    # Отметки присутствия забираются столбцами: два массива в одной строке результата
+    present_student_ids, present_lecture_ids = db.query(
+        func.array_agg(Attendance.student_id), func.array_agg(Attendance.lecture_id)
+    ).filter(Attendance.present == 1).one()
+    present_student_ids = np.array(present_student_ids or [], dtype=np.int64)
+    present_lecture_ids = np.array(present_lecture_ids or [], dtype=np.int64)
+
+    # Матрица посещаемости: строки - студенты (по id), столбцы - прошедшие лекции (по номеру)
+    student_ids = np.array([student.id for student in students], dtype=np.int64)
+    lecture_ids = np.array([lecture['id'] for lecture in held], dtype=np.int64)
+    lecture_order = np.argsort(lecture_ids)
+    matrix = np.zeros((len(student_ids), len(lecture_ids)), dtype=bool)
+    if len(present_student_ids) and len(student_ids) and len(lecture_ids):
+        rows = np.searchsorted(student_ids, present_student_ids)
+        sorted_positions = np.searchsorted(lecture_ids[lecture_order], present_lecture_ids)
+        rows = np.minimum(rows, len(student_ids) - 1)
+        sorted_positions = np.minimum(sorted_positions, len(lecture_ids) - 1)
+        columns = lecture_order[sorted_positions]
+        # Записи удаленных студентов и непрошедших/удаленных лекций отбрасываются
+        known = (student_ids[rows] == present_student_ids) & (lecture_ids[columns] == present_lecture_ids)
+        matrix[rows[known], columns[known]] = True
+
+    student_count = len(student_ids)
+    held_count = len(lecture_ids)
+
+    # Явка по лекциям
+    lecture_present = matrix.sum(axis=0)
+    lecture_rates = lecture_present / student_count if student_count else np.zeros(held_count)
+    lecture_stats = [
+        LectureTurnoutInfo(
+            lecture_id=lecture['id'], number=lecture['number'], topic=lecture['topic'], date=lecture['date'],
+            present=present, students=student_count, rate=round(rate, 4)
+        )
+        for lecture, present, rate in zip(held, lecture_present.tolist(), lecture_rates.tolist())
+    ]
+
+    # Динамика по группам: явка группы на каждой лекции и наклон линейного тренда
+    group_numbers, group_index = np.unique(
+        np.array([student.group_number for student in students], dtype=object), return_inverse=True
+    )
+    group_sizes = np.bincount(group_index, minlength=len(group_numbers))
+    group_present = np.zeros((len(group_numbers), held_count), dtype=np.int64)
+    np.add.at(group_present, group_index, matrix)
+    group_rates = _rates(group_present, group_sizes[:, None])
+    if held_count > 1:
+        x = np.arange(held_count) - (held_count - 1) / 2
+        trends = (group_rates - group_rates.mean(axis=1, keepdims=True)) @ x / (x @ x)
+    else:
+        trends = np.zeros(len(group_numbers))
+    averages = group_rates.mean(axis=1) if held_count else np.zeros(len(group_numbers))
+    group_stats = [
+        GroupTrendInfo(
+            group_number=group_number, students=size,
+            rates=[round(rate, 4) for rate in rates], average_rate=round(average, 4), trend=round(trend, 4)
+        )
+        for group_number, size, rates, average, trend in zip(
+            group_numbers.tolist(), group_sizes.tolist(), group_rates.tolist(), averages.tolist(), trends.tolist()
+        )
+    ]
+
+    # Серии посещений по студентам
+    attended = matrix.sum(axis=1)
+    student_rates = attended / held_count if held_count else np.zeros(student_count)
+    current_streaks = _trailing_run(matrix, True)
+    missed_in_row = _trailing_run(matrix, False)
+    longest_streaks = _longest_run(matrix)
+    student_stats = [
+        StudentAttendanceStatsInfo(
+            student_id=student.id, full_name=student.full_name, telegram=student.telegram,
+            group_number=student.group_number, attended=count, held=held_count, rate=round(rate, 4),
+            current_streak=current, longest_streak=longest, missed_in_row=missed
+        )
+        for student, count, rate, current, longest, missed in zip(
+            students, attended.tolist(), student_rates.tolist(), current_streaks.tolist(),
+            longest_streaks.tolist(), missed_in_row.tolist()
+        )
+    ]
+
+    logger.info(
+        f"Attendance analytics computed: {student_count} students x {held_count} lectures "
+        f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return AttendanceAnalytics(lectures=lecture_stats, groups=group_stats, students=student_stats)
+
+
+def get_analytics(db: Session) -> AttendanceAnalytics:
+    """
+    Аналитика посещаемости; пересчитывается только если с прошлого расчета
+    изменились посещаемость, студенты, лекции или наступил новый день.
+    """
+    global _cache
+    lectures = lecture_index.all_lectures(db)
+    today = _today()
+    key = (
+        _version,
+        tuple((lecture['id'], lecture['number'], lecture['date']) for lecture in lectures),
+        today,
+    )
+    cached = _cache
+    if _is_valid(cached, key):
+        return cached[1]
+    with _lock:
+        if _is_valid(_cache, key):
+            return _cache[1]
+        computed_at = time.monotonic()
+        analytics = _compute(db, lectures, today)
+        _cache = (key, analytics, computed_at)
+    return analytics
+
+
+def _is_valid(cached, key) -> bool:
+    return cached is not None and cached[0] == key and time.monotonic() - cached[2] < MAX_AGE
+
+
+def at_risk_students(
+    analytics: AttendanceAnalytics, missed_in_row: int = DEFAULT_MISSED_IN_ROW
+) -> List[StudentAttendanceStatsInfo]:
+    """Студенты, пропустившие подряд не меньше missed_in_row последних лекций."""
+    students = [student for student in analytics.students if student['missed_in_row'] >= missed_in_row]
+    return sorted(students, key=lambda student: (-student['missed_in_row'], student['student_id']))
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_changes(session, flush_context):
+    if any(isinstance(obj, (Attendance, Student)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["attendance_changed"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _track_bulk_changes(orm_execute_state):
+    # INSERT/UPDATE/DELETE выражениями (upsert отметок, импорт) минуют flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if getattr(orm_execute_state.statement, "table", None) in _TRACKED_TABLES:
+            orm_execute_state.session.info["attendance_changed"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_version_after_commit(session):
+    global _version
+    if session.info.pop("attendance_changed", False):
+        _version = next(_versions)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes_after_rollback(session):
+    session.info.pop("attendance_changed", None)
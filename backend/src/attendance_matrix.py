@@ -0,0 +1,83 @@
+"""
+Матрица посещаемости «студенты × лекции» в компактном виде: для каждого
+студента - битовая маска посещенных лекций (бит j - лекция j в порядке номеров).
+Строится одним запросом к БД; список лекций берется из индекса лекций.
+"""
+import base64
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from database import Attendance, Student
+from models import AttendanceMatrixInfo, AttendanceMatrixLecture, AttendanceMatrixStudent
+import lecture_index
+
+# Кодировка строк матрицы в ответе API
+MATRIX_ENCODING = "bitset-base64-le"
+
+
+def load_attendance_masks(
+    db: Session, group_number: Optional[str] = None
+) -> Tuple[List[AttendanceMatrixLecture], List[AttendanceMatrixStudent], Dict[int, int]]:
+    """
+    Возвращает лекции (столбцы), студентов (строки) и маски посещаемости
+    {student_id: int}, где бит j установлен, если студент был на лекции j.
+    """
+    lectures = [
+        AttendanceMatrixLecture(id=info['id'], number=info['number'], topic=info['topic'], date=info['date'])
+        for info in lecture_index.all_lectures(db)
+    ]
+    column_by_lecture = {lecture['id']: column for column, lecture in enumerate(lectures)}
+
+    # Один запрос: студент и массив лекций, на которых он присутствовал
+    query = db.query(
+        Student.id, Student.full_name, Student.telegram, Student.group_number,
+        func.array_agg(Attendance.lecture_id)
+    ).outerjoin(
+        Attendance, and_(Attendance.student_id == Student.id, Attendance.present == 1)
+    ).filter(
+        Student.is_deleted == False
+    ).group_by(Student.id).order_by(Student.id)
+    if group_number is not None:
+        query = query.filter(Student.group_number == group_number)
+
+    students = []
+    masks = {}
+    for student_id, full_name, telegram, student_group, lecture_ids in query:
+        students.append(AttendanceMatrixStudent(
+            id=student_id, full_name=full_name, telegram=telegram, group_number=student_group
+        ))
+        mask = 0
+        for lecture_id in lecture_ids:
+            column = column_by_lecture.get(lecture_id)
+            if column is not None:
+                mask |= 1 << column
+        masks[student_id] = mask
+    return lectures, students, masks
+
+
+def encode_mask(mask: int, columns: int) -> str:
+    """Битовая маска в base64 (little-endian: бит j - в байте j // 8)."""
+    return base64.b64encode(mask.to_bytes((columns + 7) // 8, "little")).decode("ascii")
+
+
+def build_attendance_matrix(db: Session, group_number: Optional[str] = None) -> AttendanceMatrixInfo:
+    """Матрица посещаемости для API: по одной закодированной строке на студента."""
+    lectures, students, masks = load_attendance_masks(db, group_number)
+    columns = len(lectures)
+    rows = [encode_mask(masks[student['id']], columns) for student in students]
+    lecture_totals = [0] * columns
+    for mask in masks.values():
+        while mask:
+            lowest = mask & -mask
+            lecture_totals[lowest.bit_length() - 1] += 1
+            mask ^= lowest
+    return AttendanceMatrixInfo(
+        encoding=MATRIX_ENCODING,
+        lectures=lectures,
+        students=students,
+        rows=rows,
+        lecture_totals=lecture_totals,
+        student_totals=[masks[student['id']].bit_count() for student in students]
+    )
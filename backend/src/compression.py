@@ -0,0 +1,196 @@
+"""
+Сжатие ответов (Brotli/GZip) для больших JSON и текстовых ответов.
+
+Сжимаются только ответы из списка разрешенных типов содержимого и не меньше
+порога MINIMUM_SIZE; файлы (PDF, PPTX и т.п.) уже сжаты и отдаются как есть.
+"""
+import gzip
+import logging
+import os
+import zlib
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него используется только gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Ответы меньше этого размера (в байтах) не сжимаются
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Уровни сжатия: умеренные, чтобы не тратить CPU на крупных выгрузках
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def is_compressible(content_type: str) -> bool:
+    """Проверяет, входит ли тип содержимого в список сжимаемых."""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return any(media_type == allowed or (allowed.endswith("/") and media_type.startswith(allowed))
+               for allowed in COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Выбирает кодировку по заголовку Accept-Encoding: br (если доступен), затем gzip."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Потоковый компрессор с единым интерфейсом для gzip и brotli."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """Сжимает тело ответа целиком."""
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class _CompressingSend:
+    """
+    Обертка над send: откладывает начало ответа до первого фрагмента тела
+    и решает, сжимать ли его (по типу содержимого, размеру и заголовкам).
+    """
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self._send = send
+        self._encoding = encoding
+        self._minimum_size = minimum_size
+        self._start_message = None
+        self._compressor: Optional[_Compressor] = None
+        self._passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self._start_message = message
+            headers = _header_dict(message.get("headers", []))
+            self._passthrough = (
+                "content-encoding" in headers
+                or not is_compressible(headers.get("content-type", ""))
+            )
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        if self._passthrough:
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            if not more_body:
+                # Ответ целиком в одном сообщении
+                if len(body) < self._minimum_size:
+                    self._passthrough = True
+                    await self._flush_start()
+                    await self._send(message)
+                    return
+                compressed = compress_body(body, self._encoding)
+                self._set_encoding_headers(len(compressed))
+                await self._flush_start()
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            # Потоковый ответ: итоговый размер неизвестен, сжимаем по частям
+            self._compressor = _Compressor(self._encoding)
+            self._set_encoding_headers(None)
+            await self._flush_start()
+
+        chunk = self._compressor.compress(body)
+        if not more_body:
+            chunk += self._compressor.finish()
+        if chunk or not more_body:
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _set_encoding_headers(self, content_length: Optional[int]):
+        headers: List[Tuple[bytes, bytes]] = [
+            (name, value) for name, value in self._start_message.get("headers", [])
+            if name.lower() not in (b"content-length", b"vary")
+        ]
+        vary = _header_dict(self._start_message.get("headers", [])).get("vary")
+        headers.append((b"vary", f"{vary}, Accept-Encoding".encode("latin-1") if vary else b"Accept-Encoding"))
+        headers.append((b"content-encoding", self._encoding.encode("latin-1")))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        self._start_message = {**self._start_message, "headers": headers}
+
+    async def _flush_start(self):
+        if self._start_message is not None:
+            await self._send(self._start_message)
+            self._start_message = None
+
+
+def _header_dict(raw_headers) -> dict:
+    return {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in raw_headers}
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: сжимает ответы в br или gzip в зависимости от Accept-Encoding.
+    Файлы и небольшие ответы (меньше minimum_size) передаются без изменений.
+    """
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = _header_dict(scope.get("headers", []))
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
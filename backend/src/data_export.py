@@ -0,0 +1,222 @@
+"""
+Полная выгрузка данных системы.
+
+Таблицы и их столбцы описаны в EXPORT_TABLES (в порядке, подходящем для
+импорта; BLOB-столбцы не выгружаются). Строки читаются серверным курсором
+пачками по EXPORT_BATCH_SIZE (yield_per), поэтому потоковая выгрузка в
+NDJSON занимает постоянный объем памяти независимо от размера базы.
+
+Формат NDJSON: первая строка - заголовок {"format": "frieren-export",
+"version": 1, "tables": [...]}, далее по строке на запись:
+{"table": "students", "row": {...}}. Последняя строка - {"end": true,
+"counts": {...}} с числом записей по таблицам: без нее файл оборван.
+
+Для аналитики таблицы выгружаются и в Parquet (по файлу на таблицу, сжатие
+zstd, схема берется из типов столбцов модели) - отдельно или ZIP-архивом
+всех таблиц. Нужен pyarrow; без него Parquet-выгрузка недоступна.
+"""
+import json
+import logging
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy import select, Boolean, Float, Integer
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Student, Teacher, TeacherGroup, Lecture, Attendance, Homework, HomeworkReview, StudentHomeworkVariant, ExamGrade
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow необязателен: нужен только для выгрузки в Parquet
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = "frieren-export"
+EXPORT_VERSION = 1
+
+# Строк в одной пачке серверного курсора
+EXPORT_BATCH_SIZE = 1000
+
+# Строк в группе строк (row group) Parquet-файла и сжатие столбцов
+PARQUET_ROW_GROUP_SIZE = 64 * 1024
+PARQUET_COMPRESSION = "zstd"
+
+# Таблица выгрузки -> (модель, столбцы)
+EXPORT_TABLES: Dict[str, Tuple[Any, Tuple[str, ...]]] = {
+    "students": (Student, ("id", "year", "full_name", "telegram", "github", "group_number", "chat_id", "is_deleted")),
+    "teachers": (Teacher, ("id", "full_name", "telegram", "is_deleted")),
+    "teacher_groups": (TeacherGroup, ("id", "teacher_id", "group_number")),
+    "lectures": (Lecture, ("id", "number", "topic", "date", "start_time", "secret_code", "max_student", "github_example")),
+    "attendance": (Attendance, ("id", "student_id", "lecture_id", "present")),
+    "homework": (Homework, ("id", "number", "due_date", "short_description", "example_link", "assigned_date", "variants_count")),
+    "homework_reviews": (HomeworkReview, (
+        "id", "student_id", "number", "send_date", "review_date", "url", "result", "comments", "local_directory", "ai_percentage"
+    )),
+    "student_homework_variants": (StudentHomeworkVariant, ("id", "student_id", "homework_id", "variant_number")),
+    "exam_grades": (ExamGrade, ("id", "date", "grade", "variant_number", "student_id")),
+}
+
+
+def iter_table_batches(db: Session, table: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Строки таблицы (по возрастанию id) пачками по batch_size через серверный курсор."""
+    model, columns = EXPORT_TABLES[table]
+    result = db.execute(
+        select(*(getattr(model, column) for column in columns))
+        .order_by(model.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in result.partitions():
+        yield [dict(zip(columns, row)) for row in partition]
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is None:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+    return orjson.dumps(value)
+
+
+def _snapshot_session() -> Session:
+    """Сессия, все запросы которой видят один снимок базы (REPEATABLE READ)."""
+    db = SessionLocal()
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    return db
+
+
+def iter_ndjson(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Выгрузка всех таблиц в NDJSON по пачкам. Открывает собственную сессию:
+    генератор выполняется при отправке ответа, после выхода из эндпоинта.
+    Все таблицы читаются из одного снимка базы (REPEATABLE READ).
+    """
+    db = _snapshot_session()
+    counts = {}
+    try:
+        yield _dumps({
+            "format": EXPORT_FORMAT,
+            "version": EXPORT_VERSION,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+            "tables": list(EXPORT_TABLES),
+        }) + b"\n"
+        for table in EXPORT_TABLES:
+            counts[table] = 0
+            for rows in iter_table_batches(db, table, batch_size):
+                counts[table] += len(rows)
+                yield b"".join(_dumps({"table": table, "row": row}) + b"\n" for row in rows)
+        yield _dumps({"end": True, "counts": counts}) + b"\n"
+        logger.info(f"NDJSON export finished: {counts}")
+    finally:
+        db.close()
+
+
+def parquet_available() -> bool:
+    return pyarrow is not None
+
+
+def _arrow_schema(table: str) -> "pyarrow.Schema":
+    """Схема Arrow по типам столбцов модели (все столбцы допускают null)."""
+    model, columns = EXPORT_TABLES[table]
+    fields = []
+    for name in columns:
+        column_type = model.__table__.c[name].type
+        if isinstance(column_type, Boolean):
+            arrow_type = pyarrow.bool_()
+        elif isinstance(column_type, Integer):
+            arrow_type = pyarrow.int64()
+        elif isinstance(column_type, Float):
+            arrow_type = pyarrow.float64()
+        else:
+            arrow_type = pyarrow.string()
+        fields.append(pyarrow.field(name, arrow_type))
+    return pyarrow.schema(fields)
+
+
+class _ChunkSink:
+    """Файл только для записи: накапливает записанное до take() (для потоковой отдачи)."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _write_parquet(db: Session, table: str, sink, flush) -> Iterator[bytes]:
+    """
+    Пишет таблицу в Parquet-файл sink группами строк по PARQUET_ROW_GROUP_SIZE
+    и после каждой группы отдает накопленные байты (flush()).
+    """
+    schema = _arrow_schema(table)
+    writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode="w"), schema, compression=PARQUET_COMPRESSION)
+    batches, rows_pending, total = [], 0, 0
+    for rows in iter_table_batches(db, table):
+        batches.append(pyarrow.RecordBatch.from_pylist(rows, schema=schema))
+        rows_pending += len(rows)
+        if rows_pending >= PARQUET_ROW_GROUP_SIZE:
+            writer.write_table(pyarrow.Table.from_batches(batches, schema), row_group_size=rows_pending)
+            total += rows_pending
+            batches, rows_pending = [], 0
+            yield flush()
+    if batches:
+        writer.write_table(pyarrow.Table.from_batches(batches, schema), row_group_size=rows_pending)
+        total += rows_pending
+    writer.close()
+    logger.info(f"Parquet export of {table}: {total} rows")
+    yield flush()
+
+
+def iter_parquet(table: str) -> Iterator[bytes]:
+    """Таблица table в формате Parquet по частям (по группе строк)."""
+    db = _snapshot_session()
+    try:
+        sink = _ChunkSink()
+        for chunk in _write_parquet(db, table, sink, sink.take):
+            if chunk:
+                yield chunk
+    finally:
+        db.close()
+
+
+def iter_parquet_zip() -> Iterator[bytes]:
+    """
+    ZIP-архив с Parquet-файлом <таблица>.parquet для каждой таблицы (из одного
+    снимка базы). Файлы уже сжаты, поэтому в архиве хранятся без сжатия.
+    """
+    db = _snapshot_session()
+    try:
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            for table in EXPORT_TABLES:
+                with archive.open(f"{table}.parquet", mode="w", force_zip64=True) as entry:
+                    for chunk in _write_parquet(db, table, entry, sink.take):
+                        if chunk:
+                            yield chunk
+        yield sink.take()
+    finally:
+        db.close()
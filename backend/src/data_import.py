@@ -0,0 +1,207 @@
+"""
+Импорт полной выгрузки (см. data_export) в одной транзакции.
+
+Строки вставляются пачками по IMPORT_BATCH_SIZE (executemany, который
+SQLAlchemy превращает в многострочные INSERT ... VALUES). Записям выдаются
+новые id: для таблиц, на которые ссылаются другие, новые id возвращаются
+той же пачкой (RETURNING в порядке строк), и внешние ключи следующих таблиц
+переписываются по накопленному соответствию старых и новых id.
+
+Очистка таблиц и вставка выполняются в одной транзакции: при ошибке
+(неверный формат, нарушение ограничений, таймаут) изменения откатываются
+и в базе остаются прежние данные. NDJSON-файл фиксируется, только если
+он заканчивается завершающей строкой выгрузки и число записей совпадает.
+"""
+import json
+import logging
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from data_export import EXPORT_FORMAT, EXPORT_VERSION, EXPORT_TABLES
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Строк в одной пачке вставки
+IMPORT_BATCH_SIZE = 1000
+
+# Внешние ключи выгрузки: таблица -> столбец -> таблица, на id которой он ссылается
+FOREIGN_KEYS: Dict[str, Dict[str, str]] = {
+    "teacher_groups": {"teacher_id": "teachers"},
+    "attendance": {"student_id": "students", "lecture_id": "lectures"},
+    "homework_reviews": {"student_id": "students"},
+    "student_homework_variants": {"student_id": "students", "homework_id": "homework"},
+    "exam_grades": {"student_id": "students"},
+}
+
+_REFERENCED_TABLES = {table for columns in FOREIGN_KEYS.values() for table in columns.values()}
+
+
+def _column_defaults(model, columns) -> Dict[str, Any]:
+    """Значения отсутствующих в записи столбцов: скалярный default модели или None."""
+    defaults = {}
+    for name in columns:
+        default = model.__table__.c[name].default
+        defaults[name] = default.arg if default is not None and default.is_scalar else None
+    return defaults
+
+
+class DataImport:
+    """
+    Импорт записей выгрузки в переданную сессию. Записи одной таблицы
+    накапливаются и вставляются пачками; таблицы, на которые ссылаются
+    другие, должны идти раньше ссылающихся на них (как в выгрузке).
+    Транзакцией управляет вызывающий код: commit после finish(), rollback
+    при любом исключении.
+    """
+
+    def __init__(self, db: Session, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.counts: Dict[str, int] = {table: 0 for table in EXPORT_TABLES}
+        self.id_mapping: Dict[str, Dict[int, int]] = {table: {} for table in _REFERENCED_TABLES}
+        self._defaults = {table: _column_defaults(model, columns[1:]) for table, (model, columns) in EXPORT_TABLES.items()}
+        self._table: Optional[str] = None
+        self._rows: List[Dict[str, Any]] = []
+
+    def clear(self) -> None:
+        """Удаляет данные всех таблиц выгрузки (ссылающиеся таблицы - первыми)."""
+        for table in reversed(list(EXPORT_TABLES)):
+            model, _ = EXPORT_TABLES[table]
+            self.db.execute(delete(model))
+
+    def add(self, table: str, row: Dict[str, Any]) -> None:
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        if not isinstance(row, dict):
+            raise ValueError(f"Row of {table} must be an object")
+        if table != self._table:
+            self.flush()
+            self._table = table
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Вставляет накопленную пачку одной таблицы."""
+        if not self._rows:
+            return
+        table, rows = self._table, self._rows
+        self._rows = []
+        model, _ = EXPORT_TABLES[table]
+        defaults = self._defaults[table]
+        foreign_keys = FOREIGN_KEYS.get(table, {})
+
+        values = []
+        for row in rows:
+            item = {name: row.get(name, default) for name, default in defaults.items()}
+            for column, parent in foreign_keys.items():
+                old_id = item[column]
+                # Ссылки на записи, которых нет в выгрузке, остаются как есть
+                item[column] = self.id_mapping[parent].get(old_id, old_id)
+            values.append(item)
+
+        if table in self.id_mapping:
+            statement = insert(model.__table__).returning(model.__table__.c.id, sort_by_parameter_order=True)
+            new_ids = self.db.execute(statement, values).scalars().all()
+            mapping = self.id_mapping[table]
+            for row, new_id in zip(rows, new_ids):
+                if row.get("id") is not None:
+                    mapping[row["id"]] = new_id
+        else:
+            self.db.execute(insert(model.__table__), values)
+        self.counts[table] += len(rows)
+
+    def finish(self) -> Dict[str, int]:
+        """Вставляет остаток и возвращает число импортированных записей по таблицам и total_records."""
+        self.flush()
+        summary = dict(self.counts)
+        summary["total_records"] = sum(self.counts.values())
+        return summary
+
+
+def _loads(line: bytes) -> Any:
+    if orjson is None:
+        return json.loads(line)
+    return orjson.loads(line)
+
+
+def iter_ndjson_records(stream: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    """
+    Записи NDJSON-выгрузки из файла, построчно, последней - завершающая
+    строка {"end": true, "counts": {...}}. Заголовок проверяется (формат
+    и версия); ValueError - файл не является выгрузкой, строка повреждена
+    или файл оборван (нет завершающей строки).
+    """
+    header = None
+    end = None
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = _loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {line_number}: invalid JSON: {e}")
+        if header is None:
+            header = record
+            if not isinstance(header, dict) or header.get("format") != EXPORT_FORMAT:
+                raise ValueError(f"Line {line_number}: not a {EXPORT_FORMAT} file")
+            if not isinstance(header.get("version"), int) or header["version"] > EXPORT_VERSION:
+                raise ValueError(f"Unsupported export version: {header.get('version')}")
+            continue
+        if end is not None:
+            raise ValueError(f"Line {line_number}: data after the end line")
+        if isinstance(record, dict) and record.get("end") is True:
+            if not isinstance(record.get("counts"), dict):
+                raise ValueError(f"Line {line_number}: end line without counts")
+            end = record
+        elif not isinstance(record, dict) or "table" not in record or "row" not in record:
+            raise ValueError(f"Line {line_number}: expected {{\"table\": ..., \"row\": ...}}")
+        yield record
+    if header is None:
+        raise ValueError("Empty export file")
+    if end is None:
+        raise ValueError("Export file is truncated: no end line")
+
+
+def _check_counts(imported: Dict[str, int], expected: Dict[str, Any]) -> None:
+    """Сверяет число импортированных записей с завершающей строкой выгрузки."""
+    mismatched = [
+        f"{table}: {imported.get(table, 0)} of {expected.get(table, 0)}"
+        for table in dict.fromkeys([*imported, *expected])
+        if imported.get(table, 0) != expected.get(table, 0)
+    ]
+    if mismatched:
+        raise ValueError(f"Record counts do not match the end line: {', '.join(mismatched)}")
+
+
+def import_ndjson(db: Session, stream: IO[bytes], batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Заменяет данные всех таблиц содержимым NDJSON-выгрузки и фиксирует
+    транзакцию - только если файл дочитан до завершающей строки и число
+    записей по таблицам с ней совпадает. При ошибке откатывает транзакцию
+    и пробрасывает исключение.
+    """
+    importer = DataImport(db, batch_size)
+    try:
+        importer.clear()
+        for record in iter_ndjson_records(stream):
+            if record.get("end") is True:
+                importer.flush()
+                _check_counts(importer.counts, record["counts"])
+            else:
+                importer.add(record["table"], record["row"])
+        summary = importer.finish()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"NDJSON import finished: {summary}")
+    return summary
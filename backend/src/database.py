@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float, Boolean, LargeBinary
+from sqlalchemy import create_engine, event, inspect, exists, and_, or_, Column, Index, Integer, String, Date, Float, Boolean, LargeBinary
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 import os
+import deadlines
 
 DB_USER = os.getenv("DB_USER", "frieren")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "frieren")
@@ -24,6 +25,14 @@ engine = create_engine(
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@event.listens_for(SessionLocal, "after_begin")
+def apply_request_deadline(session, transaction, connection):
+    """Ограничивает время SQL-запросов остатком бюджета текущего HTTP-запроса."""
+    timeout_ms = deadlines.statement_timeout_ms()
+    if timeout_ms is not None:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
 Base = declarative_base()
 
 class Student(Base):
@@ -56,6 +65,13 @@ class Attendance(Base):
     lecture_id = Column(Integer, nullable=False)
     present = Column(Integer, nullable=False)  # 1 - присутствовал, 0 - нет
 
+    __table_args__ = (
+        # Одна запись на студента и лекцию (цель для INSERT ... ON CONFLICT)
+        Index("uq_attendance_student_lecture", "student_id", "lecture_id", unique=True),
+        # Подсчет присутствующих на лекции (проверка вместимости)
+        Index("ix_attendance_lecture_present", "lecture_id", "present"),
+    )
+
 class Homework(Base):
     __tablename__ = "homework"
     id = Column(Integer, primary_key=True, index=True)
@@ -80,6 +96,11 @@ class HomeworkReview(Base):
     local_directory = Column(String, nullable=True)  # Путь к локальной директории с проектом
     ai_percentage = Column(Float, nullable=True)  # Процент AI-генерации кода
 
+    __table_args__ = (
+        # Работы студентов по номеру ДЗ (статистика преподавателей, поиск сдач студента)
+        Index("ix_homework_review_student_number", "student_id", "number"),
+    )
+
 class StudentHomeworkVariant(Base):
     __tablename__ = "student_homework_variants"
     id = Column(Integer, primary_key=True, index=True)
@@ -111,6 +132,37 @@ class ExamGrade(Base):
 
 Base.metadata.create_all(bind=engine)
 
+def deduplicate_attendance():
+    """
+    Удаляет дубли посещаемости (student_id, lecture_id), оставшиеся от времени
+    без уникального индекса: сохраняется запись с отметкой присутствия, затем самая новая.
+    """
+    attendance = Attendance.__table__
+    other = attendance.alias("other")
+    with engine.begin() as connection:
+        connection.execute(attendance.delete().where(exists().where(
+            other.c.student_id == attendance.c.student_id,
+            other.c.lecture_id == attendance.c.lecture_id,
+            or_(
+                other.c.present > attendance.c.present,
+                and_(other.c.present == attendance.c.present, other.c.id > attendance.c.id)
+            )
+        )))
+
+def ensure_indexes():
+    """create_all не добавляет индексы в уже существующие таблицы - создаем недостающие."""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.name == "uq_attendance_student_lecture":
+                deduplicate_attendance()
+            index.create(bind=engine)
+
+ensure_indexes()
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,264 @@
+"""
+Дедлайны запросов: бюджет времени по маршрутам, его передача в БД и внешние
+вызовы, а также перевод долгих операций в фоновые задачи (202 + job_id).
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Таймаут по умолчанию для читающих запросов, не описанных в ROUTE_DEADLINES
+DEFAULT_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+
+# Таймаут по умолчанию для изменяющих запросов: синхронный обработчик нельзя
+# прервать, и после таймаута он все равно может зафиксировать изменения,
+# поэтому бюджет записи остается большим, а медленные записи перечислены явно
+WRITE_TIMEOUT = float(os.getenv("REQUEST_WRITE_TIMEOUT", "900"))
+
+# Методы, таймаут которых не оставляет неизвестных изменений
+SAFE_METHODS = ("GET", "HEAD")
+
+# Сколько хранить результаты фоновых задач (в секундах)
+JOB_TTL = 3600
+
+
+@dataclass(frozen=True)
+class RouteDeadline:
+    method: str
+    pattern: str
+    timeout: float  # жесткий предел выполнения запроса (в секундах)
+    detach_after: Optional[float] = None  # через сколько секунд вернуть 202 и продолжить в фоне
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and re.match(self.pattern, path) is not None
+
+
+# Бюджеты времени для медленных маршрутов. Первое совпадение выигрывает.
+ROUTE_DEADLINES: List[RouteDeadline] = [
+    RouteDeadline("GET", r"^/api/google_sheet/all/?$", timeout=900.0, detach_after=30.0),
+    RouteDeadline("POST", r"^/api/google_sheet/import-ratings/?$", timeout=600.0, detach_after=30.0),
+    RouteDeadline("POST", r"^/api/google_sheet/", timeout=120.0),
+    RouteDeadline("POST", r"^/api/homework_review/\d+/download/?$", timeout=330.0),
+    RouteDeadline("POST", r"^/api/homework_review/\d+/check-ai/?$", timeout=900.0),
+    RouteDeadline("GET", r"^/api/export/(ndjson|parquet)(/\w+)?/?$", timeout=3600.0),  # потоковая выгрузка всей базы
+    RouteDeadline("GET", r"^/api/export/", timeout=300.0),
+    RouteDeadline("POST", r"^/api/import/", timeout=600.0),
+    RouteDeadline("POST", r"^/api/lectures/\d+/presentation/?$", timeout=120.0),
+    RouteDeadline("PUT", r"^/api/lectures/\d+/presentation/?$", timeout=120.0),
+    RouteDeadline("POST", r"^/api/exam_grades/with-pdf/?$", timeout=120.0),
+    RouteDeadline("PUT", r"^/api/exam_grades/\d+/pdf/?$", timeout=120.0),
+]
+
+# Абсолютный дедлайн текущего запроса (по time.monotonic())
+_current_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+# Фоновые задачи: job_id -> состояние
+_jobs: Dict[str, Dict[str, Any]] = {}
+
+
+def resolve_deadline(method: str, path: str) -> RouteDeadline:
+    """Возвращает бюджет времени для маршрута."""
+    for deadline in ROUTE_DEADLINES:
+        if deadline.matches(method, path):
+            return deadline
+    return RouteDeadline(method, path, timeout=DEFAULT_TIMEOUT if method in SAFE_METHODS else WRITE_TIMEOUT)
+
+
+def remaining() -> Optional[float]:
+    """Сколько секунд осталось до дедлайна текущего запроса (None - дедлайна нет)."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def call_timeout(default: float, minimum: float = 1.0) -> float:
+    """
+    Таймаут для внешнего вызова (HTTP, subprocess): не больше default
+    и не больше остатка бюджета запроса.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    return max(minimum, min(default, left))
+
+
+def statement_timeout_ms() -> Optional[int]:
+    """Значение statement_timeout для PostgreSQL по остатку бюджета запроса."""
+    left = remaining()
+    if left is None:
+        return None
+    return max(1, int(left * 1000))
+
+
+def _timeout_response(method: str, timeout: float) -> JSONResponse:
+    """
+    Ответ на превышение бюджета: 408 для читающих запросов; для изменяющих -
+    504, так как обработчик мог успеть (или еще успеет) зафиксировать изменения.
+    """
+    if method in SAFE_METHODS:
+        return JSONResponse(
+            status_code=408,
+            content={"detail": f"Request timeout after {timeout:.0f} seconds"}
+        )
+    return JSONResponse(
+        status_code=504,
+        content={
+            "detail": f"Request timeout after {timeout:.0f} seconds; the outcome is unknown, "
+                      f"changes may have been applied - check the data before retrying"
+        }
+    )
+
+
+def _prune_jobs() -> None:
+    now = time.time()
+    expired = [job_id for job_id, job in _jobs.items()
+               if job["finished_at"] is not None and now - job["finished_at"] > JOB_TTL]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Возвращает состояние фоновой задачи для отдачи клиенту."""
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    return {key: value for key, value in job.items() if key != "task"}
+
+
+class _CapturingSend:
+    """
+    Обертка над send: пока запрос не отсоединен, проксирует сообщения клиенту,
+    после отсоединения - накапливает ответ для фоновой задачи.
+    """
+
+    def __init__(self, send):
+        self._send = send
+        self.detached = False
+        self.started = False
+        self.status_code: Optional[int] = None
+        self.body = bytearray()
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.started = True
+            self.status_code = message["status"]
+        elif message["type"] == "http.response.body" and self.detached:
+            # Тело нужно только фоновой задаче; потоковые ответы не накапливаются в памяти
+            self.body.extend(message.get("body", b""))
+        if not self.detached:
+            await self._send(message)
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware: устанавливает дедлайн запроса по таблице ROUTE_DEADLINES.
+    При превышении бюджета обычный запрос отменяется (408, для изменяющих
+    запросов - 504 с неизвестным исходом), а маршрут с
+    detach_after продолжает выполняться в фоне, клиент получает 202 и job_id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = resolve_deadline(scope["method"], scope["path"])
+        token = _current_deadline.set(time.monotonic() + deadline.timeout)
+        try:
+            if deadline.detach_after is None:
+                await self._run_with_timeout(scope, receive, send, deadline)
+            else:
+                await self._run_detachable(scope, receive, send, deadline)
+        finally:
+            _current_deadline.reset(token)
+
+    async def _run_with_timeout(self, scope, receive, send, deadline: RouteDeadline):
+        capture = _CapturingSend(send)
+        try:
+            async with asyncio.timeout(deadline.timeout):
+                await self.app(scope, receive, capture)
+        except TimeoutError:
+            logger.error(f"Request timeout after {deadline.timeout:.0f} seconds: {scope['method']} {scope['path']}")
+            if capture.started:
+                # Ответ уже начал отправляться - корректно сообщить об ошибке нельзя
+                return
+            response = _timeout_response(scope["method"], deadline.timeout)
+            await response(scope, receive, send)
+
+    async def _run_detachable(self, scope, receive, send, deadline: RouteDeadline):
+        capture = _CapturingSend(send)
+
+        async def run():
+            async with asyncio.timeout(deadline.timeout):
+                await self.app(scope, receive, capture)
+
+        task = asyncio.create_task(run())
+        done, _ = await asyncio.wait({task}, timeout=deadline.detach_after)
+        if task in done or capture.started:
+            # Успели в бюджет (или ответ уже отправляется) - дожидаемся как обычно
+            try:
+                await task
+            except TimeoutError:
+                logger.error(f"Request timeout after {deadline.timeout:.0f} seconds: {scope['method']} {scope['path']}")
+                if not capture.started:
+                    response = _timeout_response(scope["method"], deadline.timeout)
+                    await response(scope, receive, send)
+            return
+
+        capture.detached = True
+        _prune_jobs()
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": "running",
+            "status_code": None,
+            "result": None,
+            "created_at": time.time(),
+            "finished_at": None,
+            "task": task,
+        }
+        task.add_done_callback(lambda t: self._finish_job(job_id, t, capture))
+        logger.info(f"Request {scope['method']} {scope['path']} exceeded {deadline.detach_after:.0f}s budget, continuing as job {job_id}")
+
+        response = JSONResponse(
+            status_code=202,
+            content={"job_id": job_id, "status": "running", "status_url": f"/api/jobs/{job_id}"}
+        )
+        await response(scope, receive, send)
+
+    @staticmethod
+    def _finish_job(job_id: str, task: asyncio.Task, capture: _CapturingSend):
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["finished_at"] = time.time()
+        job.pop("task", None)
+        error = None if task.cancelled() else task.exception()
+        if task.cancelled() or error is not None:
+            job["status"] = "failed"
+            job["result"] = {"detail": str(error) if error is not None and not isinstance(error, TimeoutError) else "Job timed out"}
+            logger.error(f"Job {job_id} failed: {job['result']['detail']}")
+            return
+        job["status_code"] = capture.status_code
+        job["status"] = "done" if capture.status_code is not None and capture.status_code < 400 else "failed"
+        try:
+            job["result"] = json.loads(bytes(capture.body)) if capture.body else None
+        except ValueError:
+            job["result"] = bytes(capture.body).decode("utf-8", errors="replace")
+        logger.info(f"Job {job_id} finished with status {job['status_code']}")
@@ -0,0 +1,192 @@
+"""
+Индекс лекций в памяти процесса: поиск по секретному коду, номеру и id без
+обращения к БД. Индекс сбрасывается после commit любой транзакции, изменившей
+лекции, а другие воркеры узнают об изменении через PostgreSQL LISTEN/NOTIFY.
+"""
+import logging
+import select
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, event, func
+from sqlalchemy.orm import Session, defer
+
+from database import SessionLocal, engine, Lecture
+from models import LectureInfo
+
+logger = logging.getLogger(__name__)
+
+# Канал PostgreSQL для уведомлений об изменении лекций
+NOTIFY_CHANNEL = "lectures_changed"
+
+# Если слушатель уведомлений не работает, индекс перечитывается не реже этого интервала (в секундах)
+MAX_AGE = 60
+
+# Признак наличия презентации вычисляется в БД, сам файл не загружается
+HAS_PRESENTATION = and_(
+    Lecture.presentation_blob.isnot(None), func.length(Lecture.presentation_blob) > 0
+).label("has_presentation")
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    by_id: Dict[int, LectureInfo]
+    by_secret_code: Dict[str, LectureInfo]
+    by_number: Dict[int, LectureInfo]
+    loaded_at: float
+
+
+_lock = threading.Lock()
+_snapshot: Optional[_Snapshot] = None
+_listener: Optional[threading.Thread] = None
+_listening = False  # подписка LISTEN активна - индекс актуален без ограничения по времени
+
+
+def invalidate() -> None:
+    """Сбрасывает индекс; следующий поиск перечитает лекции из БД."""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+    logger.info("Lecture index invalidated")
+
+
+def _is_fresh(snapshot: Optional[_Snapshot]) -> bool:
+    if snapshot is None:
+        return False
+    return _listening or time.monotonic() - snapshot.loaded_at < MAX_AGE
+
+
+def _get_snapshot(db: Session) -> _Snapshot:
+    global _snapshot
+    snapshot = _snapshot
+    if _is_fresh(snapshot):
+        return snapshot
+    _start_listener()
+    with _lock:
+        # Пока ждали блокировку, индекс мог загрузить другой поток
+        if _is_fresh(_snapshot):
+            return _snapshot
+        loaded_at = time.monotonic()
+        rows = db.query(Lecture, HAS_PRESENTATION).options(
+            defer(Lecture.presentation_blob)
+        ).order_by(Lecture.id).all()
+        by_id, by_secret_code, by_number = {}, {}, {}
+        for lecture, has_presentation in rows:
+            info = LectureInfo(
+                id=lecture.id,
+                number=lecture.number,
+                topic=lecture.topic,
+                date=lecture.date,
+                start_time=lecture.start_time,
+                secret_code=lecture.secret_code,
+                max_student=lecture.max_student,
+                github_example=lecture.github_example,
+                has_presentation=bool(has_presentation)
+            )
+            by_id[lecture.id] = info
+            # При совпадении кода или номера выигрывает лекция с меньшим id
+            if lecture.secret_code:
+                by_secret_code.setdefault(lecture.secret_code, info)
+            by_number.setdefault(lecture.number, info)
+        _snapshot = _Snapshot(by_id, by_secret_code, by_number, loaded_at)
+    logger.info(f"Lecture index loaded: {len(rows)} lectures")
+    return _snapshot
+
+
+def by_secret_code(db: Session, secret_code: str) -> Optional[LectureInfo]:
+    """Лекция по секретному коду (копия записи индекса) или None."""
+    info = _get_snapshot(db).by_secret_code.get(secret_code)
+    return dict(info) if info is not None else None
+
+
+def by_number(db: Session, number: int) -> Optional[LectureInfo]:
+    """Лекция по номеру (копия записи индекса) или None."""
+    info = _get_snapshot(db).by_number.get(number)
+    return dict(info) if info is not None else None
+
+
+def by_id(db: Session, lecture_id: int) -> Optional[LectureInfo]:
+    """Лекция по id (копия записи индекса) или None."""
+    info = _get_snapshot(db).by_id.get(lecture_id)
+    return dict(info) if info is not None else None
+
+
+def all_lectures(db: Session) -> List[LectureInfo]:
+    """Все лекции, упорядоченные по номеру (копии записей индекса)."""
+    return [dict(info) for info in sorted(_get_snapshot(db).by_id.values(), key=lambda info: (info['number'], info['id']))]
+
+
+def _notify_other_workers() -> None:
+    try:
+        with engine.connect() as connection:
+            connection.execute(func.pg_notify(NOTIFY_CHANNEL, "").select())
+            connection.commit()
+    except Exception as e:
+        logger.error(f"Failed to notify other workers about lecture changes: {e}")
+
+
+def _listen() -> None:
+    """Фоновый поток: сбрасывает индекс по уведомлениям из других процессов."""
+    global _listening
+    while True:
+        connection = None
+        try:
+            connection = engine.raw_connection()
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            logger.info(f"Listening for lecture changes on channel {NOTIFY_CHANNEL}")
+            _listening = True
+            # Изменения, сделанные до подписки, могли быть пропущены
+            invalidate()
+            while True:
+                if select.select([dbapi_connection], [], [], MAX_AGE) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                if dbapi_connection.notifies:
+                    dbapi_connection.notifies.clear()
+                    invalidate()
+        except Exception as e:
+            _listening = False
+            logger.error(f"Lecture change listener failed, reconnecting: {e}")
+            if connection is not None:
+                connection.invalidate()
+            time.sleep(5)
+
+
+def _start_listener() -> None:
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, name="lecture-index-listener", daemon=True)
+            _listener.start()
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_lecture_changes(session, flush_context):
+    if any(isinstance(obj, Lecture) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["lectures_changed"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _track_bulk_lecture_changes(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and \
+            orm_execute_state.bind_mapper is not None and orm_execute_state.bind_mapper.class_ is Lecture:
+        orm_execute_state.session.info["lectures_changed"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("lectures_changed", False):
+        invalidate()
+        _notify_other_workers()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes_after_rollback(session):
+    session.info.pop("lectures_changed", None)
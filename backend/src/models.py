@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import List, TypedDict
 
 class StudentInfo(TypedDict):
     id : int
@@ -85,6 +85,80 @@ class AttendanceCreate(TypedDict):
 class AttendanceUpdate(TypedDict, total=False):
     present: bool
 
+class CheckInRequest(TypedDict):
+    secret_code: str  # секретный код лекции из QR
+    student_id: int
+
+class AttendanceMatrixLecture(TypedDict):
+    id: int
+    number: int
+    topic: str
+    date: str
+
+class AttendanceMatrixStudent(TypedDict):
+    id: int
+    full_name: str
+    telegram: str
+    group_number: str
+
+class AttendanceMatrixInfo(TypedDict):
+    encoding: str                             # bitset-base64-le
+    lectures: List[AttendanceMatrixLecture]   # столбцы матрицы (по номеру лекции)
+    students: List[AttendanceMatrixStudent]   # строки матрицы
+    rows: List[str]                           # битовая маска посещенных лекций для каждого студента (base64)
+    lecture_totals: List[int]                 # присутствовало на каждой лекции
+    student_totals: List[int]                 # посещено лекций каждым студентом
+
+class LectureTurnoutInfo(TypedDict):
+    lecture_id: int
+    number: int
+    topic: str
+    date: str
+    present: int      # присутствовало студентов
+    students: int     # активных студентов
+    rate: float       # доля присутствовавших (0..1)
+
+class GroupTrendInfo(TypedDict):
+    group_number: str
+    students: int
+    rates: List[float]   # явка группы на каждой прошедшей лекции (по номеру лекции)
+    average_rate: float
+    trend: float         # изменение явки за одну лекцию (наклон линейного тренда)
+
+class StudentAttendanceStatsInfo(TypedDict):
+    student_id: int
+    full_name: str
+    telegram: str
+    group_number: str
+    attended: int         # посещено прошедших лекций
+    held: int             # всего прошедших лекций
+    rate: float
+    current_streak: int   # посещено подряд последних лекций
+    longest_streak: int   # самая длинная серия посещений
+    missed_in_row: int    # пропущено подряд последних лекций
+
+class AttendanceBulkItem(TypedDict):
+    student_id: int
+    present: bool
+
+class AttendanceBulkCreate(TypedDict):
+    lecture_id: int
+    records: List[AttendanceBulkItem]
+
+class AttendanceBulkItemResult(TypedDict):
+    student_id: int
+    # created, updated, unchanged, student_not_found, lecture_full, duplicate
+    status: str
+    attendance_id: int | None
+
+class AttendanceBulkResult(TypedDict):
+    lecture_id: int
+    created: int
+    updated: int
+    unchanged: int
+    rejected: int
+    results: List[AttendanceBulkItemResult]
+
 class HomeworkInfo(TypedDict):
     id : int
     number: int
@@ -233,4 +307,19 @@ class ExamGradeUpdate(TypedDict, total=False):
     date: str  # дата экзамена (ISO формат)
     grade: int  # оценка за экзамен
     variant_number: int  # номер варианта
-    student_id: int  # идентификатор студента
\ No newline at end of file
+    student_id: int  # идентификатор студента
+
+# Очередь экспорта в Google Sheets
+class ExportQueueMetricsInfo(TypedDict):
+    enqueued: int  # поставлено обновлений (событий)
+    coalesced: int  # объединено с уже ожидающим обновлением той же строки
+    flushes: int  # записей в листы (по одной на лист за окно)
+    flushed_keys: int  # применено уникальных обновлений строк
+    flushed_events: int  # событий в примененных обновлениях
+    failed_flushes: int  # неудачных записей
+    retried: int  # обновлений, возвращенных в очередь после неудачной записи
+    dropped: int  # обновлений, отброшенных после всех попыток записи
+    last_flush_ms: float  # длительность последней записи
+    pending: int  # обновлений в очереди
+    coalescing_ratio: float  # событий на одно применённое обновление (flushed_events / flushed_keys)
+    window_seconds: float  # окно объединения
@@ -1,22 +1,52 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, defer
+from typing import List, Optional, Literal
 import logging
 from datetime import datetime, timezone, timedelta
-from models import AttendanceInfo, AttendanceCreate, AttendanceUpdate
+from models import AttendanceInfo, AttendanceCreate, AttendanceUpdate, CheckInRequest, AttendanceBulkCreate, AttendanceBulkItemResult, AttendanceBulkResult, AttendanceMatrixInfo
 from database import get_db, Attendance, Student, Lecture
+from lecture_index import HAS_PRESENTATION
+import lecture_index
+from attendance_matrix import build_attendance_matrix
+from routers.utils import keyset_paginate, resolve_sort, set_next_cursor, apply_date_range, fast_json_response, idempotent_response, remember_response, MAX_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/attendance", tags=["attendance"])
 
 
-def _lecture_has_presentation(lecture: Lecture) -> bool:
+def _lecture_has_presentation(db: Session, lecture_id: int) -> bool:
     """Проверяет, есть ли у лекции прикреплённая презентация."""
-    try:
-        return lecture.presentation_blob is not None and len(lecture.presentation_blob) > 0
-    except Exception:
-        return False
+    return bool(db.query(HAS_PRESENTATION).filter(Lecture.id == lecture_id).scalar())
+
+
+def _student_dict(student: Student) -> dict:
+    return {
+        'id' : student.id,
+        'year': student.year,
+        'full_name': student.full_name,
+        'telegram': student.telegram,
+        'github': student.github,
+        'group_number': student.group_number,
+        'chat_id': student.chat_id,
+        'is_deleted': student.is_deleted
+    }
+
+
+def _lecture_dict(lecture: Lecture, has_presentation: bool) -> dict:
+    return {
+        'id' : lecture.id,
+        'number': lecture.number,
+        'topic': lecture.topic,
+        'date': lecture.date,
+        'start_time': lecture.start_time,
+        'secret_code': lecture.secret_code,
+        'max_student' : lecture.max_student,
+        'github_example' : lecture.github_example,
+        'has_presentation': bool(has_presentation),
+    }
 
 
 def validate_attendance_time(lecture_date: str, lecture_start_time: Optional[str]) -> bool:
@@ -66,127 +96,357 @@ def validate_attendance_time(lecture_date: str, lecture_start_time: Optional[str
         logger.error(f"Error validating attendance time: {e}")
         return False
 
+def _upsert_attendance(db: Session, student_id: int, lecture_id: int, present: bool) -> int:
+    """
+    Создает или обновляет запись о посещении одним запросом
+    INSERT ... ON CONFLICT (student_id, lecture_id) DO UPDATE.
+    Возвращает id записи; commit выполняет вызывающий код.
+    """
+    stmt = pg_insert(Attendance).values(
+        student_id=student_id, lecture_id=lecture_id, present=int(present)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Attendance.student_id, Attendance.lecture_id],
+        set_={"present": stmt.excluded.present}
+    ).returning(Attendance.id)
+    return db.execute(stmt).scalar_one()
+
+
+def _reserve_seat(db: Session, lecture_id: int, student_id: int, log_prefix: str) -> None:
+    """
+    Атомарно проверяет вместимость лекции перед отметкой присутствия.
+    Строка лекции блокируется (SELECT ... FOR UPDATE) до конца транзакции, поэтому
+    параллельные отметки на одну лекцию проверяют вместимость по очереди, а отметки
+    на разные лекции друг друга не ждут. Сам студент не учитывается - повторная
+    отметка уже присутствующего студента место не занимает.
+    """
+    row = db.query(Lecture.max_student).filter(Lecture.id == lecture_id).with_for_update().first()
+    if row is None:
+        # Лекция удалена, а индекс лекций еще не обновился
+        logger.warning(f"{log_prefix} - Lecture {lecture_id} not found")
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    max_student = row.max_student
+    if max_student is None:
+        return
+    # Отдельный запрос после блокировки: видит все отметки, зафиксированные до нас
+    present_count = db.query(func.count(Attendance.id)).filter(
+        Attendance.lecture_id == lecture_id,
+        Attendance.present == 1,
+        Attendance.student_id != student_id
+    ).scalar()
+    if present_count >= max_student:
+        logger.warning(f"{log_prefix} - Lecture {lecture_id} is full ({max_student} students)")
+        raise HTTPException(status_code=409, detail="Lecture is full")
+
+
+# Ключи сортировки для списка посещаемости (последняя колонка - уникальный id)
+ATTENDANCE_SORT_KEYS = {
+    "id": [Attendance.id],
+    "lecture": [Attendance.lecture_id, Attendance.id],
+    "student": [Attendance.student_id, Attendance.id],
+}
+
 @router.get("/", response_model=List[AttendanceInfo])
 @router.get("", response_model=List[AttendanceInfo])
-def get_attendance(db: Session = Depends(get_db)):
-    logger.info("GET /api/attendance - Retrieving all attendance records")
-    records = db.query(Attendance).all()
-    result = []
-    for rec in records:
-        student = db.query(Student).filter(Student.id == rec.student_id, Student.is_deleted == False).first()
-        lecture = db.query(Lecture).filter(Lecture.id == rec.lecture_id).first()
-        if student and lecture:
-            result.append(AttendanceInfo(
-                id = rec.id,
-                student={
-                    'id' : student.id,
-                    'year': student.year,
-                    'full_name': student.full_name,
-                    'telegram': student.telegram,
-                    'github': student.github,
-                    'group_number': student.group_number,
-                    'chat_id': student.chat_id,
-                    'is_deleted': student.is_deleted
-                },
-                lecture={
-                    'id' : lecture.id,
-                    'number': lecture.number,
-                    'topic': lecture.topic,
-                    'date': lecture.date,
-                    'start_time': lecture.start_time,
-                    'secret_code': lecture.secret_code,
-                    'max_student' : lecture.max_student,
-                    'github_example' : lecture.github_example,
-                    'has_presentation': _lecture_has_presentation(lecture),
-                },
-                present=bool(rec.present)
-            ))
+def get_attendance(
+    response: Response,
+    lecture_id: Optional[int] = Query(None, description="Фильтр по лекции"),
+    student_id: Optional[int] = Query(None, description="Фильтр по студенту"),
+    group_number: Optional[str] = Query(None, description="Фильтр по номеру группы студента"),
+    date_from: Optional[str] = Query(None, description="Дата лекции не раньше (ISO)"),
+    date_to: Optional[str] = Query(None, description="Дата лекции не позже (ISO, включительно)"),
+    sort: str = Query("id", description="Ключ сортировки: id, lecture, student"),
+    order: Literal["asc", "desc"] = Query("asc", description="Направление сортировки"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (без параметра - все записи)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    db: Session = Depends(get_db)
+):
+    logger.info("GET /api/attendance - Retrieving attendance records")
+    columns = resolve_sort(ATTENDANCE_SORT_KEYS, sort)
+    query = db.query(Attendance).join(
+        Student, Student.id == Attendance.student_id
+    ).join(
+        Lecture, Lecture.id == Attendance.lecture_id
+    ).filter(Student.is_deleted == False)
+    if lecture_id is not None:
+        query = query.filter(Attendance.lecture_id == lecture_id)
+    if student_id is not None:
+        query = query.filter(Attendance.student_id == student_id)
+    if group_number is not None:
+        query = query.filter(Student.group_number == group_number)
+    query = apply_date_range(query, Lecture.date, date_from, date_to)
+    records, next_cursor = keyset_paginate(
+        query, columns, lambda rec: [getattr(rec, column.key) for column in columns],
+        cursor, limit, descending=(order == "desc")
+    )
+    set_next_cursor(response, next_cursor)
+
+    # Студентов и лекции страницы загружаем одним запросом каждую (без файлов презентаций)
+    student_ids = {rec.student_id for rec in records}
+    lecture_ids = {rec.lecture_id for rec in records}
+    students = {
+        student.id: _student_dict(student)
+        for student in db.query(Student).filter(Student.id.in_(student_ids))
+    } if student_ids else {}
+    lectures = {
+        lecture.id: _lecture_dict(lecture, has_presentation)
+        for lecture, has_presentation in db.query(Lecture, HAS_PRESENTATION).options(
+            defer(Lecture.presentation_blob)
+        ).filter(Lecture.id.in_(lecture_ids))
+    } if lecture_ids else {}
+
+    result = [
+        AttendanceInfo(
+            id=rec.id,
+            student=students[rec.student_id],
+            lecture=lectures[rec.lecture_id],
+            present=bool(rec.present)
+        )
+        for rec in records
+    ]
     logger.info(f"GET /api/attendance - Retrieved {len(result)} attendance records")
-    return result
+    return fast_json_response(result, response)
+
+@router.get("/matrix", response_model=AttendanceMatrixInfo)
+def get_attendance_matrix(
+    group_number: Optional[str] = Query(None, description="Фильтр по номеру группы студента"),
+    db: Session = Depends(get_db)
+):
+    """
+    Матрица посещаемости «студенты × лекции»: для каждого студента - битовая
+    маска посещенных лекций в base64 (бит j в байте j // 8 - лекция lectures[j]),
+    плюс итоги по лекциям и студентам.
+    """
+    logger.info("GET /api/attendance/matrix - Building attendance matrix")
+    matrix = build_attendance_matrix(db, group_number)
+    logger.info(f"GET /api/attendance/matrix - Built matrix {len(matrix['students'])} students x {len(matrix['lectures'])} lectures")
+    return fast_json_response(matrix)
 
 @router.post("/", response_model=AttendanceInfo)
 @router.post("", response_model=AttendanceInfo)
 def add_attendance(
     att: AttendanceCreate, 
     db: Session = Depends(get_db),
-    skip_time_validation: bool = Query(False, description="Skip time validation for attendance recording")
+    skip_time_validation: bool = Query(False, description="Skip time validation for attendance recording"),
+    idempotency_key: Optional[str] = Header(None, description="Ключ идемпотентности для повторов запроса")
 ):
     logger.info(f"POST /api/attendance - Adding attendance record for student_id: {att['student_id']}, lecture_id: {att['lecture_id']}")
+
+    cached = idempotent_response(idempotency_key, "POST /api/attendance", att)
+    if cached is not None:
+        logger.info(f"POST /api/attendance - Returning stored response for Idempotency-Key {idempotency_key}")
+        return cached
     
     # Получаем информацию о лекции для проверки времени
-    lecture = db.query(Lecture).filter(Lecture.id == att['lecture_id']).first()
+    lecture = lecture_index.by_id(db, att['lecture_id'])
     if not lecture:
         logger.error(f"POST /api/attendance - Lecture with id {att['lecture_id']} not found")
         raise HTTPException(status_code=404, detail="Lecture not found")
     
     # Проверяем время получения запроса (если не отключено)
-    if not skip_time_validation and not validate_attendance_time(lecture.date, lecture.start_time):
+    if not skip_time_validation and not validate_attendance_time(lecture['date'], lecture['start_time']):
         logger.warning(f"POST /api/attendance - Time validation failed for lecture_id: {att['lecture_id']}")
         raise HTTPException(status_code=400, detail="Attendance can only be recorded on the lecture date within 15 minutes before and after lecture start time")
     
     if skip_time_validation:
         logger.info(f"POST /api/attendance - Time validation skipped for lecture_id: {att['lecture_id']}")
+
+    student = db.query(Student).filter(Student.id == att['student_id'], Student.is_deleted == False).first()
+    if student is None:
+        logger.warning(f"POST /api/attendance - Student with id {att['student_id']} not found")
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    # Ответ собираем до commit, чтобы не перечитывать объекты после фиксации
+    result = AttendanceInfo(
+        id=0,
+        student=_student_dict(student),
+        lecture=lecture,
+        present=bool(att['present'])
+    )
+
+    if att['present']:
+        _reserve_seat(db, lecture['id'], student.id, "POST /api/attendance")
+    result['id'] = _upsert_attendance(db, student.id, lecture['id'], bool(att['present']))
+    db.commit()
+    remember_response(idempotency_key, "POST /api/attendance", att, result)
     
-    # Проверяем, существует ли уже запись о посещении
-    existing_attendance = db.query(Attendance).filter(
-        Attendance.student_id == att['student_id'],
-        Attendance.lecture_id == att['lecture_id']
-    ).first()
-    
-    if existing_attendance:
-        # Запись уже существует
-        current_present = bool(existing_attendance.present)
-        new_present = bool(att['present'])
-        
-        if current_present == new_present:
-            # Значения одинаковые - ничего не делаем
-            logger.info(f"POST /api/attendance - Attendance record already exists with same value (ID: {existing_attendance.id})")
-            db_att = existing_attendance
+    logger.info(f"POST /api/attendance - Successfully processed attendance record with ID: {result['id']}")
+    return result
+
+@router.post("/check-in", response_model=AttendanceInfo)
+def check_in(
+    checkin: CheckInRequest,
+    db: Session = Depends(get_db),
+    skip_time_validation: bool = Query(False, description="Skip time validation for attendance recording"),
+    idempotency_key: Optional[str] = Header(None, description="Ключ идемпотентности для повторов запроса")
+):
+    """
+    Отметка студента на лекции по секретному коду (QR) одним запросом:
+    поиск лекции, проверка времени и вместимости и запись посещения
+    выполняются в одной транзакции.
+    """
+    log_prefix = "POST /api/attendance/check-in"
+    logger.info(f"{log_prefix} - Check-in for student_id: {checkin['student_id']}")
+
+    cached = idempotent_response(idempotency_key, log_prefix, checkin)
+    if cached is not None:
+        logger.info(f"{log_prefix} - Returning stored response for Idempotency-Key {idempotency_key}")
+        return cached
+
+    lecture = lecture_index.by_secret_code(db, checkin['secret_code'])
+    if lecture is None:
+        logger.warning(f"{log_prefix} - Lecture not found by secret code")
+        raise HTTPException(status_code=404, detail="Lecture not found")
+
+    student = db.query(Student).filter(Student.id == checkin['student_id'], Student.is_deleted == False).first()
+    if student is None:
+        logger.warning(f"{log_prefix} - Student with id {checkin['student_id']} not found")
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    if not skip_time_validation and not validate_attendance_time(lecture['date'], lecture['start_time']):
+        logger.warning(f"{log_prefix} - Time validation failed for lecture_id: {lecture['id']}")
+        raise HTTPException(status_code=400, detail="Attendance can only be recorded on the lecture date within 15 minutes before and after lecture start time")
+
+    # Ответ собираем до commit, чтобы не перечитывать объекты после фиксации
+    result = AttendanceInfo(
+        id=0,
+        student=_student_dict(student),
+        lecture=lecture,
+        present=True
+    )
+
+    _reserve_seat(db, lecture['id'], student.id, log_prefix)
+    result['id'] = _upsert_attendance(db, student.id, lecture['id'], True)
+    db.commit()
+    remember_response(idempotency_key, log_prefix, checkin, result)
+
+    logger.info(f"{log_prefix} - Student {student.id} checked in to lecture {lecture['id']} (attendance ID: {result['id']})")
+    return result
+
+# Максимум строк в одном INSERT (ограничение PostgreSQL на число параметров запроса)
+BULK_CHUNK_SIZE = 5000
+
+@router.post("/bulk", response_model=AttendanceBulkResult)
+def add_attendance_bulk(
+    bulk: AttendanceBulkCreate,
+    db: Session = Depends(get_db),
+    skip_time_validation: bool = Query(False, description="Skip time validation for attendance recording"),
+    idempotency_key: Optional[str] = Header(None, description="Ключ идемпотентности для повторов запроса")
+):
+    """
+    Массовая отметка посещаемости одной лекции (ручная отметка всей аудитории
+    или импорт из списка). Лекция, студенты и вместимость проверяются один раз,
+    запись выполняется многострочным INSERT ... ON CONFLICT в одной транзакции.
+    Для каждой строки возвращается результат.
+    """
+    log_prefix = "POST /api/attendance/bulk"
+    lecture_id = bulk['lecture_id']
+    logger.info(f"{log_prefix} - Marking {len(bulk['records'])} attendance records for lecture_id: {lecture_id}")
+
+    cached = idempotent_response(idempotency_key, log_prefix, bulk)
+    if cached is not None:
+        logger.info(f"{log_prefix} - Returning stored response for Idempotency-Key {idempotency_key}")
+        return cached
+
+    lecture = lecture_index.by_id(db, lecture_id)
+    if not lecture:
+        logger.error(f"{log_prefix} - Lecture with id {lecture_id} not found")
+        raise HTTPException(status_code=404, detail="Lecture not found")
+
+    if not skip_time_validation and not validate_attendance_time(lecture['date'], lecture['start_time']):
+        logger.warning(f"{log_prefix} - Time validation failed for lecture_id: {lecture_id}")
+        raise HTTPException(status_code=400, detail="Attendance can only be recorded on the lecture date within 15 minutes before and after lecture start time")
+
+    # Повтор студента в запросе - выигрывает последняя строка
+    requested = {}
+    results: List[AttendanceBulkItemResult] = []
+    for item in bulk['records']:
+        if item['student_id'] in requested:
+            results.append(AttendanceBulkItemResult(student_id=item['student_id'], status="duplicate", attendance_id=None))
+        requested[item['student_id']] = bool(item['present'])
+
+    student_ids = list(requested)
+    known_students = {
+        student_id for (student_id,) in db.query(Student.id).filter(
+            Student.id.in_(student_ids), Student.is_deleted == False
+        )
+    }
+
+    # Вместимость: блокируем лекцию и считаем присутствующих вне этого запроса.
+    # Текущие отметки читаются после блокировки: отметки, сделанные до нее, уже зафиксированы
+    row = db.query(Lecture.max_student).filter(Lecture.id == lecture_id).with_for_update().first()
+    if row is None:
+        logger.warning(f"{log_prefix} - Lecture {lecture_id} not found")
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    existing = {
+        attendance.student_id: attendance
+        for attendance in db.query(Attendance.id, Attendance.student_id, Attendance.present).filter(
+            Attendance.lecture_id == lecture_id, Attendance.student_id.in_(student_ids)
+        )
+    }
+
+    free_seats = None
+    if row.max_student is not None:
+        present_elsewhere = db.query(func.count(Attendance.id)).filter(
+            Attendance.lecture_id == lecture_id,
+            Attendance.present == 1,
+            Attendance.student_id.notin_(student_ids)
+        ).scalar()
+        free_seats = row.max_student - present_elsewhere
+
+    # Уже присутствующие студенты получают места первыми
+    admitted = {}
+    statuses = {}
+    for student_id in sorted(student_ids, key=lambda sid: not (sid in existing and existing[sid].present)):
+        present = requested[student_id]
+        if student_id not in known_students:
+            statuses[student_id] = "student_not_found"
+        elif present and free_seats is not None and free_seats <= 0:
+            statuses[student_id] = "lecture_full"
         else:
-            # Значения разные - обновляем существующую запись
-            logger.info(f"POST /api/attendance - Updating existing attendance record (ID: {existing_attendance.id}) from {current_present} to {new_present}")
-            existing_attendance.present = int(att['present'])
-            db.commit()
-            db.refresh(existing_attendance)
-            db_att = existing_attendance
-    else:
-        # Записи нет - создаем новую
-        logger.info(f"POST /api/attendance - Creating new attendance record")
-        db_att = Attendance(student_id=att['student_id'], lecture_id=att['lecture_id'], present=int(att['present']))
-        db.add(db_att)
-        db.commit()
-        db.refresh(db_att)
-    
-    # Получаем связанные данные для ответа
-    student = db.query(Student).filter(Student.id == db_att.student_id, Student.is_deleted == False).first()
-    # lecture уже получена выше для проверки времени
-    
-    logger.info(f"POST /api/attendance - Successfully processed attendance record with ID: {db_att.id}")
-    return AttendanceInfo(
-        id = db_att.id,
-        student={
-            'id' : student.id,
-            'year': student.year,
-            'full_name': student.full_name,
-            'telegram': student.telegram,
-            'github': student.github,
-            'group_number': student.group_number,
-            'chat_id': student.chat_id,
-            'is_deleted': student.is_deleted
-        },
-        lecture={
-            'id' : lecture.id,
-            'number': lecture.number,
-            'topic': lecture.topic,
-            'date': lecture.date,
-            'start_time': lecture.start_time,
-            'secret_code': lecture.secret_code,
-            'max_student': lecture.max_student,
-            'github_example' : lecture.github_example,
-            'has_presentation': _lecture_has_presentation(lecture),
-        },
-        present=bool(db_att.present)
+            if present and free_seats is not None:
+                free_seats -= 1
+            admitted[student_id] = present
+
+    to_write = [
+        {"student_id": student_id, "lecture_id": lecture_id, "present": int(present)}
+        for student_id, present in admitted.items()
+        if student_id not in existing or bool(existing[student_id].present) != present
+    ]
+    attendance_ids = {student_id: existing[student_id].id for student_id in admitted if student_id in existing}
+    for start in range(0, len(to_write), BULK_CHUNK_SIZE):
+        stmt = pg_insert(Attendance).values(to_write[start:start + BULK_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Attendance.student_id, Attendance.lecture_id],
+            set_={"present": stmt.excluded.present}
+        ).returning(Attendance.id, Attendance.student_id)
+        for attendance_id, student_id in db.execute(stmt):
+            attendance_ids[student_id] = attendance_id
+    db.commit()
+
+    written = {item["student_id"] for item in to_write}
+    for student_id in student_ids:
+        if student_id in admitted:
+            if student_id not in written:
+                statuses[student_id] = "unchanged"
+            else:
+                statuses[student_id] = "updated" if student_id in existing else "created"
+        results.append(AttendanceBulkItemResult(
+            student_id=student_id, status=statuses[student_id], attendance_id=attendance_ids.get(student_id)
+        ))
+
+    counts = {status: sum(1 for item in results if item['status'] == status) for status in ("created", "updated", "unchanged")}
+    result = AttendanceBulkResult(
+        lecture_id=lecture_id,
+        created=counts["created"],
+        updated=counts["updated"],
+        unchanged=counts["unchanged"],
+        rejected=len(results) - sum(counts.values()),
+        results=results
     )
+    remember_response(idempotency_key, log_prefix, bulk, result)
+    logger.info(f"{log_prefix} - Lecture {lecture_id}: created {result['created']}, updated {result['updated']}, unchanged {result['unchanged']}, rejected {result['rejected']}")
+    return result
 
 @router.put("/{attendance_id}", response_model=AttendanceInfo)
 def update_attendance(attendance_id: int, att: AttendanceUpdate, db: Session = Depends(get_db)):
@@ -195,6 +455,8 @@ def update_attendance(attendance_id: int, att: AttendanceUpdate, db: Session = D
     if not db_att:
         logger.warning(f"PUT /api/attendance/{attendance_id} - Attendance record not found")
         raise HTTPException(status_code=404, detail="Attendance record not found")
+    if att.get('present') and not db_att.present:
+        _reserve_seat(db, db_att.lecture_id, db_att.student_id, f"PUT /api/attendance/{attendance_id}")
     for key, value in att.items():
         if value is not None:
             if key == 'present':
@@ -204,30 +466,11 @@ def update_attendance(attendance_id: int, att: AttendanceUpdate, db: Session = D
     db.commit()
     db.refresh(db_att)
     student = db.query(Student).filter(Student.id == db_att.student_id, Student.is_deleted == False).first()
-    lecture = db.query(Lecture).filter(Lecture.id == db_att.lecture_id).first()
+    lecture = db.query(Lecture).options(defer(Lecture.presentation_blob)).filter(Lecture.id == db_att.lecture_id).first()
     logger.info(f"PUT /api/attendance/{attendance_id} - Successfully updated attendance record")
     return AttendanceInfo(
         id = db_att.id,
-        student={
-            'id' : student.id,
-            'year': student.year,
-            'full_name': student.full_name,
-            'telegram': student.telegram,
-            'github': student.github,
-            'group_number': student.group_number,
-            'chat_id': student.chat_id,
-            'is_deleted': student.is_deleted
-        },
-        lecture={
-            'id' : lecture.id,
-            'number': lecture.number,
-            'topic': lecture.topic,
-            'date': lecture.date,
-            'start_time': lecture.start_time,
-            'secret_code': lecture.secret_code,
-            'max_student' : lecture.max_student,
-            'github_example' : lecture.github_example,
-            'has_presentation': _lecture_has_presentation(lecture),
-        },
+        student=_student_dict(student),
+        lecture=_lecture_dict(lecture, _lecture_has_presentation(db, lecture.id)),
         present=bool(db_att.present)
     )
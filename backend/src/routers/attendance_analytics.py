@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import logging
+from models import LectureTurnoutInfo, GroupTrendInfo, StudentAttendanceStatsInfo
+from database import get_db
+from attendance_analytics import get_analytics, at_risk_students, DEFAULT_MISSED_IN_ROW
+from routers.utils import fast_json_response
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/attendance/analytics", tags=["attendance"])
+
+@router.get("/lectures", response_model=List[LectureTurnoutInfo])
+def get_lecture_turnout(db: Session = Depends(get_db)):
+    """
+    Явка на каждой прошедшей лекции: число и доля присутствовавших активных студентов.
+    """
+    logger.info("GET /api/attendance/analytics/lectures - Retrieving lecture turnout")
+    lectures = get_analytics(db).lectures
+    logger.info(f"GET /api/attendance/analytics/lectures - Returning {len(lectures)} lectures")
+    return fast_json_response(lectures)
+
+@router.get("/groups", response_model=List[GroupTrendInfo])
+def get_group_trends(db: Session = Depends(get_db)):
+    """
+    Динамика явки по группам: явка на каждой прошедшей лекции, средняя явка
+    и наклон линейного тренда (изменение доли присутствовавших за одну лекцию).
+    """
+    logger.info("GET /api/attendance/analytics/groups - Retrieving group trends")
+    groups = get_analytics(db).groups
+    logger.info(f"GET /api/attendance/analytics/groups - Returning {len(groups)} groups")
+    return fast_json_response(groups)
+
+@router.get("/students", response_model=List[StudentAttendanceStatsInfo])
+def get_student_streaks(
+    group_number: Optional[str] = Query(None, description="Фильтр по номеру группы студента"),
+    db: Session = Depends(get_db)
+):
+    """
+    Посещаемость студентов: число посещенных лекций, текущая и самая длинная
+    серии посещений, число пропущенных подряд последних лекций.
+    """
+    logger.info("GET /api/attendance/analytics/students - Retrieving student streaks")
+    students = get_analytics(db).students
+    if group_number is not None:
+        students = [student for student in students if student['group_number'] == group_number]
+    logger.info(f"GET /api/attendance/analytics/students - Returning {len(students)} students")
+    return fast_json_response(students)
+
+@router.get("/at-risk", response_model=List[StudentAttendanceStatsInfo])
+def get_at_risk_students(
+    missed: int = Query(DEFAULT_MISSED_IN_ROW, ge=1, description="Пропущено подряд последних лекций"),
+    group_number: Optional[str] = Query(None, description="Фильтр по номеру группы студента"),
+    db: Session = Depends(get_db)
+):
+    """
+    Студенты в зоне риска: пропустили подряд не меньше missed последних лекций
+    (сначала пропустившие больше).
+    """
+    logger.info(f"GET /api/attendance/analytics/at-risk - Retrieving students with {missed}+ missed lectures in a row")
+    students = at_risk_students(get_analytics(db), missed)
+    if group_number is not None:
+        students = [student for student in students if student['group_number'] == group_number]
+    logger.info(f"GET /api/attendance/analytics/at-risk - Found {len(students)} students at risk")
+    return fast_json_response(students)
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query
 from fastapi.responses import Response
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer
 from sqlalchemy.exc import IntegrityError, DataError, OperationalError
-from typing import List, Optional
+from typing import List, Optional, Literal
 import logging
 from models import ExamGradeInfo, ExamGradeCreate, ExamGradeUpdate, StudentInfo
 from database import get_db, ExamGrade, Student
+from routers.utils import keyset_paginate, resolve_sort, set_next_cursor, apply_date_range, fast_json_response, MAX_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -44,44 +45,77 @@ def detect_file_type(blob: bytes) -> str:
 
 router = APIRouter(prefix="/api/exam_grades", tags=["exam_grades"])
 
+# Ключи сортировки для списка экзаменационных оценок (последняя колонка - уникальный id)
+EXAM_GRADE_SORT_KEYS = {
+    "id": [ExamGrade.id],
+    "date": [ExamGrade.date, ExamGrade.id],
+    "grade": [ExamGrade.grade, ExamGrade.id],
+}
+
 @router.get("/", response_model=List[ExamGradeInfo])
 @router.get("", response_model=List[ExamGradeInfo])
-def get_exam_grades(db: Session = Depends(get_db)):
+def get_exam_grades(
+    response: Response,
+    student_id: Optional[int] = Query(None, description="Фильтр по студенту"),
+    group_number: Optional[str] = Query(None, description="Фильтр по номеру группы студента"),
+    variant_number: Optional[int] = Query(None, description="Фильтр по номеру варианта"),
+    date_from: Optional[str] = Query(None, description="Дата экзамена не раньше (ISO)"),
+    date_to: Optional[str] = Query(None, description="Дата экзамена не позже (ISO, включительно)"),
+    sort: str = Query("id", description="Ключ сортировки: id, date, grade"),
+    order: Literal["asc", "desc"] = Query("asc", description="Направление сортировки"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (без параметра - все записи)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    db: Session = Depends(get_db)
+):
     """
-    Получить все экзаменационные оценки
+    Получить экзаменационные оценки (с фильтрами и keyset-пагинацией)
     """
-    logger.info("GET /api/exam_grades - Retrieving all exam grades")
-    exam_grades = db.query(ExamGrade).all()
+    logger.info("GET /api/exam_grades - Retrieving exam grades")
+    columns = resolve_sort(EXAM_GRADE_SORT_KEYS, sort)
+    # Студента получаем тем же запросом, сам PDF не загружаем - только признак его наличия
+    query = db.query(
+        ExamGrade, Student, ExamGrade.pdf_blob.isnot(None).label("has_pdf")
+    ).options(
+        defer(ExamGrade.pdf_blob)
+    ).join(
+        Student, Student.id == ExamGrade.student_id
+    ).filter(Student.is_deleted == False)
+    if student_id is not None:
+        query = query.filter(ExamGrade.student_id == student_id)
+    if group_number is not None:
+        query = query.filter(Student.group_number == group_number)
+    if variant_number is not None:
+        query = query.filter(ExamGrade.variant_number == variant_number)
+    query = apply_date_range(query, ExamGrade.date, date_from, date_to)
+    rows, next_cursor = keyset_paginate(
+        query, columns, lambda row: [getattr(row[0], column.key) for column in columns],
+        cursor, limit, descending=(order == "desc")
+    )
+    set_next_cursor(response, next_cursor)
     result = []
     
-    for exam_grade in exam_grades:
-        student = db.query(Student).filter(
-            Student.id == exam_grade.student_id,
-            Student.is_deleted == False
-        ).first()
-        
-        if student:
-            result.append(ExamGradeInfo(
-                id=exam_grade.id,
-                date=exam_grade.date,
-                grade=exam_grade.grade,
-                variant_number=exam_grade.variant_number,
-                student_id=exam_grade.student_id,
-                student={
-                    'id': student.id,
-                    'year': student.year,
-                    'full_name': student.full_name,
-                    'telegram': student.telegram,
-                    'github': student.github,
-                    'group_number': student.group_number,
-                    'chat_id': student.chat_id,
-                    'is_deleted': student.is_deleted
-                },
-                has_pdf=exam_grade.pdf_blob is not None
-            ))
+    for exam_grade, student, has_pdf in rows:
+        result.append(ExamGradeInfo(
+            id=exam_grade.id,
+            date=exam_grade.date,
+            grade=exam_grade.grade,
+            variant_number=exam_grade.variant_number,
+            student_id=exam_grade.student_id,
+            student={
+                'id': student.id,
+                'year': student.year,
+                'full_name': student.full_name,
+                'telegram': student.telegram,
+                'github': student.github,
+                'group_number': student.group_number,
+                'chat_id': student.chat_id,
+                'is_deleted': student.is_deleted
+            },
+            has_pdf=bool(has_pdf)
+        ))
     
     logger.info(f"GET /api/exam_grades - Retrieved {len(result)} exam grades")
-    return result
+    return fast_json_response(result, response)
 
 @router.get("/{exam_grade_id}", response_model=ExamGradeInfo)
 def get_exam_grade(exam_grade_id: int, db: Session = Depends(get_db)):
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from datetime import date
 import logging
 from typing import Dict, Any
-from database import get_db, Student, Teacher, TeacherGroup, Lecture, Attendance, Homework, HomeworkReview, StudentHomeworkVariant, ExamGrade
-from models import StudentInfo, TeacherInfo, TeacherGroupInfo, LectureInfo, AttendanceInfo, HomeworkInfo, HomeworkReviewInfo, StudentHomeworkVariantInfo
+from database import get_db
+from data_export import EXPORT_TABLES, iter_table_batches, iter_ndjson, iter_parquet, iter_parquet_zip, parquet_available
+from routers.utils import fast_json_response
 
 logger = logging.getLogger(__name__)
 
@@ -17,139 +20,65 @@ def export_all_data(db: Session = Depends(get_db)) -> Dict[str, Any]:
     logger.info("GET /api/export/all - Exporting all data")
     
     try:
-        # Получаем всех студентов (включая удаленных)
-        students = db.query(Student).all()
-        students_data = [
-            {
-                "id": s.id,
-                "year": s.year,
-                "full_name": s.full_name,
-                "telegram": s.telegram,
-                "github": s.github,
-                "group_number": s.group_number,
-                "chat_id": s.chat_id,
-                "is_deleted": s.is_deleted
-            } for s in students
-        ]
-        
-        # Получаем всех преподавателей (включая удаленных)
-        teachers = db.query(Teacher).all()
-        teachers_data = [
-            {
-                "id": t.id,
-                "full_name": t.full_name,
-                "telegram": t.telegram,
-                "is_deleted": t.is_deleted
-            } for t in teachers
-        ]
-        
-        # Получаем все связи преподавателей с группами
-        teacher_groups = db.query(TeacherGroup).all()
-        teacher_groups_data = [
-            {
-                "id": tg.id,
-                "teacher_id": tg.teacher_id,
-                "group_number": tg.group_number
-            } for tg in teacher_groups
-        ]
-        
-        # Получаем все лекции
-        lectures = db.query(Lecture).all()
-        lectures_data = [
-            {
-                "id": l.id,
-                "number": l.number,
-                "topic": l.topic,
-                "date": l.date,
-                "start_time": l.start_time,
-                "secret_code": l.secret_code,
-                "max_student": l.max_student,
-                "github_example": l.github_example
-            } for l in lectures
-        ]
-        
-        # Получаем все записи посещаемости
-        attendance_records = db.query(Attendance).all()
-        attendance_data = [
-            {
-                "id": att.id,
-                "student_id": att.student_id,
-                "lecture_id": att.lecture_id,
-                "present": att.present
-            } for att in attendance_records
-        ]
-        
-        # Получаем все домашние задания
-        homework = db.query(Homework).all()
-        homework_data = [
-            {
-                "id": h.id,
-                "number": h.number,
-                "due_date": h.due_date,
-                "short_description": h.short_description,
-                "example_link": h.example_link,
-                "assigned_date": h.assigned_date,
-                "variants_count": h.variants_count
-            } for h in homework
-        ]
-        
-        # Получаем все проверки домашних заданий
-        homework_reviews = db.query(HomeworkReview).all()
-        homework_reviews_data = [
-            {
-                "id": hr.id,
-                "student_id": hr.student_id,
-                "number": hr.number,
-                "send_date": hr.send_date,
-                "review_date": hr.review_date,
-                "url": hr.url,
-                "result": hr.result,
-                "comments": hr.comments,
-                "local_directory": hr.local_directory,
-                "ai_percentage": hr.ai_percentage
-            } for hr in homework_reviews
-        ]
-        
-        # Получаем все варианты домашних заданий студентов
-        student_homework_variants = db.query(StudentHomeworkVariant).all()
-        student_homework_variants_data = [
-            {
-                "id": shv.id,
-                "student_id": shv.student_id,
-                "homework_id": shv.homework_id,
-                "variant_number": shv.variant_number
-            } for shv in student_homework_variants
-        ]
-        
-        # Получаем все экзаменационные оценки (без pdf_blob)
-        exam_grades = db.query(ExamGrade).all()
-        exam_grades_data = [
-            {
-                "id": eg.id,
-                "date": eg.date,
-                "grade": eg.grade,
-                "variant_number": eg.variant_number,
-                "student_id": eg.student_id
-            } for eg in exam_grades
-        ]
-        
-        # Формируем итоговый объект экспорта в формате, подходящем для импорта
+        # Все таблицы (включая удаленных студентов и преподавателей, без BLOB-полей)
+        # в формате, подходящем для импорта
         export_data = {
-            "students": students_data,
-            "teachers": teachers_data,
-            "teacher_groups": teacher_groups_data,
-            "lectures": lectures_data,
-            "attendance": attendance_data,
-            "homework": homework_data,
-            "homework_reviews": homework_reviews_data,
-            "student_homework_variants": student_homework_variants_data,
-            "exam_grades": exam_grades_data
+            table: [row for rows in iter_table_batches(db, table) for row in rows]
+            for table in EXPORT_TABLES
         }
         
-        logger.info(f"GET /api/export/all - Successfully exported {len(students_data)} students, {len(teachers_data)} teachers, {len(lectures_data)} lectures, {len(homework_data)} homework assignments, {len(exam_grades_data)} exam grades")
+        logger.info(f"GET /api/export/all - Successfully exported {len(export_data['students'])} students, {len(export_data['teachers'])} teachers, {len(export_data['lectures'])} lectures, {len(export_data['homework'])} homework assignments, {len(export_data['exam_grades'])} exam grades")
         
-        return export_data
+        return fast_json_response(export_data)
         
     except Exception as e:
         logger.error(f"GET /api/export/all - Error exporting data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при экспорте данных: {str(e)}")
+
+@router.get("/ndjson")
+def export_all_data_ndjson() -> StreamingResponse:
+    """
+    Потоковый экспорт всех данных в NDJSON (строка заголовка, затем по строке
+    на запись: {"table": ..., "row": {...}}, в конце - {"end": true, "counts": ...}).
+    Таблицы читаются серверным курсором пачками, поэтому память не зависит
+    от объема базы.
+    """
+    logger.info("GET /api/export/ndjson - Streaming all data")
+    return StreamingResponse(
+        iter_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="frieren-export-{date.today().isoformat()}.ndjson"'}
+    )
+
+@router.get("/parquet")
+def export_all_data_parquet() -> StreamingResponse:
+    """
+    Выгрузка всех таблиц для аналитики: ZIP-архив с файлом <таблица>.parquet
+    на каждую таблицу (сжатие zstd). Файлы пишутся группами строк по мере
+    чтения таблиц, все таблицы - из одного снимка базы.
+    """
+    logger.info("GET /api/export/parquet - Streaming all tables as Parquet")
+    if not parquet_available():
+        logger.error("GET /api/export/parquet - pyarrow is not installed")
+        raise HTTPException(status_code=501, detail="Выгрузка в Parquet недоступна: не установлен pyarrow")
+    return StreamingResponse(
+        iter_parquet_zip(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="frieren-export-{date.today().isoformat()}.zip"'}
+    )
+
+@router.get("/parquet/{table}")
+def export_table_parquet(table: str) -> StreamingResponse:
+    """Выгрузка одной таблицы (students, attendance, homework_reviews, ...) в Parquet"""
+    logger.info(f"GET /api/export/parquet/{table} - Streaming table as Parquet")
+    if table not in EXPORT_TABLES:
+        logger.warning(f"GET /api/export/parquet/{table} - Unknown table")
+        raise HTTPException(status_code=404, detail=f"Таблица {table} не найдена. Доступны: {', '.join(EXPORT_TABLES)}")
+    if not parquet_available():
+        logger.error(f"GET /api/export/parquet/{table} - pyarrow is not installed")
+        raise HTTPException(status_code=501, detail="Выгрузка в Parquet недоступна: не установлен pyarrow")
+    return StreamingResponse(
+        iter_parquet(table),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f'attachment; filename="{table}-{date.today().isoformat()}.parquet"'}
+    )
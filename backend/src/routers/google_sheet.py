@@ -1,92 +1,139 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import func, and_, insert, update
+import hashlib
+import json
 import logging
-import os
+import time
 import traceback
-import gspread
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from database import get_db, Student, Teacher, TeacherGroup, Lecture, Attendance, Homework, HomeworkReview, StudentHomeworkVariant, ExamGrade
-from models import StudentInfo, TeacherInfo, TeacherGroupInfo, LectureInfo, AttendanceInfo, HomeworkInfo, HomeworkReviewInfo, StudentHomeworkVariantInfo
+from models import ExportQueueMetricsInfo, StudentInfo, TeacherInfo, TeacherGroupInfo, LectureInfo, AttendanceInfo, HomeworkInfo, HomeworkReviewInfo, StudentHomeworkVariantInfo
 
-from oauth2client.service_account import ServiceAccountCredentials
-import gspread
-from gspread.exceptions import WorksheetNotFound
+import lecture_index
+import sheets_client
+import sheets_queue
+import sheets_rows
+import sheets_sync
+from attendance_matrix import load_attendance_masks
 
 logger = logging.getLogger(__name__)
 
-JSON_KEYFILE        = 'google/credentials.json'
-scope               = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-credentials         = ServiceAccountCredentials.from_json_keyfile_name(JSON_KEYFILE, scope)
-
-# Получаем sheet_id из переменных окружения
-GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
-if not GOOGLE_SHEET_ID:
-    raise ValueError("GOOGLE_SHEET_ID environment variable is not set")
-
 STUDENT_NAMES = "Студенты"
 LECTIONS_NAMES = "Лекции"
 RATING_NAMES = "Оценки"
 EXAM_NAMES = "exam"
 
+# Постоянные столбцы листа "Студенты" (за ними идут варианты ДЗ)
+STUDENT_HEADERS = ["id", "full_name", "telegram", "github", "group_number", "teacher", "total_homework_score", "ai_percentage", "attendance_count"]
+
 router = APIRouter(prefix="/api/google_sheet", tags=["export"])
 
+def _teacher_names_by_group(db: Session, group_number: Optional[str] = None) -> Dict[str, str]:
+    """
+    Имя преподавателя по номеру группы одним запросом (удаленные преподаватели
+    пропускаются). Если у группы несколько преподавателей, берется последняя связь.
+    """
+    query = db.query(TeacherGroup.group_number, Teacher.full_name).join(
+        Teacher, and_(Teacher.id == TeacherGroup.teacher_id, Teacher.is_deleted == False)
+    )
+    if group_number is not None:
+        query = query.filter(TeacherGroup.group_number == group_number)
+    return {group: full_name for group, full_name in query.order_by(TeacherGroup.id)}
+
+def _student_stats(
+    db: Session, student_ids: Optional[List[int]] = None
+) -> Tuple[Dict[int, int], Dict[int, Optional[float]], Dict[int, int]]:
+    """
+    Статистика студентов двумя групповыми запросами (вместо трех запросов на студента):
+    - суммарный балл по последним отправкам каждого ДЗ (максимальный id по (student_id, number));
+    - средний процент AI-генерации по отправкам, где он заполнен;
+    - количество посещенных лекций.
+    Возвращает три словаря по student_id; студентов без данных в словарях нет.
+    """
+    latest_reviews = db.query(func.max(HomeworkReview.id))
+    if student_ids is not None:
+        # Фильтр нужен и в подзапросе: иначе он группирует всю таблицу проверок
+        latest_reviews = latest_reviews.filter(HomeworkReview.student_id.in_(student_ids))
+    latest_reviews = latest_reviews.group_by(HomeworkReview.student_id, HomeworkReview.number)
+    reviews = db.query(
+        HomeworkReview.student_id,
+        func.coalesce(func.sum(HomeworkReview.result).filter(HomeworkReview.id.in_(latest_reviews)), 0),
+        func.avg(HomeworkReview.ai_percentage)
+    )
+    attendance = db.query(Attendance.student_id, func.count(Attendance.id)).filter(Attendance.present == 1)
+    if student_ids is not None:
+        reviews = reviews.filter(HomeworkReview.student_id.in_(student_ids))
+        attendance = attendance.filter(Attendance.student_id.in_(student_ids))
+
+    homework_scores, ai_percentages = {}, {}
+    for review_student_id, score, ai_percentage in reviews.group_by(HomeworkReview.student_id):
+        homework_scores[review_student_id] = score
+        ai_percentages[review_student_id] = ai_percentage
+    attendance_counts = dict(attendance.group_by(Attendance.student_id).all())
+    return homework_scores, ai_percentages, attendance_counts
+
+class _PhaseTimer:
+    """Длительность этапов экспорта: mark(phase) завершает этап, начатый предыдущей отметкой."""
+
+    def __init__(self):
+        self._last = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.timings[phase] = self.timings.get(phase, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def summary(self) -> str:
+        return ", ".join(f"{phase}={elapsed:.0f}ms" for phase, elapsed in self.timings.items())
+
 @router.get("/all")
 def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
     # try to connect to google sheet
     data = dict()
+    timer = _PhaseTimer()
 
     try:
-        logger.info(f"Starting export_all_google_sheet. GOOGLE_SHEET_ID: {GOOGLE_SHEET_ID[:20]}..." if GOOGLE_SHEET_ID else "GOOGLE_SHEET_ID is not set")
-        
-        logger.debug("Authorizing gspread client...")
-        client = gspread.authorize(credentials)
+        logger.info(f"Starting export_all_google_sheet. GOOGLE_SHEET_ID: {sheets_client.GOOGLE_SHEET_ID[:20]}..." if sheets_client.GOOGLE_SHEET_ID else "GOOGLE_SHEET_ID is not set")
         
-        logger.debug(f"Opening spreadsheet by key: {GOOGLE_SHEET_ID}")
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+        sheet = sheets_client.get_worksheet(STUDENT_NAMES)
         
-        logger.debug(f"Getting worksheet: {STUDENT_NAMES}")
-        try:
-            sheet = spreadsheet.worksheet(STUDENT_NAMES)
-            logger.debug(f"Found existing {STUDENT_NAMES} worksheet")
-        except WorksheetNotFound:
-            logger.warning(f"Worksheet {STUDENT_NAMES} not found, creating new one")
-            sheet = spreadsheet.add_worksheet(title=STUDENT_NAMES, rows=1000, cols=50)
-            logger.info(f"Created new {STUDENT_NAMES} worksheet")
-        
-        sheet_data = sheet.get_all_values()
+        sheet_data = sheets_sync.get_values(sheet)
         logger.debug(f"Retrieved {len(sheet_data)} rows from {STUDENT_NAMES} sheet")
+        timer.mark("open_spreadsheet")
 
-        # Получаем всех студентов
+        # Получаем всех студентов (в постоянном порядке, чтобы синхронизация меняла только нужные строки)
         logger.debug("Querying students from database...")
-        students = db.query(Student).filter(Student.is_deleted == False).all()
+        students = db.query(Student).filter(Student.is_deleted == False).order_by(Student.id).all()
         logger.info(f"Found {len(students)} students")
         
-        # Получаем всех преподавателей и их группы
+        # Получаем преподавателей групп (один запрос с join вместо запроса на каждую группу)
         logger.debug("Querying teacher groups from database...")
-        teacher_groups = db.query(TeacherGroup).all()
-        teachers = {tg.group_number: tg.teacher_id for tg in teacher_groups}
-        teacher_names = {}
-        for tg in teacher_groups:
-            teacher = db.query(Teacher).filter(Teacher.id == tg.teacher_id, Teacher.is_deleted == False).first()
-            if teacher:
-                teacher_names[tg.group_number] = teacher.full_name
+        teacher_names = _teacher_names_by_group(db)
         logger.debug(f"Found {len(teacher_names)} teacher groups")
         
         # Получаем все домашние задания
         logger.debug("Querying homeworks from database...")
-        homeworks = db.query(Homework).all()
+        homeworks = db.query(Homework).order_by(Homework.number, Homework.id).all()
         logger.info(f"Found {len(homeworks)} homeworks")
         
         # Получаем варианты домашних заданий для студентов
         logger.debug("Querying student homework variants from database...")
-        student_variants = db.query(StudentHomeworkVariant).all()
+        student_variants = db.query(
+            StudentHomeworkVariant.student_id, StudentHomeworkVariant.homework_id, StudentHomeworkVariant.variant_number
+        ).all()
         variants_dict = {}
-        for variant in student_variants:
-            key = (variant.student_id, variant.homework_id)
-            variants_dict[key] = variant.variant_number
+        for student_id, homework_id, variant_number in student_variants:
+            variants_dict[(student_id, homework_id)] = variant_number
         logger.debug(f"Found {len(student_variants)} student homework variants")
 
+        timer.mark("load_dimensions")
+
+        # Статистика всех студентов групповыми запросами до формирования строк
+        homework_scores, ai_percentages, attendance_counts = _student_stats(db)
+        timer.mark("student_stats")
+
         # Формируем данные студентов с дополнительной информацией
         students_data = []
         for student in students:
@@ -100,36 +147,11 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
                 variant_number = variants_dict.get(variant_key, "")
                 homework_variants.append(str(variant_number) if variant_number else "")
             
-            # Вычисляем статистику студента
-            # Суммарный балл за все homework_review (только последние отправки по каждому варианту)
-            # Подзапрос для получения максимального id для каждой комбинации (student_id, number)
-            subquery = db.query(
-                func.max(HomeworkReview.id).label('max_id')
-            ).filter(
-                HomeworkReview.student_id == student.id
-            ).group_by(
-                HomeworkReview.number
-            ).subquery()
-            
-            total_homework_score = db.query(func.coalesce(func.sum(HomeworkReview.result), 0)).filter(
-                and_(
-                    HomeworkReview.student_id == student.id,
-                    HomeworkReview.id.in_(select(subquery.c.max_id))
-                )
-            ).scalar() or 0
-            
-            # Средний балл за vibe coding - среднее значение ai_percentage из homework_review
-            # где ai_percentage заполнен (не NULL)
-            ai_percentage = db.query(func.avg(HomeworkReview.ai_percentage)).filter(
-                HomeworkReview.student_id == student.id,
-                HomeworkReview.ai_percentage.isnot(None)
-            ).scalar()
-            
-            # Количество посещенных лекций (где present = 1)
-            attendance_count = db.query(func.count(Attendance.id)).filter(
-                Attendance.student_id == student.id,
-                Attendance.present == 1
-            ).scalar() or 0
+            # Статистика студента: суммарный балл по последним отправкам,
+            # средний процент AI-генерации и количество посещенных лекций
+            total_homework_score = homework_scores.get(student.id) or 0
+            ai_percentage = ai_percentages.get(student.id)
+            attendance_count = attendance_counts.get(student.id, 0)
             
             student_data = {
                 "id": student.id,
@@ -150,17 +172,12 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
             students_data.append(student_data)
         
         logger.info(f"Processed {len(students_data)} students with their data")
+        timer.mark("build_student_rows")
 
         # Записываем students_data в data (в Google Sheet)
-        # Сначала очищаем существующие данные (кроме заголовков)
-        logger.debug("Preparing sheet for update...")
-        if sheet_data and len(sheet_data) > 1:
-            logger.debug(f"Resizing sheet from {len(sheet_data)} rows to 1 row (keeping header)")
-            sheet.resize(rows=1)  # Оставляем только заголовки
-
         # Формируем заголовки
         logger.debug("Building headers...")
-        headers = ["id", "full_name", "telegram", "github", "group_number", "teacher", "total_homework_score", "ai_percentage", "attendance_count"]
+        headers = list(STUDENT_HEADERS)
         for homework in homeworks:
             headers.append(f"homework_{homework.number}_variant")
         logger.debug(f"Headers: {headers}")
@@ -185,38 +202,28 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
                 row.append(student_data[f"homework_{homework.number}_variant"])
             rows.append(row)
 
-        # Записываем все строки в лист студентов
+        # Полный экспорт переставляет строки - индексы строк листов строятся заново
+        sheets_rows.invalidate()
+
+        # Отправляем в лист студентов только изменившиеся ячейки
         logger.info(f"Updating {STUDENT_NAMES} sheet with {len(rows)} rows (including header)")
-        sheet.update("A1", rows)
+        changed_cells = {STUDENT_NAMES: sheets_sync.sync_worksheet(sheet, rows, sheet_data).changed_cells}
         logger.info(f"Successfully updated {STUDENT_NAMES} sheet")
+        timer.mark("write_students_sheet")
         
         # Теперь заполняем лист с данными о посещаемости лекций
         try:
             logger.debug(f"Processing {LECTIONS_NAMES} sheet...")
             # Получаем или создаем лист "Лекции"
-            try:
-                logger.debug(f"Trying to get existing {LECTIONS_NAMES} worksheet...")
-                lectures_sheet = spreadsheet.worksheet(LECTIONS_NAMES)
-                logger.debug(f"Found existing {LECTIONS_NAMES} worksheet")
-            except WorksheetNotFound:
-                logger.warning(f"Worksheet {LECTIONS_NAMES} not found, creating new one")
-                lectures_sheet = spreadsheet.add_worksheet(title=LECTIONS_NAMES, rows=1000, cols=50)
-                logger.info(f"Created new {LECTIONS_NAMES} worksheet")
-            
-            # Получаем все лекции
-            lectures = db.query(Lecture).order_by(Lecture.number).all()
+            lectures_sheet = sheets_client.get_worksheet(LECTIONS_NAMES)
             
-            # Получаем данные о посещаемости
-            attendance_records = db.query(Attendance).all()
-            attendance_dict = {}
-            for record in attendance_records:
-                key = (record.student_id, record.lecture_id)
-                attendance_dict[key] = record.present
+            # Матрица посещаемости: лекции по номеру и битовые маски студентов одним запросом
+            matrix_lectures, _, attendance_masks = load_attendance_masks(db)
             
             # Формируем заголовки для листа лекций
             lectures_headers = ["id", "full_name", "telegram"]
-            for lecture in lectures:
-                lectures_headers.append(f"lecture_{lecture.number}")
+            for lecture in matrix_lectures:
+                lectures_headers.append(f"lecture_{lecture['number']}")
             
             # Формируем строки для листа лекций
             lectures_rows = [lectures_headers]
@@ -227,16 +234,14 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
                     student.telegram
                 ]
                 # Добавляем данные о посещаемости для каждой лекции
-                for lecture in lectures:
-                    attendance_key = (student.id, lecture.id)
-                    present = attendance_dict.get(attendance_key, 0)
-                    row.append("Да" if present == 1 else "Нет")
+                mask = attendance_masks.get(student.id, 0)
+                for column in range(len(matrix_lectures)):
+                    row.append("Да" if mask >> column & 1 else "Нет")
                 lectures_rows.append(row)
             
             # Записываем данные в лист лекций
             logger.info(f"Updating {LECTIONS_NAMES} sheet with {len(lectures_rows)} rows")
-            lectures_sheet.clear()
-            lectures_sheet.update("A1", lectures_rows)
+            changed_cells[LECTIONS_NAMES] = sheets_sync.sync_worksheet(lectures_sheet, lectures_rows).changed_cells
             logger.info(f"Successfully updated {LECTIONS_NAMES} sheet")
             
         except Exception as e:
@@ -244,23 +249,18 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
             logger.warning(f"Error creating/updating lectures sheet: {str(e)}")
             logger.warning(f"Error type: {type(e).__name__}")
             logger.warning(f"Error traceback:\n{error_traceback}")
+            sheets_client.invalidate()
             # Продолжаем выполнение, даже если не удалось создать лист лекций
+        timer.mark("lectures_sheet")
         
         # Теперь заполняем лист с данными об оценках
         try:
             logger.debug(f"Processing {RATING_NAMES} sheet...")
             # Получаем или создаем лист "Оценки"
-            try:
-                logger.debug(f"Trying to get existing {RATING_NAMES} worksheet...")
-                ratings_sheet = spreadsheet.worksheet(RATING_NAMES)
-                logger.debug(f"Found existing {RATING_NAMES} worksheet")
-            except WorksheetNotFound:
-                logger.warning(f"Worksheet {RATING_NAMES} not found, creating new one")
-                ratings_sheet = spreadsheet.add_worksheet(title=RATING_NAMES, rows=1000, cols=50)
-                logger.info(f"Created new {RATING_NAMES} worksheet")
+            ratings_sheet = sheets_client.get_worksheet(RATING_NAMES)
             
-            # Получаем все проверки домашних заданий
-            homework_reviews = db.query(HomeworkReview).all()
+            # Получаем все проверки домашних заданий (для пары студент/ДЗ остается последняя по id)
+            homework_reviews = db.query(HomeworkReview).order_by(HomeworkReview.id).all()
             reviews_dict = {}
             for review in homework_reviews:
                 key = (review.student_id, review.number)
@@ -278,12 +278,13 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
                 ])
             
             # Получаем существующие данные из листа оценок
-            existing_ratings_data = ratings_sheet.get_all_values()
+            existing_ratings_data = sheets_sync.get_values(ratings_sheet)
             existing_ratings_dict = {}
             
             if len(existing_ratings_data) > 1:  # Есть данные кроме заголовков
-                # Создаем словарь существующих данных по студентам
+                # Создаем словарь существующих данных по студентам (значения - строками, как при сравнении)
                 for row in existing_ratings_data[1:]:  # Пропускаем заголовки
+                    row = [sheets_sync.normalize_cell(value) for value in row]
                     if len(row) >= 3:  # Минимум full_name и telegram
                         student_name = row[0]
                         student_telegram = row[1]
@@ -344,8 +345,9 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
             
             # Записываем данные в лист оценок
             logger.info(f"Updating {RATING_NAMES} sheet with {len(ratings_rows)} rows")
-            ratings_sheet.clear()
-            ratings_sheet.update("A1", ratings_rows)
+            changed_cells[RATING_NAMES] = sheets_sync.sync_worksheet(
+                ratings_sheet, ratings_rows, existing_ratings_data
+            ).changed_cells
             logger.info(f"Successfully updated {RATING_NAMES} sheet")
             
         except Exception as e:
@@ -353,23 +355,18 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
             logger.warning(f"Error creating/updating ratings sheet: {str(e)}")
             logger.warning(f"Error type: {type(e).__name__}")
             logger.warning(f"Error traceback:\n{error_traceback}")
+            sheets_client.invalidate()
             # Продолжаем выполнение, даже если не удалось создать лист оценок
+        timer.mark("ratings_sheet")
         
         # Теперь заполняем лист с данными об экзаменационных оценках
         try:
             logger.debug(f"Processing {EXAM_NAMES} sheet...")
             # Получаем или создаем лист "exam"
-            try:
-                logger.debug(f"Trying to get existing {EXAM_NAMES} worksheet...")
-                exam_sheet = spreadsheet.worksheet(EXAM_NAMES)
-                logger.debug(f"Found existing {EXAM_NAMES} worksheet")
-            except WorksheetNotFound:
-                logger.warning(f"Worksheet {EXAM_NAMES} not found, creating new one")
-                exam_sheet = spreadsheet.add_worksheet(title=EXAM_NAMES, rows=1000, cols=50)
-                logger.info(f"Created new {EXAM_NAMES} worksheet")
+            exam_sheet = sheets_client.get_worksheet(EXAM_NAMES)
             
-            # Получаем все экзаменационные оценки
-            exam_grades = db.query(ExamGrade).all()
+            # Получаем все экзаменационные оценки (без PDF работ)
+            exam_grades = db.query(ExamGrade).options(defer(ExamGrade.pdf_blob)).order_by(ExamGrade.id).all()
             
             # Создаем словарь для быстрого поиска оценок по student_id
             exam_grades_dict = {}
@@ -415,8 +412,7 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
             
             # Записываем данные в лист экзаменов
             logger.info(f"Updating {EXAM_NAMES} sheet with {len(exam_rows)} rows")
-            exam_sheet.clear()
-            exam_sheet.update("A1", exam_rows)
+            changed_cells[EXAM_NAMES] = sheets_sync.sync_worksheet(exam_sheet, exam_rows).changed_cells
             logger.info(f"Successfully updated {EXAM_NAMES} sheet with {len(exam_rows) - 1} data rows")
             
         except Exception as e:
@@ -424,10 +420,13 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
             logger.warning(f"Error creating/updating exam sheet: {str(e)}")
             logger.warning(f"Error type: {type(e).__name__}")
             logger.warning(f"Error traceback:\n{error_traceback}")
+            sheets_client.invalidate()
             # Продолжаем выполнение, даже если не удалось создать лист экзаменов
+        timer.mark("exam_sheet")
+        logger.info(f"Export timings: {timer.summary()}")
         
         # Возвращаем структурированный ответ
-        lectures_count = len(lectures) if 'lectures' in locals() else 0
+        lectures_count = len(matrix_lectures) if 'matrix_lectures' in locals() else 0
         reviews_count = len(homework_reviews) if 'homework_reviews' in locals() else 0
         exam_grades_count = len(exam_grades) if 'exam_grades' in locals() else 0
         
@@ -441,6 +440,7 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
             "lectures_count": lectures_count,
             "reviews_count": reviews_count,
             "exam_grades_count": exam_grades_count,
+            "changed_cells": changed_cells,
             "sheet_data": rows
         }
 
@@ -449,246 +449,84 @@ def export_all_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
         logger.error(f"Error exporting all google sheet: {str(e)}")
         logger.error(f"Error type: {type(e).__name__}")
         logger.error(f"Error traceback:\n{error_traceback}")
-        logger.error(f"GOOGLE_SHEET_ID: {GOOGLE_SHEET_ID}")
+        logger.error(f"GOOGLE_SHEET_ID: {sheets_client.GOOGLE_SHEET_ID}")
         logger.error(f"STUDENT_NAMES: {STUDENT_NAMES}")
         logger.error(f"LECTIONS_NAMES: {LECTIONS_NAMES}")
         logger.error(f"RATING_NAMES: {RATING_NAMES}")
         logger.error(f"EXAM_NAMES: {EXAM_NAMES}")
+        # Лист могли удалить или переименовать - при следующем вызове дескрипторы будут получены заново
+        sheets_client.invalidate()
         raise HTTPException(status_code=500, detail=str(e))
 
         
     return data
 
-@router.post("/export-student-attendance")
-def export_student_attendance_to_google_sheet(student_id: int, db: Session = Depends(get_db)) -> Dict[str, Any]:
+def _apply_student_attendance(db: Session, rows: sheets_rows.SheetRows, student_ids: List[int]) -> Dict[int, Dict[str, Any]]:
     """
-    Экспортирует информацию о посещаемости лекций одного студента в Google Sheet
+    Обновляет в строках листа "Лекции" посещаемость студентов student_ids.
+    Все студенты пачки загружаются общими запросами.
     """
-    data = dict()
-    
-    try:
-        logger.info(f"Starting export_student_attendance_to_google_sheet for student_id: {student_id}")
-        
-        # Находим студента в базе с таким id
-        logger.debug(f"Querying student with id: {student_id}")
-        student = db.query(Student).filter(Student.id == student_id, Student.is_deleted == False).first()
-        if not student:
-            logger.warning(f"Student with id {student_id} not found")
-            raise HTTPException(status_code=404, detail=f"Student with id {student_id} not found")
-        
-        logger.debug(f"Found student: {student.full_name} (telegram: {student.telegram})")
-        
-        # Подключаемся к Google Sheet
-        logger.debug("Authorizing gspread client...")
-        client = gspread.authorize(credentials)
-        
-        logger.debug(f"Opening spreadsheet by key: {GOOGLE_SHEET_ID}")
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
-        
-        # Получаем лист "Лекции"
-        try:
-            logger.debug(f"Trying to get existing {LECTIONS_NAMES} worksheet...")
-            sheet = spreadsheet.worksheet(LECTIONS_NAMES)
-            logger.debug(f"Found existing {LECTIONS_NAMES} worksheet")
-        except WorksheetNotFound:
-            logger.warning(f"Worksheet {LECTIONS_NAMES} not found, creating new one")
-            sheet = spreadsheet.add_worksheet(title=LECTIONS_NAMES, rows=1000, cols=50)
-            logger.info(f"Created new {LECTIONS_NAMES} worksheet")
-        
-        # Получаем все данные из листа
-        sheet_data = sheet.get_all_values()
-        
-        # Получаем все лекции
-        lectures = db.query(Lecture).order_by(Lecture.number).all()
-        
-        # Получаем данные о посещаемости студента
-        attendance_records = db.query(Attendance).filter(Attendance.student_id == student_id).all()
-        attendance_dict = {}
-        for record in attendance_records:
-            attendance_dict[record.lecture_id] = record.present
-        
-        # Формируем заголовки если лист пустой
-        if len(sheet_data) == 0:
-            headers = ["id", "full_name", "telegram"]
-            for lecture in lectures:
-                headers.append(f"lecture_{lecture.number}")
-            sheet_data = [headers]
-        
-        # Находим строку студента по telegram
-        student_row_index = None
-        for i, row in enumerate(sheet_data):
-            if len(row) >= 3 and row[2] == student.telegram:  # Проверяем по telegram (индекс 2)
-                student_row_index = i
-                break
-        
-        # Формируем данные студента
-        student_data = [
-            student.id,
-            student.full_name,
-            student.telegram
-        ]
-        
-        # Добавляем данные о посещаемости для каждой лекции
+    students = db.query(Student).filter(Student.id.in_(student_ids), Student.is_deleted == False).all()
+    lectures = lecture_index.all_lectures(db)
+    attendance_dicts = {student.id: {} for student in students}
+    for student_id, lecture_id, present in db.query(
+        Attendance.student_id, Attendance.lecture_id, Attendance.present
+    ).filter(Attendance.student_id.in_(student_ids)):
+        if student_id in attendance_dicts:
+            attendance_dicts[student_id][lecture_id] = present
+
+    # Читаем только строки этих студентов; формируем заголовки если лист пустой
+    rows.load(student.telegram for student in students)
+    if rows.is_empty:
+        rows.set_header(["id", "full_name", "telegram"] + [f"lecture_{lecture['number']}" for lecture in lectures])
+
+    results = {}
+    for student in students:
+        attendance_dict = attendance_dicts[student.id]
+        student_data = [student.id, student.full_name, student.telegram]
         for lecture in lectures:
-            present = attendance_dict.get(lecture.id, 0)
-            student_data.append("Да" if present == 1 else "Нет")
-        
-        # Если строка студента найдена, обновляем её
-        if student_row_index is not None:
-            # Убеждаемся, что у нас достаточно колонок в строке
-            while len(sheet_data[student_row_index]) < len(student_data):
-                sheet_data[student_row_index].append("")
-            
-            # Обновляем данные в строке
-            for i, value in enumerate(student_data):
-                sheet_data[student_row_index][i] = value
-            
-            action = "updated"
-        else:
-            # Добавляем новую строку в конец
-            sheet_data.append(student_data)
-            student_row_index = len(sheet_data) - 1
-            action = "added"
-        
-        # Записываем обновленные данные в лист
-        sheet.clear()
-        sheet.update("A1", sheet_data)
-        
+            student_data.append("Да" if attendance_dict.get(lecture['id'], 0) == 1 else "Нет")
+        row_number, action = rows.put(student.telegram, student_data)
+
         # Подсчитываем статистику посещаемости
         total_lectures = len(lectures)
         attended_lectures = sum(1 for present in attendance_dict.values() if present == 1)
-        attendance_percentage = round((attended_lectures / total_lectures) * 100) if total_lectures > 0 else 0
-        
-        data = {
+        results[student.id] = {
             "success": True,
-            "message": f"Student attendance {student_id} exported successfully to Google Sheet",
+            "message": f"Student attendance {student.id} exported successfully to Google Sheet",
             "student_name": student.full_name,
             "student_telegram": student.telegram,
             "total_lectures": total_lectures,
             "attended_lectures": attended_lectures,
-            "attendance_percentage": attendance_percentage,
-            "row_number": student_row_index + 1,  # +1 для отображения номера строки в Google Sheets
+            "attendance_percentage": round((attended_lectures / total_lectures) * 100) if total_lectures > 0 else 0,
+            "row_number": row_number,
             "action": action
         }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        error_traceback = traceback.format_exc()
-        logger.error(f"Error exporting student attendance {student_id} to google sheet: {str(e)}")
-        logger.error(f"Error type: {type(e).__name__}")
-        logger.error(f"Error traceback:\n{error_traceback}")
-        logger.error(f"GOOGLE_SHEET_ID: {GOOGLE_SHEET_ID}")
-        logger.error(f"LECTIONS_NAMES: {LECTIONS_NAMES}")
-        raise HTTPException(status_code=500, detail=str(e))
-    
-    return data
+    return results
 
-@router.post("/export-student")
-def export_student_to_google_sheet(student_id: int, db: Session = Depends(get_db)) -> Dict[str, Any]:
-    """
-    Экспортирует информацию по одному студенту в Google Sheet
-    """
-    data = dict()
-    
-    try:
-        logger.info(f"Starting export_student_to_google_sheet for student_id: {student_id}")
-        
-        # Находим студента в базе с таким id
-        logger.debug(f"Querying student with id: {student_id}")
-        student = db.query(Student).filter(Student.id == student_id, Student.is_deleted == False).first()
-        if not student:
-            logger.warning(f"Student with id {student_id} not found")
-            raise HTTPException(status_code=404, detail=f"Student with id {student_id} not found")
-        
-        logger.debug(f"Found student: {student.full_name} (telegram: {student.telegram}, group: {student.group_number})")
-        
-        # Подключаемся к Google Sheet
-        logger.debug("Authorizing gspread client...")
-        client = gspread.authorize(credentials)
-        
-        logger.debug(f"Opening spreadsheet by key: {GOOGLE_SHEET_ID}")
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
-        
-        # Получаем лист "Студенты"
-        try:
-            logger.debug(f"Trying to get existing {STUDENT_NAMES} worksheet...")
-            sheet = spreadsheet.worksheet(STUDENT_NAMES)
-            logger.debug(f"Found existing {STUDENT_NAMES} worksheet")
-        except WorksheetNotFound:
-            logger.warning(f"Worksheet {STUDENT_NAMES} not found, creating new one")
-            sheet = spreadsheet.add_worksheet(title=STUDENT_NAMES, rows=1000, cols=50)
-            logger.info(f"Created new {STUDENT_NAMES} worksheet")
-        
-        # Получаем все данные из листа
-        sheet_data = sheet.get_all_values()
-        
-        # Получаем всех преподавателей и их группы
-        teacher_groups = db.query(TeacherGroup).all()
-        teacher_names = {}
-        for tg in teacher_groups:
-            teacher = db.query(Teacher).filter(Teacher.id == tg.teacher_id, Teacher.is_deleted == False).first()
-            if teacher:
-                teacher_names[tg.group_number] = teacher.full_name
-        
-        # Получаем все домашние задания
-        homeworks = db.query(Homework).all()
-        
-        # Получаем варианты домашних заданий для студента
-        student_variants = db.query(StudentHomeworkVariant).filter(StudentHomeworkVariant.student_id == student_id).all()
-        variants_dict = {}
-        for variant in student_variants:
-            variants_dict[variant.homework_id] = variant.variant_number
-        
-        # Находим преподавателя для группы студента
+def _apply_students(db: Session, rows: sheets_rows.SheetRows, student_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Обновляет в строках листа "Студенты" данные студентов student_ids."""
+    students = db.query(Student).filter(Student.id.in_(student_ids), Student.is_deleted == False).all()
+    teacher_names = _teacher_names_by_group(db)
+    homeworks = db.query(Homework).order_by(Homework.number, Homework.id).all()
+    variants_dicts = {student.id: {} for student in students}
+    for student_id, homework_id, variant_number in db.query(
+        StudentHomeworkVariant.student_id, StudentHomeworkVariant.homework_id, StudentHomeworkVariant.variant_number
+    ).filter(StudentHomeworkVariant.student_id.in_(student_ids)):
+        if student_id in variants_dicts:
+            variants_dicts[student_id][homework_id] = variant_number
+    homework_scores, ai_percentages, attendance_counts = _student_stats(db, student_ids)
+
+    # Читаем только строки этих студентов; формируем заголовки если лист пустой
+    rows.load(student.telegram for student in students)
+    if rows.is_empty:
+        rows.set_header(STUDENT_HEADERS + [f"homework_{homework.number}_variant" for homework in homeworks])
+
+    results = {}
+    for student in students:
         teacher_name = teacher_names.get(student.group_number, "")
-        
-        # Вычисляем статистику студента
-        # Суммарный балл за все homework_review (только последние отправки по каждому варианту)
-        # Подзапрос для получения максимального id для каждой комбинации (student_id, number)
-        subquery = db.query(
-            func.max(HomeworkReview.id).label('max_id')
-        ).filter(
-            HomeworkReview.student_id == student.id
-        ).group_by(
-            HomeworkReview.number
-        ).subquery()
-        
-        total_homework_score = db.query(func.coalesce(func.sum(HomeworkReview.result), 0)).filter(
-            and_(
-                HomeworkReview.student_id == student.id,
-                HomeworkReview.id.in_(select(subquery.c.max_id))
-            )
-        ).scalar() or 0
-        
-        # Средний балл за vibe coding - среднее значение ai_percentage из homework_review
-        # где ai_percentage заполнен (не NULL)
-        ai_percentage = db.query(func.avg(HomeworkReview.ai_percentage)).filter(
-            HomeworkReview.student_id == student.id,
-            HomeworkReview.ai_percentage.isnot(None)
-        ).scalar()
-        
-        # Количество посещенных лекций (где present = 1)
-        attendance_count = db.query(func.count(Attendance.id)).filter(
-            Attendance.student_id == student.id,
-            Attendance.present == 1
-        ).scalar() or 0
-        
-        # Формируем заголовки если лист пустой
-        if len(sheet_data) == 0:
-            headers = ["id", "full_name", "telegram", "github", "group_number", "teacher", "total_homework_score", "ai_percentage", "attendance_count"]
-            for homework in homeworks:
-                headers.append(f"homework_{homework.number}_variant")
-            sheet_data = [headers]
-        
-        # Находим строку студента по telegram
-        student_row_index = None
-        for i, row in enumerate(sheet_data):
-            if len(row) >= 4 and row[2] == student.telegram:  # Проверяем по telegram (индекс 2)
-                student_row_index = i
-                break
-        
-        # Формируем данные студента
+        ai_percentage = ai_percentages.get(student.id)
+        variants_dict = variants_dicts[student.id]
         student_data = [
             student.id,
             student.full_name,
@@ -696,50 +534,179 @@ def export_student_to_google_sheet(student_id: int, db: Session = Depends(get_db
             student.github,
             student.group_number,
             teacher_name,
-            int(total_homework_score),
+            int(homework_scores.get(student.id) or 0),
             str(ai_percentage) if ai_percentage is not None else "",
-            int(attendance_count)
+            int(attendance_counts.get(student.id, 0))
         ]
-        
-        # Добавляем варианты домашних заданий
         for homework in homeworks:
             variant_number = variants_dict.get(homework.id, "")
             student_data.append(str(variant_number) if variant_number else "")
-        
-        # Если строка студента найдена, обновляем её
-        if student_row_index is not None:
-            # Убеждаемся, что у нас достаточно колонок в строке
-            while len(sheet_data[student_row_index]) < len(student_data):
-                sheet_data[student_row_index].append("")
-            
-            # Обновляем данные в строке
-            for i, value in enumerate(student_data):
-                sheet_data[student_row_index][i] = value
-            
-            action = "updated"
-        else:
-            # Добавляем новую строку в конец
-            sheet_data.append(student_data)
-            student_row_index = len(sheet_data) - 1
-            action = "added"
-        
-        # Записываем обновленные данные в лист
-        sheet.clear()
-        sheet.update("A1", sheet_data)
-        
-        data = {
+        row_number, action = rows.put(student.telegram, student_data)
+
+        results[student.id] = {
             "success": True,
-            "message": f"Student {student_id} exported successfully to Google Sheet",
+            "message": f"Student {student.id} exported successfully to Google Sheet",
             "student_name": student.full_name,
             "student_telegram": student.telegram,
             "group_number": student.group_number,
             "teacher_name": teacher_name,
             "homeworks_count": len(homeworks),
-            "variants_count": len(student_variants),
-            "row_number": student_row_index + 1,  # +1 для отображения номера строки в Google Sheets
+            "variants_count": len(variants_dict),
+            "row_number": row_number,
             "action": action
         }
-        
+    return results
+
+def _apply_reviews(db: Session, rows: sheets_rows.SheetRows, review_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Обновляет в строках листа "Оценки" ячейки проверок review_ids. Проверки
+    применяются по возрастанию id, так что в ячейке остается более поздняя.
+    """
+    reviews = db.query(HomeworkReview).filter(HomeworkReview.id.in_(review_ids)).order_by(HomeworkReview.id).all()
+    students = {
+        student.id: student
+        for student in db.query(Student).filter(Student.id.in_({review.student_id for review in reviews}))
+    }
+    homeworks = db.query(Homework).order_by(Homework.number, Homework.id).all()
+
+    # Читаем только строки студентов этих проверок; формируем заголовки если лист пустой
+    rows.load(student.telegram for student in students.values())
+    if rows.is_empty:
+        ratings_headers = ["full_name", "telegram", "group_number"]
+        for homework in homeworks:
+            ratings_headers.extend([
+                f"homework_{homework.number}_url",
+                f"homework_{homework.number}_send_date",
+                f"homework_{homework.number}_review_date",
+                f"homework_{homework.number}_ai_percentage",
+                f"homework_{homework.number}_grade"
+            ])
+        rows.set_header(ratings_headers)
+
+    results = {}
+    for review in reviews:
+        student = students.get(review.student_id)
+        if student is None:
+            continue
+
+        # Если строка студента не найдена, добавляем новую с пустыми колонками для всех ДЗ
+        # (url, send_date, review_date, ai_percentage, grade)
+        row = rows.get(student.telegram)
+        if row is None:
+            row = [student.full_name, student.telegram, student.group_number] + [""] * (5 * len(homeworks))
+
+        # Вычисляем индексы колонок для данного домашнего задания
+        base_index = 3 + (review.number - 1) * 5
+        grade_index = base_index + 4
+        row.extend([""] * (grade_index + 1 - len(row)))
+
+        # URL репозитория, даты отправки и проверки, процент AI генерации и оценка преподавателя
+        if review.url:
+            row[base_index] = review.url
+        if review.send_date:
+            row[base_index + 1] = review.send_date
+        if review.review_date:
+            row[base_index + 2] = review.review_date
+        if review.ai_percentage is not None:
+            row[base_index + 3] = str(review.ai_percentage)
+        if review.result and review.result > 0:
+            row[grade_index] = str(review.result)
+        row_number, _ = rows.put(student.telegram, row)
+
+        results[review.id] = {
+            "success": True,
+            "message": f"Review {review.id} exported successfully to Google Sheet",
+            "student_name": student.full_name,
+            "student_telegram": student.telegram,
+            "homework_number": review.number,
+            "row_updated": row_number,
+            "url_updated": bool(review.url),
+            "send_date_updated": bool(review.send_date),
+            "review_date_updated": bool(review.review_date),
+            "ai_percentage_updated": review.ai_percentage is not None,
+            "grade_updated": bool(review.result and review.result > 0)
+        }
+    return results
+
+# Строки листов ищутся по telegram студента
+sheets_queue.register(LECTIONS_NAMES, _apply_student_attendance, key_column=2)
+sheets_queue.register(STUDENT_NAMES, _apply_students, key_column=2)
+sheets_queue.register(RATING_NAMES, _apply_reviews, key_column=1)
+
+def _queued_export(db: Session, sheet_title: str, key: int, wait: bool, what: str) -> Dict[str, Any]:
+    """
+    Ставит обновление в очередь экспорта. При wait ждет записи в лист и
+    возвращает ее результат, иначе сразу отвечает, что обновление в очереди.
+    """
+    # Соединение с БД возвращается в пул до ожидания: запись выполняет фоновый
+    # поток со своей сессией, и ожидающие запросы не должны занимать весь пул
+    db.close()
+    future = sheets_queue.enqueue(sheet_title, key)
+    if not wait:
+        return {"success": True, "queued": True, "message": f"{what} queued for export to Google Sheet"}
+    try:
+        result = sheets_queue.wait(future)
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail=f"{what} is still queued for export to Google Sheet")
+    if not result:
+        raise HTTPException(status_code=404, detail=f"{what} not found")
+    return result
+
+@router.post("/export-student-attendance")
+def export_student_attendance_to_google_sheet(
+    student_id: int,
+    wait: bool = Query(False, description="Дождаться записи в лист (по умолчанию ответ сразу после постановки в очередь)"),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Экспортирует информацию о посещаемости лекций одного студента в Google Sheet.
+    Обновления, пришедшие в течение окна очереди, записываются в лист одним batch_update.
+    """
+    try:
+        logger.info(f"Starting export_student_attendance_to_google_sheet for student_id: {student_id}")
+
+        # Находим студента в базе с таким id
+        student = db.query(Student.id).filter(Student.id == student_id, Student.is_deleted == False).first()
+        if not student:
+            logger.warning(f"Student with id {student_id} not found")
+            raise HTTPException(status_code=404, detail=f"Student with id {student_id} not found")
+
+        data = _queued_export(db, LECTIONS_NAMES, student_id, wait, f"Student attendance {student_id}")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_traceback = traceback.format_exc()
+        logger.error(f"Error exporting student attendance {student_id} to google sheet: {str(e)}")
+        logger.error(f"Error type: {type(e).__name__}")
+        logger.error(f"Error traceback:\n{error_traceback}")
+        logger.error(f"GOOGLE_SHEET_ID: {sheets_client.GOOGLE_SHEET_ID}")
+        logger.error(f"LECTIONS_NAMES: {LECTIONS_NAMES}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return data
+
+@router.post("/export-student")
+def export_student_to_google_sheet(
+    student_id: int,
+    wait: bool = Query(False, description="Дождаться записи в лист (по умолчанию ответ сразу после постановки в очередь)"),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Экспортирует информацию по одному студенту в Google Sheet.
+    Обновления, пришедшие в течение окна очереди, записываются в лист одним batch_update.
+    """
+    try:
+        logger.info(f"Starting export_student_to_google_sheet for student_id: {student_id}")
+
+        # Находим студента в базе с таким id
+        student = db.query(Student.id).filter(Student.id == student_id, Student.is_deleted == False).first()
+        if not student:
+            logger.warning(f"Student with id {student_id} not found")
+            raise HTTPException(status_code=404, detail=f"Student with id {student_id} not found")
+
+        data = _queued_export(db, STUDENT_NAMES, student_id, wait, f"Student {student_id}")
+
     except HTTPException:
         raise
     except Exception as e:
@@ -747,150 +714,36 @@ def export_student_to_google_sheet(student_id: int, db: Session = Depends(get_db
         logger.error(f"Error exporting student {student_id} to google sheet: {str(e)}")
         logger.error(f"Error type: {type(e).__name__}")
         logger.error(f"Error traceback:\n{error_traceback}")
-        logger.error(f"GOOGLE_SHEET_ID: {GOOGLE_SHEET_ID}")
+        logger.error(f"GOOGLE_SHEET_ID: {sheets_client.GOOGLE_SHEET_ID}")
         logger.error(f"STUDENT_NAMES: {STUDENT_NAMES}")
         raise HTTPException(status_code=500, detail=str(e))
-    
+
     return data
 
 @router.post("/export-review")
-def export_review_to_google_sheet(review_id: int, db: Session = Depends(get_db)) -> Dict[str, Any]:
+def export_review_to_google_sheet(
+    review_id: int,
+    wait: bool = Query(False, description="Дождаться записи в лист (по умолчанию ответ сразу после постановки в очередь)"),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
     """
-    Экспортирует конкретную проверку домашнего задания по ID в Google Sheet
+    Экспортирует конкретную проверку домашнего задания по ID в Google Sheet.
+    Обновления, пришедшие в течение окна очереди, записываются в лист одним batch_update.
     """
-    data = dict()
-    
     try:
         logger.info(f"Starting export_review_to_google_sheet for review_id: {review_id}")
-        
-        # Находим homework_review в базе с таким id
-        logger.debug(f"Querying homework review with id: {review_id}")
-        review = db.query(HomeworkReview).filter(HomeworkReview.id == review_id).first()
+
+        # Находим homework_review и студента, для которого он создан
+        review = db.query(HomeworkReview.id, HomeworkReview.student_id).filter(HomeworkReview.id == review_id).first()
         if not review:
             logger.warning(f"Homework review with id {review_id} not found")
             raise HTTPException(status_code=404, detail=f"Homework review with id {review_id} not found")
-        
-        logger.debug(f"Found review: student_id={review.student_id}, number={review.number}, url={review.url}")
-        
-        # Находим студента для которого homework_review
-        logger.debug(f"Querying student with id: {review.student_id}")
-        student = db.query(Student).filter(Student.id == review.student_id).first()
-        if not student:
+        if not db.query(Student.id).filter(Student.id == review.student_id).first():
             logger.warning(f"Student with id {review.student_id} not found")
             raise HTTPException(status_code=404, detail=f"Student with id {review.student_id} not found")
-        
-        logger.debug(f"Found student: {student.full_name} (telegram: {student.telegram})")
-        
-        # Подключаемся к Google Sheet
-        logger.debug("Authorizing gspread client...")
-        client = gspread.authorize(credentials)
-        
-        logger.debug(f"Opening spreadsheet by key: {GOOGLE_SHEET_ID}")
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
-        
-        # Получаем или создаем лист "Оценки"
-        try:
-            logger.debug(f"Trying to get existing {RATING_NAMES} worksheet...")
-            ratings_sheet = spreadsheet.worksheet(RATING_NAMES)
-            logger.debug(f"Found existing {RATING_NAMES} worksheet")
-        except WorksheetNotFound:
-            logger.warning(f"Worksheet {RATING_NAMES} not found, creating new one")
-            ratings_sheet = spreadsheet.add_worksheet(title=RATING_NAMES, rows=1000, cols=50)
-            logger.info(f"Created new {RATING_NAMES} worksheet")
-        
-        # Получаем все данные из листа
-        ratings_data = ratings_sheet.get_all_values()
-        
-        # Получаем все домашние задания для определения структуры колонок
-        homeworks = db.query(Homework).all()
-        homeworks_by_number = {homework.number: homework for homework in homeworks}
-        
-        # Формируем заголовки если лист пустой
-        if len(ratings_data) == 0:
-            ratings_headers = ["full_name", "telegram","group_number"]
-            for homework in homeworks:
-                ratings_headers.extend([
-                    f"homework_{homework.number}_url",
-                    f"homework_{homework.number}_send_date",
-                    f"homework_{homework.number}_review_date",
-                    f"homework_{homework.number}_ai_percentage",
-                    f"homework_{homework.number}_grade"
-                ])
-            ratings_data = [ratings_headers]
-        
-        # Находим или создаем строку для студента
-        student_row_index = None
-        for i, row in enumerate(ratings_data):
-            if len(row) >= 2 and row[1] == student.telegram:  # Проверяем по telegram
-                student_row_index = i
-                break
-        
-        # Если строка студента не найдена, добавляем новую
-        if student_row_index is None:
-            # Создаем новую строку для студента
-            new_row = [student.full_name, student.telegram,student.group_number]
-            
-            # Добавляем пустые колонки для всех домашних заданий
-            for homework in homeworks:
-                new_row.extend(["", "", "", "", ""])  # url, send_date, review_date, ai_percentage, grade
-            
-            ratings_data.append(new_row)
-            student_row_index = len(ratings_data) - 1
-        
-        # Вычисляем индексы колонок для данного домашнего задания
-        homework_number = review.number
-        base_index = 3 + (homework_number - 1) * 5
-        url_index = base_index
-        send_date_index = base_index + 1
-        review_date_index = base_index + 2
-        ai_percentage_index = base_index + 3
-        grade_index = base_index + 4
-        
-        # Убеждаемся, что у нас достаточно колонок в строке
-        while len(ratings_data[student_row_index]) <= grade_index:
-            ratings_data[student_row_index].append("")
-        
-        # Обновляем данные в строке студента
-        row = ratings_data[student_row_index]
-        
-        # URL репозитория
-        if review.url:
-            row[url_index] = review.url
-        
-        # Дата отправки
-        if review.send_date:
-            row[send_date_index] = review.send_date
-        
-        # Дата проверки
-        if review.review_date:
-            row[review_date_index] = review.review_date
-        
-        # Процент AI генерации
-        if review.ai_percentage is not None:
-            row[ai_percentage_index] = str(review.ai_percentage)
-        
-        # Оценка преподавателя
-        if review.result and review.result > 0:
-            row[grade_index] = str(review.result)
-        
-        # Записываем обновленные данные в лист
-        ratings_sheet.clear()
-        ratings_sheet.update("A1", ratings_data)
-        
-        data = {
-            "success": True,
-            "message": f"Review {review_id} exported successfully to Google Sheet",
-            "student_name": student.full_name,
-            "student_telegram": student.telegram,
-            "homework_number": homework_number,
-            "row_updated": student_row_index + 1,  # +1 для отображения номера строки в Google Sheets
-            "url_updated": bool(review.url),
-            "send_date_updated": bool(review.send_date),
-            "review_date_updated": bool(review.review_date),
-            "ai_percentage_updated": review.ai_percentage is not None,
-            "grade_updated": bool(review.result and review.result > 0)
-        }
-        
+
+        data = _queued_export(db, RATING_NAMES, review_id, wait, f"Review {review_id}")
+
     except HTTPException:
         raise
     except Exception as e:
@@ -898,203 +751,228 @@ def export_review_to_google_sheet(review_id: int, db: Session = Depends(get_db))
         logger.error(f"Error exporting review {review_id} to google sheet: {str(e)}")
         logger.error(f"Error type: {type(e).__name__}")
         logger.error(f"Error traceback:\n{error_traceback}")
-        logger.error(f"GOOGLE_SHEET_ID: {GOOGLE_SHEET_ID}")
+        logger.error(f"GOOGLE_SHEET_ID: {sheets_client.GOOGLE_SHEET_ID}")
         logger.error(f"RATING_NAMES: {RATING_NAMES}")
         raise HTTPException(status_code=500, detail=str(e))
-    
+
     return data
 
+@router.get("/queue")
+def get_export_queue_metrics() -> ExportQueueMetricsInfo:
+    """
+    Метрики очереди экспорта: сколько событий поставлено, сколько объединено
+    с уже ожидающими, сколько записей в листы выполнено и coalescing_ratio -
+    среднее число событий на одно применённое обновление строки.
+    """
+    logger.info("GET /api/google_sheet/queue - Retrieving export queue metrics")
+    return sheets_queue.metrics()
+
+# Поля проверки ДЗ, которые импортируются из листа "Оценки"
+RATING_FIELDS = ("url", "send_date", "review_date", "ai_percentage", "result")
+
+# Значения новой проверки, созданной импортом, для незаполненных ячеек
+_NEW_REVIEW_DEFAULTS = {"send_date": "", "review_date": None, "url": "", "result": 0, "comments": "", "ai_percentage": None}
+
+def _parse_rating_cells(row: List[str], homework_number: int, telegram: str) -> Optional[Dict[str, Any]]:
+    """
+    Заполненные поля проверки из пяти ячеек ДЗ homework_number строки листа
+    "Оценки" (url, send_date, review_date, ai_percentage, grade). None - ячеек
+    нет или все пусты; нечисловые процент и оценка пропускаются.
+    """
+    # Вычисляем индексы колонок для данного домашнего задания
+    base_index = 3 + (homework_number - 1) * 5
+    if len(row) <= base_index + 4:
+        return None
+    url, send_date, review_date, ai_percentage_str, grade_str = row[base_index:base_index + 5]
+    grade_str = grade_str.lstrip("'").lstrip("`")
+    if not any(value.strip() for value in (url, send_date, review_date, ai_percentage_str, grade_str)):
+        return None
+
+    values = {}
+    if url.strip():
+        values["url"] = url
+    if send_date.strip():
+        values["send_date"] = send_date
+    if review_date.strip():
+        values["review_date"] = review_date
+    if ai_percentage_str.strip():
+        try:
+            values["ai_percentage"] = float(ai_percentage_str)
+        except ValueError:
+            logger.warning(f"Invalid AI percentage for student {telegram}, homework {homework_number}: {ai_percentage_str}")
+    if grade_str.strip():
+        try:
+            grade = int(grade_str)
+            if grade > 0:
+                values["result"] = grade
+        except ValueError:
+            logger.warning(f"Invalid grade for student {telegram}, homework {homework_number}: {grade_str}")
+    return values
+
+# Отпечаток листа "Оценки" при последнем успешном импорте: время изменения таблицы и хэш значений
+_last_ratings_import: Dict[str, Optional[str]] = {"modified_time": None, "values_hash": None}
+
+def _ratings_unchanged_response() -> Dict[str, Any]:
+    return {
+        "success": True,
+        "message": "Ratings sheet has not changed since the last import",
+        "skipped": True,
+        "imported_count": 0,
+        "updated_count": 0,
+        "created_count": 0,
+        "unchanged_count": 0
+    }
+
 @router.post("/import-ratings")
-def import_ratings_from_google_sheet(db: Session = Depends(get_db)) -> Dict[str, Any]:
+def import_ratings_from_google_sheet(
+    force: bool = Query(False, description="Импортировать, даже если лист не менялся с прошлого импорта"),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
     """
-    Импортирует данные о проверках домашних заданий из Google Sheet
+    Импортирует данные о проверках домашних заданий из Google Sheet.
+    Лист сравнивается с последними проверками в БД, изменения записываются
+    пакетно в одной транзакции; updated_count - только реально измененные проверки.
+    Если таблица не менялась с прошлого импорта (время изменения по Drive API)
+    или значения листа совпадают с импортированными, импорт пропускается.
     """
     data = dict()
     
     try:
         logger.info("Starting import_ratings_from_google_sheet")
-        logger.debug(f"GOOGLE_SHEET_ID: {GOOGLE_SHEET_ID}")
-        
-        logger.debug("Authorizing gspread client...")
-        client = gspread.authorize(credentials)
-        
-        logger.debug(f"Opening spreadsheet by key: {GOOGLE_SHEET_ID}")
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+        logger.debug(f"GOOGLE_SHEET_ID: {sheets_client.GOOGLE_SHEET_ID}")
+
+        # Сначала дешевая проверка метаданных: лист не читается, если таблицу не меняли
+        try:
+            modified_time = sheets_client.get_modified_time()
+        except Exception as e:
+            logger.warning(f"Failed to get spreadsheet modified time, falling back to values hash: {e}")
+            modified_time = None
+        if not force and modified_time is not None and modified_time == _last_ratings_import["modified_time"]:
+            logger.info(f"Spreadsheet not modified since {modified_time}, skipping ratings import")
+            return _ratings_unchanged_response()
         
         # Получаем лист "Оценки"
-        try:
-            logger.debug(f"Trying to get existing {RATING_NAMES} worksheet...")
-            ratings_sheet = spreadsheet.worksheet(RATING_NAMES)
-            logger.debug(f"Found existing {RATING_NAMES} worksheet")
-        except WorksheetNotFound:
-            logger.warning(f"Worksheet {RATING_NAMES} not found, creating new one")
-            ratings_sheet = spreadsheet.add_worksheet(title=RATING_NAMES, rows=1000, cols=50)
-            logger.info(f"Created new {RATING_NAMES} worksheet")
+        ratings_sheet = sheets_client.get_worksheet(RATING_NAMES)
         
         # Получаем данные из листа
         ratings_data = ratings_sheet.get_all_values()
+
+        # Таблицу могли менять в других листах - сравниваем значения листа "Оценки"
+        values_hash = hashlib.sha256(
+            json.dumps(ratings_data, ensure_ascii=False, separators=(",", ":")).encode()
+        ).hexdigest()
+        if not force and values_hash == _last_ratings_import["values_hash"]:
+            logger.info("Ratings sheet values unchanged, skipping ratings import")
+            _last_ratings_import["modified_time"] = modified_time
+            return _ratings_unchanged_response()
         
         if len(ratings_data) < 2:  # Только заголовки или пустой лист
             return {
                 "success": True,
                 "message": "No data to import",
+                "skipped": False,
                 "imported_count": 0,
                 "updated_count": 0,
-                "created_count": 0
+                "created_count": 0,
+                "unchanged_count": 0
             }
         
-        # Получаем заголовки
-        headers = ratings_data[0]
-        
         # Получаем всех студентов для поиска по telegram
-        students = db.query(Student).filter(Student.is_deleted == False).all()
-        students_by_telegram = {student.telegram: student for student in students}
-        
-        # Получаем все домашние задания
-        homeworks = db.query(Homework).all()
-        homeworks_by_number = {homework.number: homework for homework in homeworks}
-        
-        # Счетчики для статистики
+        students_by_telegram = {
+            telegram: student_id
+            for student_id, telegram in db.query(Student.id, Student.telegram).filter(Student.is_deleted == False)
+        }
+
+        # Получаем номера домашних заданий
+        homework_numbers = [number for (number,) in db.query(Homework.number)]
+
+        # Последние проверки по (студент, номер ДЗ) одним запросом
+        latest_reviews = {
+            (review.student_id, review.number): review
+            for review in db.query(
+                HomeworkReview.id, HomeworkReview.student_id, HomeworkReview.number,
+                *(getattr(HomeworkReview, field) for field in RATING_FIELDS)
+            ).filter(HomeworkReview.id.in_(
+                db.query(func.max(HomeworkReview.id)).group_by(HomeworkReview.student_id, HomeworkReview.number)
+            ))
+        }
+
+        # Собираем значения из листа: обновления существующих проверок и новые проверки.
+        # Если студент встречается в листе несколько раз, более поздние ячейки перекрывают ранние
         imported_count = 0
-        updated_count = 0
-        created_count = 0
-        
-        # Обрабатываем каждую строку данных (пропускаем заголовки)
-        for row in ratings_data[1:]:
+        review_updates: Dict[int, Dict[str, Any]] = {}
+        new_reviews: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for row in ratings_data[1:]:  # пропускаем заголовки
             if len(row) < 2:  # Минимум full_name и telegram
                 continue
-                
-            full_name = row[0]
+
             telegram = row[1]
-            
-            # Находим студента по telegram
-            student = students_by_telegram.get(telegram)
-            if not student:
+            student_id = students_by_telegram.get(telegram)
+            if student_id is None:
                 logger.warning(f"Student not found for telegram: {telegram}")
                 continue
-            
-            # Обрабатываем каждое домашнее задание
-            for homework in homeworks:
-                homework_number = homework.number
-                
-                # Вычисляем индексы колонок для данного домашнего задания
-                base_index = 3 + (homework_number - 1) * 5
-                url_index = base_index
-                send_date_index = base_index + 1
-                review_date_index = base_index + 2
-                ai_percentage_index = base_index + 3
-                grade_index = base_index + 4
-                
-                # Проверяем, что у нас есть достаточно колонок
-                if len(row) <= grade_index:
-                    continue
-                
-                # Получаем данные из строки
-                url = row[url_index] if url_index < len(row) else ""
-                send_date = row[send_date_index] if send_date_index < len(row) else ""
-                review_date = row[review_date_index] if review_date_index < len(row) else ""
-                ai_percentage_str = row[ai_percentage_index] if ai_percentage_index < len(row) else ""
-                grade_str = row[grade_index] if grade_index < len(row) else ""
-
-                grade_str = grade_str.lstrip("'").lstrip("`")
-                
-                # Проверяем, есть ли хотя бы одно заполненное поле
-                has_data = any([
-                    url.strip(),
-                    send_date.strip(),
-                    review_date.strip(),
-                    ai_percentage_str.strip(),
-                    grade_str.strip()
-                ])
-                
-                if not has_data:
-                    continue
-                
-                # Парсим числовые значения
-                ai_percentage = None
-                if ai_percentage_str.strip():
-                    try:
-                        ai_percentage = float(ai_percentage_str)
-                    except ValueError:
-                        logger.warning(f"Invalid AI percentage for student {telegram}, homework {homework_number}: {ai_percentage_str}")
-                
-                grade = None
-                if grade_str.strip():
-                    try:
-                        grade = int(grade_str)
-                    except ValueError:
-                        logger.warning(f"Invalid grade for student {telegram}, homework {homework_number}: {grade_str}")
-                
-                # Ищем самую последнюю запись homework_review для данного студента и домашнего задания
-                existing_review = db.query(HomeworkReview).filter(
-                    HomeworkReview.student_id == student.id,
-                    HomeworkReview.number == homework_number
-                ).order_by(HomeworkReview.id.desc()).first()
-                
-                if existing_review:
-                    # Обновляем существующую запись
-                    update_data = {}
 
-                    
-                    
-                    if url.strip():
-                        update_data["url"] = url
-                    if send_date.strip():
-                        update_data["send_date"] = send_date
-                    if review_date.strip():
-                        update_data["review_date"] = review_date
-                    if ai_percentage is not None:
-                        update_data["ai_percentage"] = ai_percentage
-                    if grade is not None and grade > 0:
-                        update_data["result"] = grade
-
-                    logger.debug(f"Updating review for student {telegram}, homework {homework_number}")
-                    logger.debug(f"Update data: {update_data}")
-                    logger.debug(f"Existing review: {existing_review.__dict__}")
-                    
-                    # Обновляем только заполненные поля
-                    for field, value in update_data.items():
-                        setattr(existing_review, field, value)
-                    
-                    db.commit()
-                    updated_count += 1
-                    logger.info(f"Updated review for student {telegram}, homework {homework_number}")
-                    
+            for homework_number in homework_numbers:
+                values = _parse_rating_cells(row, homework_number, telegram)
+                if values is None:
+                    continue
+                key = (student_id, homework_number)
+                existing_review = latest_reviews.get(key)
+                if existing_review is not None:
+                    review_updates.setdefault(existing_review.id, {}).update(values)
+                elif key in new_reviews:
+                    new_reviews[key].update(values)
                 else:
-                    # Создаем новую запись
-                    new_review = HomeworkReview(
-                        student_id=student.id,
-                        number=homework_number,
-                        send_date=send_date if send_date.strip() else "",
-                        review_date=review_date if review_date.strip() else None,
-                        url=url if url.strip() else "",
-                        result=grade if grade is not None and grade > 0 else 0,
-                        comments="",
-                        ai_percentage=ai_percentage
-                    )
-                    
-                    db.add(new_review)
-                    db.commit()
-                    created_count += 1
-                    logger.info(f"Created new review for student {telegram}, homework {homework_number}")
-                
+                    new_reviews[key] = {**_NEW_REVIEW_DEFAULTS, "student_id": student_id, "number": homework_number, **values}
                 imported_count += 1
-        
+
+        # Обновляем только проверки, в которых действительно что-то изменилось
+        changed_reviews = []
+        for existing_review in latest_reviews.values():
+            values = review_updates.get(existing_review.id)
+            if values is None:
+                continue
+            new_values = {field: values.get(field, getattr(existing_review, field)) for field in RATING_FIELDS}
+            if any(new_values[field] != getattr(existing_review, field) for field in RATING_FIELDS):
+                logger.debug(f"Updating review {existing_review.id}: {values}")
+                changed_reviews.append({"id": existing_review.id, **new_values})
+
+        # Все изменения - пакетными UPDATE/INSERT в одной транзакции
+        if changed_reviews:
+            db.execute(update(HomeworkReview), changed_reviews)
+        if new_reviews:
+            db.execute(insert(HomeworkReview.__table__), list(new_reviews.values()))
+        db.commit()
+
+        _last_ratings_import.update(modified_time=modified_time, values_hash=values_hash)
+
+        updated_count = len(changed_reviews)
+        created_count = len(new_reviews)
+        unchanged_count = len(review_updates) - updated_count
+        logger.info(
+            f"Imported {imported_count} homework cells: {updated_count} reviews updated, "
+            f"{created_count} created, {unchanged_count} unchanged"
+        )
+
         data = {
             "success": True,
             "message": "Data imported successfully from Google Sheet",
+            "skipped": False,
             "imported_count": imported_count,
             "updated_count": updated_count,
-            "created_count": created_count
+            "created_count": created_count,
+            "unchanged_count": unchanged_count
         }
         
     except Exception as e:
+        db.rollback()
         error_traceback = traceback.format_exc()
         logger.error(f"Error importing ratings from google sheet: {str(e)}")
         logger.error(f"Error type: {type(e).__name__}")
         logger.error(f"Error traceback:\n{error_traceback}")
-        logger.error(f"GOOGLE_SHEET_ID: {GOOGLE_SHEET_ID}")
+        logger.error(f"GOOGLE_SHEET_ID: {sheets_client.GOOGLE_SHEET_ID}")
         logger.error(f"RATING_NAMES: {RATING_NAMES}")
+        sheets_client.invalidate()
         raise HTTPException(status_code=500, detail=str(e))
     
     return data
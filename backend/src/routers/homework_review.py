@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, TypedDict
+from sqlalchemy import tuple_
+from typing import List, TypedDict, Dict, Tuple, Optional, Literal
 import logging
 import os
 import tempfile
@@ -10,8 +11,10 @@ import asyncio
 from datetime import datetime
 from openai import AsyncOpenAI
 import requests
+import deadlines
 from models import HomeworkReviewInfo, HomeworkReviewCreate, HomeworkReviewUpdate
 from database import get_db, HomeworkReview, Student, StudentHomeworkVariant, Homework, TeacherGroup
+from routers.utils import keyset_paginate, resolve_sort, set_next_cursor, apply_date_range, fast_json_response, MAX_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +49,7 @@ def send_telegram_message(chat_id: int, message: str) -> bool:
     }
     
     try:
-        response = requests.post(url, json=payload, timeout=10)
+        response = requests.post(url, json=payload, timeout=deadlines.call_timeout(10))
         if not response.ok:
             error_detail = response.text
             logger.error(f"Failed to send Telegram message to chat_id {chat_id}: {response.status_code} - {error_detail}")
@@ -61,66 +64,124 @@ def send_telegram_message(chat_id: int, message: str) -> bool:
         logger.error(f"Unexpected error sending Telegram message to chat_id {chat_id}: {e}")
         return False
 
+def _variant_numbers(db: Session, reviews: List[HomeworkReview]) -> Dict[Tuple[int, int], int]:
+    """
+    Загружает номера вариантов для набора работ двумя запросами.
+    Возвращает словарь {(student_id, номер задания): номер варианта}.
+    """
+    if not reviews:
+        return {}
+    homework_ids = {}  # номер задания -> id (первое задание с таким номером)
+    for homework in db.query(Homework.id, Homework.number).order_by(Homework.id).all():
+        homework_ids.setdefault(homework.number, homework.id)
+    student_ids = {rec.student_id for rec in reviews}
+    variants = {}  # (student_id, homework_id) -> variant_number
+    for variant in db.query(StudentHomeworkVariant).filter(
+        StudentHomeworkVariant.student_id.in_(student_ids)
+    ).order_by(StudentHomeworkVariant.id).all():
+        variants.setdefault((variant.student_id, variant.homework_id), variant.variant_number)
+    result = {}
+    for rec in reviews:
+        homework_id = homework_ids.get(rec.number)
+        if homework_id is not None:
+            result[(rec.student_id, rec.number)] = variants.get((rec.student_id, homework_id))
+    return result
+
+# Ключи сортировки для списка работ. Страница формируется по парам (студент, номер задания),
+# чтобы выбор актуальной работы внутри пары не разрывался между страницами.
+HOMEWORK_REVIEW_SORT_KEYS = {
+    "student": [HomeworkReview.student_id, HomeworkReview.number],
+    "number": [HomeworkReview.number, HomeworkReview.student_id],
+}
+
 @router.get("/", response_model=List[HomeworkReviewInfo])
 @router.get("", response_model=List[HomeworkReviewInfo])
-def get_homework_reviews(db: Session = Depends(get_db)):
-    logger.info("GET /api/homework_review - Retrieving all homework reviews")
-    homework_reviews = db.query(HomeworkReview).all()
-    result = []
+def get_homework_reviews(
+    response: Response,
+    student_id: Optional[int] = Query(None, description="Фильтр по студенту"),
+    group_number: Optional[str] = Query(None, description="Фильтр по номеру группы студента"),
+    number: Optional[int] = Query(None, description="Фильтр по номеру домашнего задания"),
+    date_from: Optional[str] = Query(None, description="Дата отправки не раньше (ISO)"),
+    date_to: Optional[str] = Query(None, description="Дата отправки не позже (ISO, включительно)"),
+    sort: str = Query("student", description="Ключ сортировки: student, number"),
+    order: Literal["asc", "desc"] = Query("asc", description="Направление сортировки"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (без параметра - все записи)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    db: Session = Depends(get_db)
+):
+    logger.info("GET /api/homework_review - Retrieving homework reviews")
+    columns = resolve_sort(HOMEWORK_REVIEW_SORT_KEYS, sort)
+
+    def filtered(query):
+        query = query.join(Student, Student.id == HomeworkReview.student_id).filter(Student.is_deleted == False)
+        if student_id is not None:
+            query = query.filter(HomeworkReview.student_id == student_id)
+        if group_number is not None:
+            query = query.filter(Student.group_number == group_number)
+        if number is not None:
+            query = query.filter(HomeworkReview.number == number)
+        return apply_date_range(query, HomeworkReview.send_date, date_from, date_to)
+
+    # Сначала выбираем страницу пар (студент, номер задания), затем все работы этих пар
+    groups, next_cursor = keyset_paginate(
+        filtered(db.query(HomeworkReview.student_id, HomeworkReview.number)).distinct(),
+        columns, lambda row: [getattr(row, column.key) for column in columns],
+        cursor, limit, descending=(order == "desc")
+    )
+    set_next_cursor(response, next_cursor)
+    if not groups:
+        logger.info("GET /api/homework_review - Retrieved 0 homework reviews")
+        return []
+
+    query = filtered(db.query(HomeworkReview, Student))
+    if limit is not None:
+        query = query.filter(tuple_(HomeworkReview.student_id, HomeworkReview.number).in_(
+            [(row.student_id, row.number) for row in groups]
+        ))
+    rows = query.order_by(HomeworkReview.id).all()
+    variant_numbers = _variant_numbers(db, [rec for rec, _ in rows])
+
     work_map = dict() # {student_id,work_number} -> HomeworkReviewInfo
-    for rec in homework_reviews:
-        student = db.query(Student).filter(Student.id == rec.student_id, Student.is_deleted == False).first()
-        if student:
-            # Получаем информацию о варианте домашнего задания
-            # Сначала находим ID домашнего задания по номеру
-            homework = db.query(Homework).filter(Homework.number == rec.number).first()
-            variant_number = None
-            if homework:
-                variant = db.query(StudentHomeworkVariant).filter(
-                    StudentHomeworkVariant.student_id == rec.student_id,
-                    StudentHomeworkVariant.homework_id == homework.id
-                ).first()
-                variant_number = variant.variant_number if variant else None
-            
-            status = f"{student.id:>16}_{rec.number:>4}"
+    for rec, student in rows:
+        status = (student.id, rec.number)
 
-            review = HomeworkReviewInfo(
-                id = rec.id,
-                number=rec.number,
-                send_date =rec.send_date,
-                review_date =rec.review_date,
-                url = rec.url,
-                result = rec.result,
-                comments = rec.comments,
-                local_directory = rec.local_directory,
-                ai_percentage = rec.ai_percentage,
-                variant_number = variant_number,
-                student={
-                    'id' : student.id,
-                    'year': student.year,
-                    'full_name': student.full_name,
-                    'telegram': student.telegram,
-                    'github': student.github,
-                    'group_number': student.group_number,
-                    'chat_id': student.chat_id,
-                    'is_deleted': student.is_deleted
-                }
-            )
+        review = HomeworkReviewInfo(
+            id = rec.id,
+            number=rec.number,
+            send_date =rec.send_date,
+            review_date =rec.review_date,
+            url = rec.url,
+            result = rec.result,
+            comments = rec.comments,
+            local_directory = rec.local_directory,
+            ai_percentage = rec.ai_percentage,
+            variant_number = variant_numbers.get(status),
+            student={
+                'id' : student.id,
+                'year': student.year,
+                'full_name': student.full_name,
+                'telegram': student.telegram,
+                'github': student.github,
+                'group_number': student.group_number,
+                'chat_id': student.chat_id,
+                'is_deleted': student.is_deleted
+            }
+        )
 
-            if status in work_map:
-                if review["result"] > work_map[status]["result"]:
-                    work_map[status] = review
-                else:
-                    if review["send_date"] and work_map[status]["send_date"] and review["send_date"] > work_map[status]["send_date"]:
-                        work_map[status] = review
-            else:
+        if status in work_map:
+            if review["result"] > work_map[status]["result"]:
                 work_map[status] = review
+            else:
+                if review["send_date"] and work_map[status]["send_date"] and review["send_date"] > work_map[status]["send_date"]:
+                    work_map[status] = review
+        else:
+            work_map[status] = review
+
+    # Порядок ответа совпадает с порядком пар на странице
+    result = [work_map[(row.student_id, row.number)] for row in groups if (row.student_id, row.number) in work_map]
 
-    for val in work_map.values():
-        result.append(val)
-        
     logger.info(f"GET /api/homework_review - Retrieved {len(result)} homework reviews")
-    return result
+    return fast_json_response(result, response)
 
 @router.get("/pending", response_model=List[HomeworkReviewInfo])
 def get_pending_homework_reviews(db: Session = Depends(get_db)):
@@ -634,7 +695,7 @@ def download_homework_project(homework_review_id: int, db: Session = Depends(get
             cwd=temp_dir,
             capture_output=True,
             text=True,
-            timeout=300  # 5 минут таймаут
+            timeout=deadlines.call_timeout(300)  # 5 минут таймаут, но не дольше бюджета запроса
         )
         
         if result.returncode != 0:
@@ -817,7 +878,7 @@ Return only the percentage number, nothing else."""
                         }
                     ],
                     temperature=0.1,
-                    timeout=30
+                    timeout=deadlines.call_timeout(30)
                 )
                 
                 ai_percentage_text = response.choices[0].message.content.strip()
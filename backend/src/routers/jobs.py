@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException
+import logging
+import deadlines
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+@router.get("/{job_id}")
+def get_job_status(job_id: str):
+    """
+    Возвращает состояние фоновой задачи, созданной для запроса,
+    который не уложился в свой бюджет времени (ответ 202).
+    """
+    logger.info(f"GET /api/jobs/{job_id} - Retrieving job status")
+    job = deadlines.get_job(job_id)
+    if job is None:
+        logger.warning(f"GET /api/jobs/{job_id} - Job not found")
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -6,6 +6,7 @@ from typing import List
 import logging
 from models import LectureInfo, LectureCreate, LectureUpdate, LectureCapacityInfo, LectureCapacityUpdate
 from database import get_db, Lecture, Attendance
+import lecture_index
 
 logger = logging.getLogger(__name__)
 
@@ -75,33 +76,17 @@ def get_lecture(lecture_id: int, db: Session = Depends(get_db)):
         has_presentation=has_presentation
     )
 
-# Кеш данных для ускорения поиска по секретному коду
-lecture_cache = dict()
 @router.get("/by-secret-code/{secret_code}", response_model=LectureInfo)
 def get_lecture_by_secret_code(secret_code: str, db: Session = Depends(get_db)):
     logger.info(f"GET /api/lectures/by-secret-code/{secret_code} - Searching lecture by secret code")
 
-    db_lecture = None
-    if secret_code in lecture_cache:
-        db_lecture = lecture_cache[secret_code]
-        logger.info(f"GET /api/lectures/by-secret-code/{secret_code} - Successfully found lecture in cache") 
-
-    if not db_lecture:
-        db_lecture = db.query(Lecture).filter(Lecture.secret_code == secret_code).first()
-        if not db_lecture:
-            logger.warning(f"GET /api/lectures/by-secret-code/{secret_code} - Lecture not found")
-            raise HTTPException(status_code=404, detail="Lecture not found")
-        lecture_cache[secret_code] = db_lecture
-        logger.info(f"GET /api/lectures/by-secret-code/{secret_code} - Successfully found lecture")
-
-    # Безопасная проверка наличия presentation_blob
-    has_presentation = False
-    try:
-        has_presentation = db_lecture.presentation_blob is not None and len(db_lecture.presentation_blob) > 0
-    except (AttributeError, TypeError):
-        has_presentation = False
-    
-    return LectureInfo(id=db_lecture.id, number=db_lecture.number, topic=db_lecture.topic, date=db_lecture.date, start_time=db_lecture.start_time, secret_code=db_lecture.secret_code, max_student=db_lecture.max_student, github_example=db_lecture.github_example, has_presentation=has_presentation)
+    # Поиск по индексу лекций в памяти (сбрасывается при изменении лекций)
+    lecture = lecture_index.by_secret_code(db, secret_code)
+    if not lecture:
+        logger.warning(f"GET /api/lectures/by-secret-code/{secret_code} - Lecture not found")
+        raise HTTPException(status_code=404, detail="Lecture not found")
+    logger.info(f"GET /api/lectures/by-secret-code/{secret_code} - Successfully found lecture")
+    return lecture
 
 @router.post("/", response_model=LectureInfo)
 @router.post("", response_model=LectureInfo)
@@ -196,19 +181,19 @@ def get_lecture_capacity(lecture_number: int, db: Session = Depends(get_db)):
     logger.info(f"GET /api/lectures/capacity/{lecture_number} - Checking lecture capacity")
     
     # Находим лекцию по номеру
-    db_lecture = db.query(Lecture).filter(Lecture.number == lecture_number).first()
-    if not db_lecture:
+    lecture = lecture_index.by_number(db, lecture_number)
+    if not lecture:
         logger.warning(f"GET /api/lectures/capacity/{lecture_number} - Lecture not found")
         raise HTTPException(status_code=404, detail="Лекция с таким номером не найдена")
     
     # Подсчитываем текущее количество студентов на лекции
     current_attendance = db.query(Attendance).filter(
-        Attendance.lecture_id == db_lecture.id,
+        Attendance.lecture_id == lecture['id'],
         Attendance.present == 1  # Только присутствующие студенты
     ).count()
     
     # Определяем ограничения
-    max_student = db_lecture.max_student
+    max_student = lecture['max_student']
     is_full = False
     can_attend = True
     remaining_slots = None
@@ -218,19 +203,19 @@ def get_lecture_capacity(lecture_number: int, db: Session = Depends(get_db)):
         can_attend = current_attendance < max_student
         remaining_slots = max(0, max_student - current_attendance)
     
-    logger.info(f"GET /api/lectures/capacity/{lecture_number} - Lecture {db_lecture.id}: {current_attendance}/{max_student if max_student else 'unlimited'} students")
+    logger.info(f"GET /api/lectures/capacity/{lecture_number} - Lecture {lecture['id']}: {current_attendance}/{max_student if max_student else 'unlimited'} students")
     
     return LectureCapacityInfo(
-        lecture_id=db_lecture.id,
-        lecture_number=db_lecture.number,
-        lecture_topic=db_lecture.topic,
+        lecture_id=lecture['id'],
+        lecture_number=lecture['number'],
+        lecture_topic=lecture['topic'],
         max_student=max_student,
         current_attendance=current_attendance,
         is_full=is_full,
         can_attend=can_attend,
-        github_example=db_lecture.github_example,
+        github_example=lecture['github_example'],
         remaining_slots=remaining_slots,
-        start_time=db_lecture.start_time
+        start_time=lecture['start_time']
     )
 
 @router.put("/capacity/{lecture_number}", response_model=LectureCapacityInfo)
@@ -1,19 +1,51 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Literal
 import logging
 from models import StudentHomeworkVariantInfo, StudentHomeworkVariantCreate, StudentHomeworkVariantUpdate
 from database import get_db, StudentHomeworkVariant, Student, Homework
+from routers.utils import keyset_paginate, resolve_sort, set_next_cursor, MAX_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/student-homework-variants", tags=["student_homework_variants"])
 
+# Ключи сортировки для списка вариантов (последняя колонка - уникальный id)
+VARIANT_SORT_KEYS = {
+    "id": [StudentHomeworkVariant.id],
+    "student": [StudentHomeworkVariant.student_id, StudentHomeworkVariant.id],
+    "homework": [StudentHomeworkVariant.homework_id, StudentHomeworkVariant.id],
+}
+
 @router.get("/", response_model=List[StudentHomeworkVariantInfo])
 @router.get("", response_model=List[StudentHomeworkVariantInfo])
-def get_student_homework_variants(db: Session = Depends(get_db)):
-    logger.info("GET /api/student-homework-variants - Retrieving all student homework variants")
-    variants = db.query(StudentHomeworkVariant).all()
+def get_student_homework_variants(
+    response: Response,
+    student_id: Optional[int] = Query(None, description="Фильтр по студенту"),
+    homework_id: Optional[int] = Query(None, description="Фильтр по домашнему заданию"),
+    group_number: Optional[str] = Query(None, description="Фильтр по номеру группы студента"),
+    sort: str = Query("id", description="Ключ сортировки: id, student, homework"),
+    order: Literal["asc", "desc"] = Query("asc", description="Направление сортировки"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (без параметра - все записи)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    db: Session = Depends(get_db)
+):
+    logger.info("GET /api/student-homework-variants - Retrieving student homework variants")
+    columns = resolve_sort(VARIANT_SORT_KEYS, sort)
+    query = db.query(StudentHomeworkVariant)
+    if student_id is not None:
+        query = query.filter(StudentHomeworkVariant.student_id == student_id)
+    if homework_id is not None:
+        query = query.filter(StudentHomeworkVariant.homework_id == homework_id)
+    if group_number is not None:
+        query = query.join(
+            Student, Student.id == StudentHomeworkVariant.student_id
+        ).filter(Student.group_number == group_number)
+    variants, next_cursor = keyset_paginate(
+        query, columns, lambda v: [getattr(v, column.key) for column in columns],
+        cursor, limit, descending=(order == "desc")
+    )
+    set_next_cursor(response, next_cursor)
     logger.info(f"GET /api/student-homework-variants - Retrieved {len(variants)} variants")
     return [StudentHomeworkVariantInfo(
         id=variant.id,
@@ -1,21 +1,48 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, DataError, OperationalError
 from sqlalchemy import func
-from typing import List, Dict
+from typing import List, Dict, Optional, Literal
 import logging
 from models import StudentInfo, StudentCreate, StudentUpdate, StudentStatsInfo
 from database import get_db, Student, HomeworkReview, Attendance
+from routers.utils import keyset_paginate, resolve_sort, set_next_cursor, MAX_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/students", tags=["students"])
 
+# Ключи сортировки для списка студентов (последняя колонка - уникальный id)
+STUDENT_SORT_KEYS = {
+    "id": [Student.id],
+    "full_name": [Student.full_name, Student.id],
+    "group_number": [Student.group_number, Student.full_name, Student.id],
+}
+
 @router.get("/", response_model=List[StudentInfo])
 @router.get("", response_model=List[StudentInfo])  # Дублируем роут без trailing slash
-def get_students(db: Session = Depends(get_db)):
-    logger.info("GET /api/students - Retrieving all students")
-    students = db.query(Student).filter(Student.is_deleted == False).all()
+def get_students(
+    response: Response,
+    group_number: Optional[str] = Query(None, description="Фильтр по номеру группы"),
+    year: Optional[int] = Query(None, description="Фильтр по году обучения"),
+    sort: str = Query("id", description="Ключ сортировки: id, full_name, group_number"),
+    order: Literal["asc", "desc"] = Query("asc", description="Направление сортировки"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (без параметра - все записи)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    db: Session = Depends(get_db)
+):
+    logger.info("GET /api/students - Retrieving students")
+    columns = resolve_sort(STUDENT_SORT_KEYS, sort)
+    query = db.query(Student).filter(Student.is_deleted == False)
+    if group_number is not None:
+        query = query.filter(Student.group_number == group_number)
+    if year is not None:
+        query = query.filter(Student.year == year)
+    students, next_cursor = keyset_paginate(
+        query, columns, lambda s: [getattr(s, column.key) for column in columns],
+        cursor, limit, descending=(order == "desc")
+    )
+    set_next_cursor(response, next_cursor)
     logger.info(f"GET /api/students - Retrieved {len(students)} students")
     return [StudentInfo(
         id = s.id,
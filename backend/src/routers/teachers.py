@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import func, and_
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import logging
 from models import TeacherInfo, TeacherCreate, TeacherUpdate, TeacherGroupInfo, TeacherGroupCreate, TeacherGroupUpdate, TeacherStatsInfo
 from database import get_db, Teacher, TeacherGroup, Student, HomeworkReview
@@ -201,6 +202,64 @@ def delete_teacher_group(group_id: int, db: Session = Depends(get_db)):
     logger.info(f"DELETE /api/teachers/groups/{group_id} - Successfully deleted teacher group")
     return {"message": "Teacher group deleted successfully"}
 
+def _review_stats(db: Session, teacher_ids: Optional[List[int]] = None) -> Dict[int, Tuple[int, int]]:
+    """
+    Статистика работ по преподавателям одним агрегирующим запросом:
+    {teacher_id: (total_reviews, pending_reviews)}.
+
+    Работа - пара (студент, номер ДЗ) для студентов из групп преподавателя.
+    Из нескольких сдач учитывается лучшая по результату, поэтому работа
+    считается непроверенной, если ни одна ее сдача не оценена (result 0 или null).
+    """
+    teacher_groups = db.query(
+        TeacherGroup.teacher_id.label("teacher_id"),
+        func.trim(TeacherGroup.group_number).label("group_number")
+    ).filter(TeacherGroup.group_number.isnot(None))
+    if teacher_ids is not None:
+        teacher_groups = teacher_groups.filter(TeacherGroup.teacher_id.in_(teacher_ids))
+    # Группа может быть назначена преподавателю несколько раз - учитываем один раз
+    teacher_groups = teacher_groups.distinct().subquery()
+
+    works = db.query(
+        teacher_groups.c.teacher_id.label("teacher_id"),
+        func.max(func.coalesce(HomeworkReview.result, 0)).label("best_result")
+    ).select_from(teacher_groups).join(
+        Student, and_(Student.group_number == teacher_groups.c.group_number, Student.is_deleted == False)
+    ).join(
+        HomeworkReview, HomeworkReview.student_id == Student.id
+    ).group_by(
+        teacher_groups.c.teacher_id, HomeworkReview.student_id, HomeworkReview.number
+    ).subquery()
+
+    rows = db.query(
+        works.c.teacher_id,
+        func.count(),
+        func.count().filter(works.c.best_result == 0)
+    ).group_by(works.c.teacher_id).all()
+    return {teacher_id: (total, pending) for teacher_id, total, pending in rows}
+
+@router.get("/stats", response_model=List[TeacherStatsInfo])
+def get_all_teacher_stats(db: Session = Depends(get_db)):
+    """
+    Статистика по работам для всех преподавателей одним запросом
+    (для дашборда и списка непроверенных работ в боте).
+    """
+    logger.info("GET /api/teachers/stats - Retrieving statistics for all teachers")
+    stats = _review_stats(db)
+    teacher_ids = [teacher_id for (teacher_id,) in db.query(Teacher.id).filter(
+        Teacher.is_deleted == False
+    ).order_by(Teacher.id)]
+    result = [
+        TeacherStatsInfo(
+            teacher_id=teacher_id,
+            total_reviews=stats.get(teacher_id, (0, 0))[0],
+            pending_reviews=stats.get(teacher_id, (0, 0))[1]
+        )
+        for teacher_id in teacher_ids
+    ]
+    logger.info(f"GET /api/teachers/stats - Returning statistics for {len(result)} teachers")
+    return result
+
 @router.get("/{teacher_id}/stats", response_model=TeacherStatsInfo)
 def get_teacher_stats(teacher_id: int, db: Session = Depends(get_db)):
     """
@@ -216,100 +275,7 @@ def get_teacher_stats(teacher_id: int, db: Session = Depends(get_db)):
         logger.warning(f"GET /api/teachers/{teacher_id}/stats - Teacher not found")
         raise HTTPException(status_code=404, detail="Teacher not found")
     
-    # 1. Находим группы, которые ведет данный преподаватель
-    teacher_groups = db.query(TeacherGroup).filter(
-        TeacherGroup.teacher_id == teacher_id
-    ).all()
-    
-    if not teacher_groups:
-        logger.info(f"GET /api/teachers/{teacher_id}/stats - No groups found for teacher")
-        return TeacherStatsInfo(
-            teacher_id=teacher_id,
-            total_reviews=0,
-            pending_reviews=0
-        )
-    
-    # Получаем номера групп
-    group_numbers = [tg.group_number.strip() for tg in teacher_groups if tg.group_number]
-    logger.info(f"GET /api/teachers/{teacher_id}/stats - Teacher groups: {group_numbers}")
-    
-    if not group_numbers:
-        return TeacherStatsInfo(
-            teacher_id=teacher_id,
-            total_reviews=0,
-            pending_reviews=0
-        )
-    
-    # 2. Находим студентов из этих групп
-    students = db.query(Student).filter(
-        Student.group_number.in_(group_numbers),
-        Student.is_deleted == False
-    ).all()
-    
-    if not students:
-        logger.info(f"GET /api/teachers/{teacher_id}/stats - No students found in teacher groups")
-        return TeacherStatsInfo(
-            teacher_id=teacher_id,
-            total_reviews=0,
-            pending_reviews=0
-        )
-    
-    student_ids = [student.id for student in students]
-    logger.info(f"GET /api/teachers/{teacher_id}/stats - Students in groups: {len(student_ids)}")
-    
-    # 3. Получаем все работы студентов из групп преподавателя
-    # Используем дедупликацию по student_id и number (берем последнюю работу по send_date)
-    from sqlalchemy import func, and_, desc
-    from sqlalchemy.orm import aliased
-    
-    # Получаем все работы студентов
-    all_homework_reviews = db.query(HomeworkReview).filter(
-        HomeworkReview.student_id.in_(student_ids)
-    ).order_by(
-        HomeworkReview.student_id,
-        HomeworkReview.number,
-        desc(HomeworkReview.send_date),
-        desc(HomeworkReview.id)
-    ).all()
-    
-    # Дедупликация: для каждой комбинации (student_id, number) берем работу по приоритету:
-    # 1. Проверенные работы (result > 0) имеют приоритет над непроверенными (result == 0 или null)
-    # 2. Если обе проверены или обе непроверены - берем последнюю по send_date
-    work_map = {}  # {(student_id, number): HomeworkReview}
-    
-    for review in all_homework_reviews:
-        key = (review.student_id, review.number)
-        
-        if key not in work_map:
-            # Первая работа для этой комбинации
-            work_map[key] = review
-        else:
-            existing_review = work_map[key]
-            existing_result = existing_review.result or 0
-            current_result = review.result or 0
-            
-            # Проверенные работы (result > 0) имеют приоритет над непроверенными
-            if current_result > existing_result:
-                # Текущая работа проверена, а существующая нет - заменяем
-                work_map[key] = review
-            elif current_result == existing_result:
-                # Обе работы одинакового статуса (обе проверены или обе непроверены)
-                # Берем последнюю по send_date
-                existing_date = existing_review.send_date or ""
-                current_date = review.send_date or ""
-                
-                if current_date > existing_date or (current_date == existing_date and review.id > existing_review.id):
-                    work_map[key] = review
-            # Если existing_result > current_result - оставляем существующую (она проверена)
-    
-    # Получаем список уникальных работ (последние по каждой комбинации)
-    all_reviews = list(work_map.values())
-    
-    # Подсчитываем общее количество работ
-    total_reviews = len(all_reviews)
-    
-    # Подсчитываем непроверенные работы (где result == 0 или null)
-    pending_reviews = len([r for r in all_reviews if r.result == 0 or r.result is None])
+    total_reviews, pending_reviews = _review_stats(db, [teacher_id]).get(teacher_id, (0, 0))
     
     logger.info(f"GET /api/teachers/{teacher_id}/stats - Total reviews: {total_reviews}, Pending: {pending_reviews}")
     
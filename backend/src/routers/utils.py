@@ -2,8 +2,36 @@
 Утилиты для роутеров FastAPI
 """
 from functools import wraps
-from fastapi import APIRouter
-from typing import Callable, Any
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import tuple_
+from typing import Callable, Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from datetime import date, timedelta
+import base64
+import json
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
+
+# Заголовок с курсором следующей страницы для списочных эндпоинтов
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Максимальный размер страницы
+MAX_PAGE_SIZE = 1000
+
+# Сколько хранить ответы по Idempotency-Key (в секундах)
+IDEMPOTENCY_TTL = 24 * 3600
+
+# Сохраненные ответы: (эндпоинт, ключ) -> (время, отпечаток запроса, ответ),
+# в порядке сохранения - устаревшие записи всегда в начале
+_idempotent_responses: "OrderedDict[Tuple[str, str], Tuple[float, str, Any]]" = OrderedDict()
+_idempotent_lock = threading.Lock()
 
 
 def both_slashes(router: APIRouter, path: str, **kwargs):
@@ -50,3 +78,143 @@ def put_both(router: APIRouter, path: str, **kwargs):
 def delete_both(router: APIRouter, path: str, **kwargs):
     """Создает DELETE роут с поддержкой trailing slash и без него"""
     return both_slashes(router, path, methods=["DELETE"], **kwargs)
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Кодирует значения ключа сортировки последней строки страницы в курсор."""
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Декодирует курсор, полученный от encode_cursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def resolve_sort(sort_keys: Dict[str, List[Any]], sort: str) -> List[Any]:
+    """Возвращает колонки ключа сортировки по имени или 400, если ключ не поддерживается."""
+    if sort not in sort_keys:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported sort key '{sort}'. Allowed: {', '.join(sort_keys)}"
+        )
+    return sort_keys[sort]
+
+
+def apply_date_range(query, column, date_from: Optional[str], date_to: Optional[str]):
+    """
+    Фильтрует по диапазону дат для колонок с ISO-строками.
+    date_to в формате YYYY-MM-DD включает весь день.
+    """
+    if date_from:
+        query = query.filter(column >= date_from)
+    if date_to:
+        if len(date_to) == 10:
+            try:
+                next_day = (date.fromisoformat(date_to) + timedelta(days=1)).isoformat()
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date_to: {date_to}")
+            query = query.filter(column < next_day)
+        else:
+            query = query.filter(column <= date_to)
+    return query
+
+
+def keyset_paginate(query, columns: List[Any], key: Callable[[Any], List[Any]],
+                    cursor: Optional[str], limit: Optional[int], descending: bool = False) -> Tuple[List[Any], Optional[str]]:
+    """
+    Keyset-пагинация: сортирует запрос по columns (последняя колонка должна быть
+    уникальной, обычно id) и возвращает строки после курсора.
+
+    Args:
+        query: SQLAlchemy запрос
+        columns: Колонки ключа сортировки
+        key: Функция, возвращающая значения ключа сортировки для строки результата
+        cursor: Курсор предыдущей страницы (None - с начала)
+        limit: Размер страницы (None - без ограничения)
+        descending: Сортировка по убыванию
+
+    Returns:
+        Строки страницы и курсор следующей страницы (None, если это последняя страница)
+    """
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(columns):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        row_key = tuple_(*columns)
+        query = query.filter(row_key < tuple_(*values) if descending else row_key > tuple_(*values))
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    """Передает курсор следующей страницы в заголовке X-Next-Cursor."""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ, сериализуемый через orjson (при его наличии)."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(jsonable_encoder(content))
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def fast_json_response(content: Any, response: Optional[Response] = None) -> Response:
+    """
+    Быстрый путь для больших списков: строки уже сформированы из БД с нужными
+    типами, поэтому повторная валидация через response_model пропускается,
+    а сериализация выполняется orjson. Заголовки, установленные в response
+    (например, X-Next-Cursor), переносятся в ответ.
+    """
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key.lower() != "content-length"}
+    return FastJSONResponse(content=content, headers=headers)
+
+
+def _request_fingerprint(payload: Any) -> str:
+    return json.dumps(jsonable_encoder(payload), sort_keys=True)
+
+
+def idempotent_response(key: Optional[str], endpoint: str, payload: Any) -> Optional[Any]:
+    """
+    Возвращает сохраненный ответ для повтора запроса с тем же Idempotency-Key
+    (None - запрос выполняется впервые). Повторное использование ключа с другим
+    телом запроса - ошибка 422. Хранилище локально для процесса.
+    """
+    if not key:
+        return None
+    expired_before = time.time() - IDEMPOTENCY_TTL
+    with _idempotent_lock:
+        while _idempotent_responses and next(iter(_idempotent_responses.values()))[0] < expired_before:
+            _idempotent_responses.popitem(last=False)
+        stored = _idempotent_responses.get((endpoint, key))
+    if stored is None:
+        return None
+    _, fingerprint, result = stored
+    if fingerprint != _request_fingerprint(payload):
+        raise HTTPException(status_code=422, detail="Idempotency-Key has already been used with a different request")
+    return result
+
+
+def remember_response(key: Optional[str], endpoint: str, payload: Any, result: Any) -> None:
+    """Сохраняет успешный ответ для повторов запроса с тем же Idempotency-Key."""
+    if key:
+        fingerprint = _request_fingerprint(payload)
+        with _idempotent_lock:
+            _idempotent_responses[(endpoint, key)] = (time.time(), fingerprint, result)
+            _idempotent_responses.move_to_end((endpoint, key))
@@ -3,7 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 import logging
-from routers import students, lectures, attendance, homework, homework_review, teachers, student_homework_variants, export, import_all, google_sheet, config, exam_grades
+from deadlines import DeadlineMiddleware
+from compression import CompressionMiddleware
+from routers.utils import NEXT_CURSOR_HEADER
+from routers import students, lectures, attendance, attendance_analytics, homework, homework_review, teachers, student_homework_variants, export, import_all, google_sheet, config, exam_grades, jobs
 
 
 # Настройка логирования
@@ -25,6 +28,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],  # Разрешенные HTTP методы
     allow_headers=["*"],  # Разрешаем все заголовки
+    expose_headers=[NEXT_CURSOR_HEADER],  # Курсор следующей страницы для списков
 )
 
 @app.middleware("http")
@@ -57,27 +61,19 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": exc.errors()}
     )
 
-# Увеличиваем таймаут для длительных операций
-@app.middleware("http")
-async def timeout_middleware(request: Request, call_next):
-    import asyncio
-    try:
-        # Устанавливаем таймаут 15 минут (900 секунд) для всех запросов
-        response = await asyncio.wait_for(call_next(request), timeout=900.0)
-        return response
-    except asyncio.TimeoutError:
-        logger.error(f"Request timeout after 15 minutes: {request.method} {request.url}")
-        from fastapi.responses import JSONResponse
-        return JSONResponse(
-            status_code=408,
-            content={"detail": "Request timeout after 15 minutes"}
-        )
+# Дедлайны запросов: бюджет времени задается по маршрутам (см. deadlines.ROUTE_DEADLINES)
+app.add_middleware(DeadlineMiddleware)
+
+# Сжатие больших JSON-ответов (br/gzip); подключается последним, чтобы оборачивать
+# все остальные middleware и не мешать сохранению результатов фоновых задач
+app.add_middleware(CompressionMiddleware)
 
 # Подключаем роутеры
 app.include_router(config.router)  # Подключаем роутер конфигурации первым
 app.include_router(students.router)
 app.include_router(lectures.router)
 app.include_router(attendance.router)
+app.include_router(attendance_analytics.router)
 app.include_router(homework.router)
 app.include_router(homework_review.router)
 app.include_router(teachers.router)
@@ -86,6 +82,7 @@ app.include_router(exam_grades.router)
 app.include_router(export.router)
 app.include_router(import_all.router)
 app.include_router(google_sheet.router)
+app.include_router(jobs.router)
 
 if __name__ == "__main__":
     import uvicorn
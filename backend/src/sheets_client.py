@@ -0,0 +1,178 @@
+"""
+Клиент Google Sheets, общий для всех запросов процесса.
+
+Учетные данные читаются и клиент авторизуется при первом обращении, а не при
+импорте: backend запускается и без Google credentials. Токен доступа
+обновляется фоновым потоком заранее, до истечения срока. Таблица и листы
+открываются один раз, их дескрипторы (с метаданными) кэшируются. Таймаут
+каждого HTTP-запроса вычисляется в момент вызова по бюджету запроса, из
+которого он сделан, поэтому общий клиент не хранит чужих таймаутов.
+
+Вместо Google можно подставить таблицу в памяти (sheets_fake): через
+use_spreadsheet или SHEETS_BACKEND=memory - для локальной проверки и
+бенчмарков без доступа к Google.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import gspread
+from gspread.exceptions import WorksheetNotFound
+from oauth2client.service_account import ServiceAccountCredentials
+
+import deadlines
+
+logger = logging.getLogger(__name__)
+
+JSON_KEYFILE = 'google/credentials.json'
+SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+# Таймаут одного HTTP-запроса к Google API (ограничивается бюджетом запроса)
+GOOGLE_API_TIMEOUT = 60
+
+# Токен обновляется за столько секунд до истечения срока действия
+TOKEN_REFRESH_MARGIN = 300
+
+# Размер нового листа, если его нет в таблице
+NEW_WORKSHEET_ROWS = 1000
+NEW_WORKSHEET_COLS = 50
+
+GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
+
+# google - Google Sheets API, memory - таблица в памяти процесса (sheets_fake)
+SHEETS_BACKEND = os.getenv("SHEETS_BACKEND", "google")
+
+_lock = threading.RLock()
+_client: Optional[gspread.Client] = None
+_spreadsheet: Optional[gspread.Spreadsheet] = None
+_worksheets: Dict[str, gspread.Worksheet] = {}
+_refresher: Optional[threading.Thread] = None
+_override = None  # подставленная таблица вместо Google
+
+
+class _DeadlineHTTPClient(gspread.http_client.HTTPClient):
+    """
+    HTTP-клиент gspread с таймаутом по бюджету текущего запроса (deadlines
+    хранит дедлайн в контекстной переменной). Вне HTTP-запроса - очередь
+    экспорта, обновление токена - действует GOOGLE_API_TIMEOUT.
+    """
+
+    @property
+    def timeout(self) -> float:
+        return deadlines.call_timeout(GOOGLE_API_TIMEOUT)
+
+    @timeout.setter
+    def timeout(self, value) -> None:
+        pass  # таймаут не хранится в общем клиенте
+
+
+def _get_client() -> gspread.Client:
+    global _client
+    if _client is None:
+        if not GOOGLE_SHEET_ID:
+            raise ValueError("GOOGLE_SHEET_ID environment variable is not set")
+        logger.info("Authorizing gspread client...")
+        credentials = ServiceAccountCredentials.from_json_keyfile_name(JSON_KEYFILE, SCOPE)
+        client = gspread.authorize(credentials, http_client=_DeadlineHTTPClient)
+        client.http_client.login()
+        _client = client
+        _start_refresher()
+    return _client
+
+
+def get_spreadsheet() -> gspread.Spreadsheet:
+    """Таблица GOOGLE_SHEET_ID."""
+    global _spreadsheet, _override
+    with _lock:
+        if _override is None and SHEETS_BACKEND == "memory":
+            import sheets_fake
+            _override = sheets_fake.FakeSpreadsheet()
+            logger.info("Using in-memory spreadsheet instead of Google Sheets")
+        if _override is not None:
+            return _override
+        client = _get_client()
+        if _spreadsheet is None:
+            logger.info(f"Opening spreadsheet by key: {GOOGLE_SHEET_ID}")
+            _spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+        return _spreadsheet
+
+
+def get_worksheet(title: str) -> gspread.Worksheet:
+    """Лист таблицы по названию из кэша; отсутствующий лист создается."""
+    spreadsheet = get_spreadsheet()
+    with _lock:
+        worksheet = _worksheets.get(title)
+        if worksheet is None:
+            try:
+                worksheet = spreadsheet.worksheet(title)
+                logger.debug(f"Found existing {title} worksheet")
+            except WorksheetNotFound:
+                logger.warning(f"Worksheet {title} not found, creating new one")
+                worksheet = spreadsheet.add_worksheet(title=title, rows=NEW_WORKSHEET_ROWS, cols=NEW_WORKSHEET_COLS)
+                logger.info(f"Created new {title} worksheet")
+            _worksheets[title] = worksheet
+        return worksheet
+
+
+def use_spreadsheet(spreadsheet) -> None:
+    """
+    Подставляет таблицу вместо Google (например, sheets_fake.FakeSpreadsheet);
+    None - вернуться к Google Sheets. Кэш листов сбрасывается.
+    """
+    global _override
+    with _lock:
+        _override = spreadsheet
+        _worksheets.clear()
+
+
+def get_modified_time() -> str:
+    """Время последнего изменения таблицы из метаданных Drive API (один легкий запрос)."""
+    return get_spreadsheet().get_lastUpdateTime()
+
+
+def invalidate() -> None:
+    """
+    Сбрасывает кэш таблицы и листов (после ошибки API: лист могли удалить
+    или переименовать). Авторизация сохраняется.
+    """
+    global _spreadsheet
+    with _lock:
+        _spreadsheet = None
+        _worksheets.clear()
+    logger.info("Google Sheets handles invalidated")
+
+
+def _token_expiry() -> Optional[datetime]:
+    """Срок действия токена доступа (у google-auth - наивное время в UTC)."""
+    return _client.http_client.auth.expiry if _client is not None else None
+
+
+def _seconds_until_refresh() -> float:
+    expiry = _token_expiry()
+    if expiry is None:
+        return TOKEN_REFRESH_MARGIN
+    return (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() - TOKEN_REFRESH_MARGIN
+
+
+def _refresh_token() -> None:
+    """Фоновый поток: обновляет токен доступа до истечения срока действия."""
+    while True:
+        try:
+            if _seconds_until_refresh() <= 0:
+                _client.http_client.login()
+                logger.info(f"Google API token refreshed, expires at {_token_expiry()}")
+            delay = _seconds_until_refresh()
+        except Exception as e:
+            logger.error(f"Failed to refresh Google API token: {e}")
+            delay = 30
+        time.sleep(max(delay, 5))
+
+
+def _start_refresher() -> None:
+    global _refresher
+    if _refresher is None or not _refresher.is_alive():
+        _refresher = threading.Thread(target=_refresh_token, name="google-token-refresher", daemon=True)
+        _refresher.start()
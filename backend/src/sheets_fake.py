@@ -0,0 +1,193 @@
+"""
+Таблица Google Sheets в памяти для локальной проверки и бенчмарков экспорта.
+
+Повторяет поведение используемых операций gspread (get_all_values, batch_get,
+update, batch_update, clear, resize, add_worksheet): значения хранятся
+строками в том виде, в котором их вернул бы API, запись за пределы сетки
+листа - ошибка, как и в Google. Форматирования ячеек нет, поэтому
+value_render_option не влияет на результат. Все вызовы учитываются в SheetsStats: число
+вызовов по операциям, прочитанные и записанные ячейки, объем запросов и
+ответов (JSON).
+
+Подключается через sheets_client.use_spreadsheet(FakeSpreadsheet()) или
+переменной окружения SHEETS_BACKEND=memory.
+"""
+import json
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range
+
+from sheets_sync import normalize_cell
+
+
+@dataclass
+class SheetsStats:
+    calls: Counter = field(default_factory=Counter)  # операция -> число вызовов (HTTP-запросов)
+    cells_read: int = 0
+    cells_written: int = 0
+    bytes_sent: int = 0       # размер тел запросов (JSON)
+    bytes_received: int = 0   # размер ответов (JSON)
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.cells_read = self.cells_written = self.bytes_sent = self.bytes_received = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": dict(self.calls),
+            "requests": sum(self.calls.values()),
+            "cells_read": self.cells_read,
+            "cells_written": self.cells_written,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+def _payload_size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def _trim(rows: List[List[str]]) -> List[List[str]]:
+    """Как в ответе API: без пустых ячеек в конце строк и пустых строк в конце."""
+    trimmed = []
+    for row in rows:
+        end = len(row)
+        while end and row[end - 1] == "":
+            end -= 1
+        trimmed.append(row[:end])
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", title: str, rows: int, cols: int, sheet_id: int):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.row_count = rows
+        self.col_count = cols
+        self._cells: List[List[str]] = []
+
+    def _record(self, operation: str, sent: Any = None, received: Any = None) -> None:
+        stats = self.spreadsheet.stats
+        stats.calls[operation] += 1
+        if sent is not None:
+            stats.bytes_sent += _payload_size(sent)
+        if received is not None:
+            stats.bytes_received += _payload_size(received)
+
+    def _read(self, start_row: int, end_row: int, start_col: int, end_col: int) -> List[List[str]]:
+        rows = [
+            (self._cells[row] if row < len(self._cells) else [])[start_col:end_col]
+            for row in range(start_row, min(end_row, len(self._cells)))
+        ]
+        rows = _trim(rows)
+        self.spreadsheet.stats.cells_read += sum(len(row) for row in rows)
+        return rows
+
+    def _write(self, start_row: int, start_col: int, values: Sequence[Sequence[Any]]) -> None:
+        end_row = start_row + len(values)
+        end_col = start_col + max((len(row) for row in values), default=0)
+        if end_row > self.row_count or end_col > self.col_count:
+            raise ValueError(
+                f"Range exceeds grid limits of {self.title}: {end_row}x{end_col} > {self.row_count}x{self.col_count}"
+            )
+        for i, row in enumerate(values):
+            while len(self._cells) <= start_row + i:
+                self._cells.append([])
+            line = self._cells[start_row + i]
+            line.extend([""] * (start_col + len(row) - len(line)))
+            for j, value in enumerate(row):
+                line[start_col + j] = normalize_cell(value)
+        self.spreadsheet.stats.cells_written += sum(len(row) for row in values)
+        self.spreadsheet.touch()
+
+    def _range(self, name: str):
+        grid = a1_range_to_grid_range(name)
+        return (
+            grid.get("startRowIndex", 0), grid.get("endRowIndex", self.row_count),
+            grid.get("startColumnIndex", 0), grid.get("endColumnIndex", self.col_count),
+        )
+
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        rows = self._read(0, self.row_count, 0, self.col_count)
+        self._record("get_all_values", received=rows)
+        # gspread дополняет строки до одинаковой длины
+        width = max((len(row) for row in rows), default=0)
+        return [row + [""] * (width - len(row)) for row in rows]
+
+    def batch_get(self, ranges: Sequence[str], **kwargs) -> List[List[List[str]]]:
+        result = [self._read(*self._range(name)) for name in ranges]
+        self._record("batch_get", sent=list(ranges), received=result)
+        return result
+
+    def update(self, values: Any = None, range_name: Optional[str] = None, **kwargs) -> None:
+        # Поддерживается и старый порядок аргументов gspread: update("A1", values)
+        if isinstance(values, str):
+            values, range_name = range_name, values
+        start_row, _, start_col, _ = self._range(range_name or "A1")
+        self._record("update", sent=values)
+        self._write(start_row, start_col, values)
+
+    def batch_update(self, data: List[Dict[str, Any]], **kwargs) -> None:
+        self._record("batch_update", sent=data)
+        for item in data:
+            start_row, _, start_col, _ = self._range(item["range"])
+            self._write(start_row, start_col, item["values"])
+
+    def clear(self) -> None:
+        self._record("clear")
+        self._cells = []
+        self.spreadsheet.touch()
+
+    def resize(self, rows: Optional[int] = None, cols: Optional[int] = None) -> None:
+        self._record("resize", sent={"rows": rows, "cols": cols})
+        if rows is not None:
+            self.row_count = rows
+            del self._cells[rows:]
+        if cols is not None:
+            self.col_count = cols
+            for line in self._cells:
+                del line[cols:]
+        self.spreadsheet.touch()
+
+
+class FakeSpreadsheet:
+    def __init__(self, title: str = "frieren"):
+        self.title = title
+        self.id = "memory"
+        self.stats = SheetsStats()
+        self._worksheets: Dict[str, FakeWorksheet] = {}
+        self._modified = datetime(2000, 1, 1, tzinfo=timezone.utc)
+        self._lock = threading.Lock()
+
+    def touch(self) -> None:
+        """Отмечает изменение таблицы (modifiedTime в метаданных Drive)."""
+        with self._lock:
+            self._modified += timedelta(milliseconds=1)
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        return list(self._worksheets.values())
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.stats.calls["worksheet"] += 1
+        if title not in self._worksheets:
+            raise WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title: str, rows: int, cols: int, **kwargs) -> FakeWorksheet:
+        self.stats.calls["add_worksheet"] += 1
+        worksheet = FakeWorksheet(self, title, rows, cols, sheet_id=len(self._worksheets))
+        self._worksheets[title] = worksheet
+        self.touch()
+        return worksheet
+
+    def get_lastUpdateTime(self) -> str:
+        self.stats.calls["drive_metadata"] += 1
+        return self._modified.isoformat().replace("+00:00", "Z")
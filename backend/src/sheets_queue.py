@@ -0,0 +1,210 @@
+"""
+Очередь экспорта в Google Sheets с объединением обновлений.
+
+Каждое событие (отметка на лекции, сдача или проверка ДЗ) ставит в очередь
+обновление одной строки листа. Фоновый поток выжидает окно COALESCE_WINDOW,
+после чего для каждого листа: читает затронутые строки (по индексу строк,
+см. sheets_rows), применяет все накопившиеся обновления (повторы одного ключа
+объединяются) и отправляет изменившиеся ячейки одним batch_update.
+
+Если запись не удалась (429/5xx Google, устаревший дескриптор листа),
+обновления возвращаются в очередь и записываются повторно с нарастающей
+паузой; после MAX_ATTEMPTS неудач они отбрасываются (счетчик dropped).
+"""
+import logging
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+import deadlines
+import sheets_client
+import sheets_rows
+
+logger = logging.getLogger(__name__)
+
+# Окно (в секундах), за которое обновления одного листа собираются в одну запись
+COALESCE_WINDOW = float(os.getenv("SHEETS_COALESCE_WINDOW", "1.0"))
+
+# Сколько ждать записи: окно, чтение листа, расширение сетки и batch_update
+RESULT_TIMEOUT = COALESCE_WINDOW + 3 * sheets_client.GOOGLE_API_TIMEOUT
+
+# Попыток записи одного обновления; пауза перед n-м повтором - RETRY_DELAY * 2^(n-1) секунд
+MAX_ATTEMPTS = int(os.getenv("SHEETS_MAX_ATTEMPTS", "4"))
+RETRY_DELAY = 5.0
+
+# Применяет обновления к строкам листа (в памяти) и возвращает результат по каждому ключу
+Applier = Callable[[Session, sheets_rows.SheetRows, List[Hashable]], Dict[Hashable, Dict[str, Any]]]
+
+_lock = threading.Condition()
+_appliers: Dict[str, Tuple[Applier, int]] = {}  # лист -> (обработчик, ключевой столбец строк)
+_pending: Dict[str, Dict[Hashable, List[Future]]] = {}  # лист -> ключ -> ожидающие результата
+_attempts: Dict[str, Dict[Hashable, int]] = {}  # лист -> ключ -> неудачных попыток записи
+_not_before: Dict[str, float] = {}  # лист -> время (monotonic), раньше которого запись не повторяется
+_worker: threading.Thread = None
+_metrics = {
+    "enqueued": 0,       # поставлено обновлений
+    "coalesced": 0,      # объединено с уже ожидающими обновлениями того же ключа
+    "flushes": 0,        # записей в листы (batch_update или проверок без изменений)
+    "flushed_keys": 0,   # применено уникальных обновлений
+    "flushed_events": 0, # событий в примененных обновлениях
+    "failed_flushes": 0,
+    "retried": 0,        # обновлений, возвращенных в очередь после неудачной записи
+    "dropped": 0,        # обновлений, отброшенных после MAX_ATTEMPTS неудач
+    "last_flush_ms": 0.0,
+}
+
+
+def register(sheet_title: str, applier: Applier, key_column: int) -> None:
+    """
+    Регистрирует функцию, применяющую обновления к листу sheet_title;
+    строки листа ищутся по значению столбца key_column (с 0).
+    """
+    _appliers[sheet_title] = (applier, key_column)
+
+
+def enqueue(sheet_title: str, key: Hashable) -> Future:
+    """
+    Ставит в очередь обновление строки key листа sheet_title. Future получает
+    результат после записи в лист (или исключение, если запись не удалась).
+    """
+    future = Future()
+    with _lock:
+        waiters = _pending.setdefault(sheet_title, {}).get(key)
+        _metrics["enqueued"] += 1
+        if waiters is None:
+            _pending[sheet_title][key] = [future]
+        else:
+            waiters.append(future)
+            _metrics["coalesced"] += 1
+        _start_worker()
+        _lock.notify()
+    return future
+
+
+def wait(future: Future) -> Dict[str, Any]:
+    """
+    Результат поставленного обновления (не дольше бюджета текущего запроса).
+    TimeoutError - обновление еще не записано, оно останется в очереди.
+    """
+    return future.result(timeout=deadlines.call_timeout(RESULT_TIMEOUT))
+
+
+def metrics() -> Dict[str, Any]:
+    """
+    Счетчики очереди; coalescing_ratio - сколько событий приходится на одно
+    применённое обновление (только по успешным записям).
+    """
+    with _lock:
+        result = dict(_metrics)
+        result["pending"] = sum(len(keys) for keys in _pending.values())
+    result["coalescing_ratio"] = round(result["flushed_events"] / result["flushed_keys"], 2) if result["flushed_keys"] else 0.0
+    result["window_seconds"] = COALESCE_WINDOW
+    return result
+
+
+def _retry_or_drop(sheet_title: str, batch: Dict[Hashable, List[Future]]) -> Dict[Hashable, List[Future]]:
+    """
+    Возвращает обновления неудачной записи в очередь (с паузой перед повтором).
+    Возвращает обновления, исчерпавшие попытки. Вызывается под _lock.
+    """
+    attempts = _attempts.setdefault(sheet_title, {})
+    pending = _pending.setdefault(sheet_title, {})
+    dropped = {}
+    for key, waiters in batch.items():
+        attempts[key] = attempts.get(key, 0) + 1
+        if attempts[key] >= MAX_ATTEMPTS:
+            del attempts[key]
+            dropped[key] = waiters
+        else:
+            # Пока шла запись, для ключа могли прийти новые события
+            pending[key] = waiters + pending.get(key, [])
+    retried = len(batch) - len(dropped)
+    if retried:
+        attempt = max(attempts[key] for key in batch if key in attempts)
+        _not_before[sheet_title] = time.monotonic() + RETRY_DELAY * 2 ** (attempt - 1)
+    _metrics["failed_flushes"] += 1
+    _metrics["retried"] += retried
+    _metrics["dropped"] += len(dropped)
+    return dropped
+
+
+def _flush_sheet(sheet_title: str, batch: Dict[Hashable, List[Future]]) -> None:
+    started = time.perf_counter()
+    keys = list(batch)
+    db = SessionLocal()
+    try:
+        applier, key_column = _appliers[sheet_title]
+        rows = sheets_rows.SheetRows(sheets_client.get_worksheet(sheet_title), key_column)
+        results = applier(db, rows, keys)
+        sync = rows.sync()
+    except Exception as e:
+        logger.error(f"Failed to flush {len(keys)} queued updates to {sheet_title}: {e}")
+        logger.error(f"Error traceback:\n{traceback.format_exc()}")
+        sheets_client.invalidate()
+        sheets_rows.invalidate(sheet_title)
+        with _lock:
+            dropped = _retry_or_drop(sheet_title, batch)
+        if dropped:
+            logger.error(f"Dropped {len(dropped)} updates to {sheet_title} after {MAX_ATTEMPTS} failed attempts: {list(dropped)}")
+        if len(dropped) < len(batch):
+            logger.warning(f"{len(batch) - len(dropped)} updates to {sheet_title} will be retried")
+        for waiters in dropped.values():
+            for future in waiters:
+                future.set_exception(e)
+        return
+    finally:
+        db.close()
+
+    elapsed = (time.perf_counter() - started) * 1000
+    events = sum(len(waiters) for waiters in batch.values())
+    with _lock:
+        attempts = _attempts.get(sheet_title, {})
+        for key in keys:
+            attempts.pop(key, None)
+        _metrics["flushes"] += 1
+        _metrics["flushed_keys"] += len(keys)
+        _metrics["flushed_events"] += events
+        _metrics["last_flush_ms"] = round(elapsed, 1)
+    logger.info(
+        f"Flushed {len(keys)} queued updates ({events} events) to {sheet_title}: "
+        f"{sync.changed_cells} cells in {elapsed:.0f} ms"
+    )
+    for key, waiters in batch.items():
+        for future in waiters:
+            future.set_result(results.get(key, {}))
+
+
+def _ready_sheets(now: float) -> List[str]:
+    """Листы с ожидающими обновлениями, для которых не идет пауза перед повтором. Вызывается под _lock."""
+    return [title for title, keys in _pending.items() if keys and _not_before.get(title, 0.0) <= now]
+
+
+def _run() -> None:
+    """Фоновый поток: раз в окно забирает накопившиеся обновления и записывает их по листам."""
+    while True:
+        with _lock:
+            while not _ready_sheets(time.monotonic()):
+                # Ждем нового события или окончания ближайшей паузы перед повтором
+                deferred = [_not_before[title] for title, keys in _pending.items() if keys and title in _not_before]
+                _lock.wait(timeout=max(min(deferred) - time.monotonic(), 0.0) if deferred else None)
+        # Даем накопиться обновлениям, пришедшим следом за первым
+        time.sleep(COALESCE_WINDOW)
+        with _lock:
+            batches = {title: _pending.pop(title) for title in _ready_sheets(time.monotonic())}
+            for title in batches:
+                _not_before.pop(title, None)
+        for sheet_title, batch in batches.items():
+            _flush_sheet(sheet_title, batch)
+
+
+def _start_worker() -> None:
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run, name="sheets-export-queue", daemon=True)
+        _worker.start()
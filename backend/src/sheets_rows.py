@@ -0,0 +1,149 @@
+"""
+Индекс строк листов Google Sheets: номер строки по значению ключевого
+столбца (telegram студента).
+
+Индекс строится лениво - один раз читается весь лист - и хранится между
+запросами. Дальше обновление отдельных студентов читает (batch_get) и пишет
+только их строки. Прочитанные строки заодно проверяют индекс: если в строке
+оказался другой ключ или место для новой строки уже занято (лист правили
+вручную или перезаписал полный экспорт), индекс строится заново.
+"""
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import sheets_sync
+
+logger = logging.getLogger(__name__)
+
+# Если нужно прочитать больше строк, лист читается целиком (и индекс строится заново)
+MAX_FETCHED_ROWS = 100
+
+
+class RowIndex:
+    """Номера строк листа (с 1) по ключу и число строк с данными."""
+
+    def __init__(self, values: List[List[str]], key_column: int):
+        self.rows: Dict[str, int] = {}
+        for row_number, row in enumerate(values, start=1):
+            key = sheets_sync.normalize_cell(row[key_column]) if key_column < len(row) else ""
+            if key:
+                self.rows.setdefault(key, row_number)  # при повторах - первая строка
+        self.length = len(values)
+
+
+_lock = threading.Lock()
+_indexes: Dict[str, RowIndex] = {}
+
+
+def invalidate(title: Optional[str] = None) -> None:
+    """Сбрасывает индекс листа title (или всех листов) - он будет построен заново при следующем обновлении."""
+    with _lock:
+        if title is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(title, None)
+
+
+class SheetRows:
+    """
+    Строки одного листа, прочитанные по ключам. Изменения накапливаются
+    в памяти и отправляются методом sync() одним batch_update.
+    """
+
+    def __init__(self, worksheet, key_column: int):
+        self.worksheet = worksheet
+        self.key_column = key_column  # с 0
+        self._index: Optional[RowIndex] = _indexes.get(worksheet.title)
+        self._current: Dict[int, List[str]] = {}  # прочитанные строки
+        self._target: Dict[int, List[Any]] = {}   # строки после изменений
+
+    def _rebuild(self) -> None:
+        values = sheets_sync.get_values(self.worksheet)
+        self._index = RowIndex(values, self.key_column)
+        self._current = {row_number: row for row_number, row in enumerate(values, start=1)}
+        with _lock:
+            _indexes[self.worksheet.title] = self._index
+        logger.info(f"Row index of {self.worksheet.title} rebuilt: {len(self._index.rows)} keys in {self._index.length} rows")
+
+    def _is_valid(self, fetched: Dict[int, List[str]], keys: List[str]) -> bool:
+        index = self._index
+        for key in keys:
+            row_number = index.rows.get(key)
+            if row_number is not None:
+                row = fetched.get(row_number, [])
+                if self.key_column >= len(row) or sheets_sync.normalize_cell(row[self.key_column]) != key:
+                    return False
+        # Места для новых строк должны быть пусты, а последняя известная строка - нет
+        new_rows = sum(key not in index.rows for key in keys)
+        slots = range(index.length + 1, index.length + new_rows + 1)
+        if any(fetched.get(row_number) for row_number in slots):
+            return False
+        return bool(fetched.get(index.length))
+
+    def load(self, keys: Iterable[str]) -> None:
+        """Читает строки с ключами keys (и места для новых строк) одним batch_get, проверяя индекс."""
+        keys = [key for key in dict.fromkeys(keys) if key]
+        index = self._index
+        # Пустой лист дешевле прочитать целиком
+        if index is None or index.length == 0:
+            self._rebuild()
+            return
+        new_rows = sum(key not in index.rows for key in keys)
+        row_numbers = sorted(
+            {index.rows[key] for key in keys if key in index.rows}
+            | set(range(index.length, index.length + new_rows + 1))
+        )
+        if len(row_numbers) > MAX_FETCHED_ROWS:
+            self._rebuild()
+            return
+        ranges = self.worksheet.batch_get(
+            [f"{row_number}:{row_number}" for row_number in row_numbers],
+            value_render_option=sheets_sync.VALUE_RENDER_OPTION
+        )
+        fetched = {row_number: (values[0] if values else []) for row_number, values in zip(row_numbers, ranges)}
+        if not self._is_valid(fetched, keys):
+            logger.warning(f"Row index of {self.worksheet.title} is stale, rebuilding")
+            self._rebuild()
+            return
+        self._current.update(fetched)
+
+    @property
+    def is_empty(self) -> bool:
+        return self._index.length == 0 and 1 not in self._target
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        """Значения строки с ключом key (с учетом изменений) или None, если строки нет."""
+        row_number = self._index.rows.get(key)
+        if row_number is None:
+            return None
+        return list(self._target.get(row_number, self._current.get(row_number, [])))
+
+    def set_header(self, values: List[Any]) -> None:
+        """Заголовки пустого листа."""
+        self._target[1] = list(values)
+        self._index.length = max(self._index.length, 1)
+
+    def put(self, key: str, values: List[Any]) -> Tuple[int, str]:
+        """
+        Записывает values в начало строки с ключом key или добавляет новую
+        строку в конец листа. Возвращает номер строки и действие (updated/added).
+        """
+        row_number = self._index.rows.get(key)
+        if row_number is None:
+            self._index.length += 1
+            row_number = self._index.rows[key] = self._index.length
+            self._target[row_number] = list(values)
+            return row_number, "added"
+        row = self.get(key)
+        row.extend([""] * (len(values) - len(row)))
+        row[:len(values)] = values
+        self._target[row_number] = row
+        return row_number, "updated"
+
+    def sync(self) -> sheets_sync.SyncResult:
+        """Отправляет изменившиеся ячейки измененных строк одним batch_update."""
+        return sheets_sync.sync_rows(self.worksheet, {
+            row_number: (self._current.get(row_number, []), row)
+            for row_number, row in self._target.items()
+        })
@@ -0,0 +1,159 @@
+"""
+Инкрементальная синхронизация листов Google Sheets.
+
+Вместо очистки и полной перезаписи листа новые строки сравниваются с текущим
+содержимым листа, и в Google отправляются только изменившиеся ячейки - одним
+вызовом batch_update на лист. Лишние строки и столбцы старых данных очищаются.
+
+Значения записываются как есть (RAW), а для сравнения читаются без
+форматирования листа (UNFORMATTED_VALUE): отформатированное число (округление,
+десятичная запятая) не совпало бы с записанным, и ячейка перезаписывалась бы
+при каждой синхронизации.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from gspread.utils import ValueRenderOption, rowcol_to_a1
+
+logger = logging.getLogger(__name__)
+
+# Как читаются значения листа для сравнения с новыми (числа - числами)
+VALUE_RENDER_OPTION = ValueRenderOption.unformatted
+
+
+@dataclass(frozen=True)
+class SyncResult:
+    rows: int            # строк в листе после синхронизации
+    changed_rows: int    # строк с изменившимися ячейками
+    changed_cells: int   # отправлено ячеек
+    ranges: int          # диапазонов в batch_update
+
+
+def get_values(worksheet) -> List[List[Any]]:
+    """Все значения листа без форматирования (для сравнения при синхронизации)."""
+    return worksheet.get_all_values(value_render_option=VALUE_RENDER_OPTION)
+
+
+def normalize_cell(value: Any) -> str:
+    """Значение ячейки для сравнения: прочитанное из листа (get_values) и записываемое приводятся к одной строке."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _normalize_row(row: Sequence[Any], width: int) -> List[str]:
+    cells = [normalize_cell(value) for value in row]
+    cells.extend([""] * (width - len(cells)))
+    return cells
+
+
+def _changed_runs(current: Sequence[Sequence[Any]], target: Sequence[Sequence[Any]]) -> Iterator[Tuple[int, int, int]]:
+    """Непрерывные последовательности изменившихся ячеек: (строка, первый столбец, столбец после последнего)."""
+    width = max((len(row) for row in (*current, *target)), default=0)
+    for row_index in range(max(len(current), len(target))):
+        old = _normalize_row(current[row_index] if row_index < len(current) else (), width)
+        new = _normalize_row(target[row_index] if row_index < len(target) else (), width)
+        if old == new:
+            continue
+        column = 0
+        while column < width:
+            if old[column] == new[column]:
+                column += 1
+                continue
+            start = column
+            while column < width and old[column] != new[column]:
+                column += 1
+            yield row_index, start, column
+
+
+def _batch_data(target: Sequence[Sequence[Any]], runs, first_row: int = 1) -> List[Dict[str, Any]]:
+    """Диапазоны batch_update; first_row - номер строки листа, соответствующей target[0]."""
+    data = []
+    for row_index, start, end in runs:
+        source = target[row_index] if row_index < len(target) else ()
+        # Исходные значения (числа остаются числами), очищаемые ячейки - пустые строки
+        values = [source[i] if i < len(source) and source[i] is not None else "" for i in range(start, end)]
+        data.append({
+            "range": f"{rowcol_to_a1(first_row + row_index, start + 1)}:{rowcol_to_a1(first_row + row_index, end)}",
+            "values": [values],
+        })
+    return data
+
+
+def diff_cells(current: Sequence[Sequence[Any]], target: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    Минимальный набор изменений для batch_update: по одному диапазону на каждую
+    непрерывную последовательность изменившихся ячеек строки. Ячейки, которые
+    есть в current, но отсутствуют в target, очищаются.
+    """
+    return _batch_data(target, _changed_runs(current, target))
+
+
+def _ensure_grid(worksheet, rows: int, cols: int) -> None:
+    """Значения нельзя записать за пределы сетки листа - расширяем ее заранее."""
+    if rows > worksheet.row_count or cols > worksheet.col_count:
+        worksheet.resize(rows=max(rows, worksheet.row_count), cols=max(cols, worksheet.col_count))
+
+
+def sync_worksheet(
+    worksheet, rows: Sequence[Sequence[Any]], current: Optional[Sequence[Sequence[Any]]] = None
+) -> SyncResult:
+    """
+    Приводит содержимое листа к rows, отправляя только изменившиеся ячейки.
+    current - уже прочитанное содержимое листа (get_values); если не передано,
+    лист читается здесь.
+    """
+    if current is None:
+        current = get_values(worksheet)
+    runs = list(_changed_runs(current, rows))
+    data = _batch_data(rows, runs)
+
+    if data:
+        _ensure_grid(worksheet, len(rows), max((len(row) for row in rows), default=0))
+        worksheet.batch_update(data)
+
+    result = SyncResult(
+        rows=len(rows),
+        changed_rows=len({row_index for row_index, _, _ in runs}),
+        changed_cells=sum(len(item["values"][0]) for item in data),
+        ranges=len(data),
+    )
+    logger.info(
+        f"Synced worksheet {worksheet.title}: {result.changed_cells} cells in {result.changed_rows} rows "
+        f"({result.ranges} ranges) of {result.rows} rows"
+    )
+    return result
+
+
+def sync_rows(worksheet, rows: Dict[int, Tuple[Sequence[Any], Sequence[Any]]]) -> SyncResult:
+    """
+    Как sync_worksheet, но для отдельных строк листа: rows - номер строки
+    (с 1) -> (текущие значения, новые значения). Остальные строки листа
+    не читаются и не меняются.
+    """
+    data, changed_rows = [], 0
+    for row_number, (current, target) in sorted(rows.items()):
+        row_data = _batch_data([target], _changed_runs([current], [target]), first_row=row_number)
+        changed_rows += bool(row_data)
+        data.extend(row_data)
+
+    if data:
+        _ensure_grid(worksheet, max(rows), max(len(target) for _, target in rows.values()))
+        worksheet.batch_update(data)
+
+    result = SyncResult(
+        rows=len(rows),
+        changed_rows=changed_rows,
+        changed_cells=sum(len(item["values"][0]) for item in data),
+        ranges=len(data),
+    )
+    logger.info(
+        f"Synced {result.rows} rows of worksheet {worksheet.title}: {result.changed_cells} cells "
+        f"in {result.changed_rows} rows ({result.ranges} ranges)"
+    )
+    return result
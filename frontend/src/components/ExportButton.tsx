@@ -2,7 +2,6 @@
 
 import { useState } from 'react';
 import { Download, Loader2 } from 'lucide-react';
-import { exportApi } from '@/lib/api';
 
 interface ExportButtonProps {
   className?: string;
@@ -15,12 +14,12 @@ export default function ExportButton({ className = '' }: ExportButtonProps) {
     try {
       setIsExporting(true);
       
-      // Получаем данные с сервера
-      const data = await exportApi.getAllData();
-      
-      // Создаем JSON файл
-      const jsonString = JSON.stringify(data, null, 2);
-      const blob = new Blob([jsonString], { type: 'application/json' });
+      // Получаем потоковую NDJSON-выгрузку с сервера
+      const response = await fetch('/api/export/ndjson');
+      if (!response.ok) {
+        throw new Error(`Ошибка экспорта: ${response.status}`);
+      }
+      const blob = await response.blob();
       
       // Создаем ссылку для скачивания
       const url = window.URL.createObjectURL(blob);
@@ -31,7 +30,7 @@ export default function ExportButton({ className = '' }: ExportButtonProps) {
       const now = new Date();
       const dateString = now.toISOString().split('T')[0]; // YYYY-MM-DD
       const timeString = now.toTimeString().split(' ')[0].replace(/:/g, '-'); // HH-MM-SS
-      link.download = `frieren-export-${dateString}-${timeString}.json`;
+      link.download = `frieren-export-${dateString}-${timeString}.ndjson`;
       
       // Скачиваем файл
       document.body.appendChild(link);
@@ -54,14 +53,14 @@ export default function ExportButton({ className = '' }: ExportButtonProps) {
       onClick={handleExport}
       disabled={isExporting}
       className={`inline-flex items-center px-3 py-1.5 bg-blue-600 hover:bg-blue-700 text-white text-xs font-medium rounded-md transition-colors disabled:opacity-50 disabled:cursor-not-allowed ${className}`}
-      title="Экспорт всех данных в JSON файл"
+      title="Экспорт всех данных в NDJSON файл"
     >
       {isExporting ? (
         <Loader2 className="w-3 h-3 mr-1.5 animate-spin" />
       ) : (
         <Download className="w-3 h-3 mr-1.5" />
       )}
-      {isExporting ? 'Экспорт...' : 'Экспорт JSON'}
+      {isExporting ? 'Экспорт...' : 'Экспорт NDJSON'}
     </button>
   );
 }
@@ -11,9 +11,10 @@ export default function ImportButton() {
     const file = event.target.files?.[0];
     if (!file) return;
 
-    // Проверяем тип файла
-    if (file.type !== 'application/json' && !file.name.endsWith('.json')) {
-      setMessage({ type: 'error', text: 'Пожалуйста, выберите JSON файл' });
+    // Проверяем тип файла: NDJSON-выгрузка (основной формат) или JSON прежних версий
+    const isNdjson = file.name.endsWith('.ndjson');
+    if (!isNdjson && file.type !== 'application/json' && !file.name.endsWith('.json')) {
+      setMessage({ type: 'error', text: 'Пожалуйста, выберите NDJSON или JSON файл' });
       return;
     }
 
@@ -21,13 +22,18 @@ export default function ImportButton() {
     setMessage(null);
 
     try {
-      const fileContent = await file.text();
-      const data = JSON.parse(fileContent);
-
-      // Проверяем структуру данных
-      if (!data.students || !data.teachers || !data.homework || !data.homework_reviews || !data.lectures || !data.attendance || !data.teacher_groups || !data.student_homework_variants) {
-        setMessage({ type: 'error', text: 'Неверный формат файла. Файл должен содержать все необходимые данные для импорта' });
-        return;
+      // NDJSON отправляется как есть - сервер проверяет формат построчно
+      let body: Blob | string = file;
+      if (!isNdjson) {
+        const fileContent = await file.text();
+        const data = JSON.parse(fileContent);
+
+        // Проверяем структуру данных
+        if (!data.students || !data.teachers || !data.homework || !data.homework_reviews || !data.lectures || !data.attendance || !data.teacher_groups || !data.student_homework_variants) {
+          setMessage({ type: 'error', text: 'Неверный формат файла. Файл должен содержать все необходимые данные для импорта' });
+          return;
+        }
+        body = fileContent;
       }
 
       // Отправляем данные на сервер с таймаутом 15 минут
@@ -35,12 +41,12 @@ export default function ImportButton() {
       const timeoutId = setTimeout(() => controller.abort(), 900000); // 15 минут
 
       try {
-        const response = await fetch('/api/import/all', {
+        const response = await fetch(isNdjson ? '/api/import/ndjson' : '/api/import/all', {
           method: 'POST',
           headers: {
-            'Content-Type': 'application/json',
+            'Content-Type': isNdjson ? 'application/x-ndjson' : 'application/json',
           },
-          body: fileContent,
+          body,
           signal: controller.signal,
         });
 
@@ -90,7 +96,7 @@ export default function ImportButton() {
     <div className="relative">
       <input
         type="file"
-        accept=".json"
+        accept=".ndjson,.json"
         onChange={handleImport}
         disabled={isImporting}
         className="hidden"
@@ -104,7 +110,7 @@ export default function ImportButton() {
             ? 'bg-gray-400 text-white cursor-not-allowed'
             : 'bg-blue-600 text-white hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-blue-500'
         }`}
-        title="Импорт данных из JSON файла"
+        title="Импорт данных из NDJSON или JSON файла"
       >
         {isImporting ? (
           <>
@@ -114,7 +120,7 @@ export default function ImportButton() {
         ) : (
           <>
             <Upload className="w-3 h-3 mr-1.5" />
-            Импорт JSON
+            Импорт
           </>
         )}
       </label>